@@ -0,0 +1,237 @@
+import atexit
+import json
+import threading
+import time
+from collections import Counter, deque
+
+AI_MODEL = "claude-sonnet-4-20250514"
+
+# Keys whose lists are concatenated across chunks; string lists are de-duplicated
+LIST_KEYS = ('failure_classifications', 'engineer_assignments', 'optimized_routes')
+TEXT_KEYS = ('patterns_detected', 'predictions', 'recommendations')
+
+
+def build_prompt(faults, total_faults, engineer_info, chunk_index=0, chunk_count=1):
+    """Prompt for one chunk of a cycle's faults."""
+    fault_summary = {
+        'total_faults': total_faults,
+        'chunk': f"{chunk_index + 1} of {chunk_count}",
+        'feeders_affected': sorted(set(f['feeder_name'] for f in faults)),
+        'faults': faults,
+        'available_engineers': engineer_info,
+    }
+
+    return f"""You are an AI assistant for an electricity distribution monitoring system. Analyze the following fault data and provide:
+
+1. **Failure Type Classification**: For each fault, classify the likely cause (transformer failure, line break, meter malfunction, voltage fluctuation, etc.)
+
+2. **Smart Engineer Assignment**: Assign the most suitable engineer based on:
+   - Engineer specialty matching the fault type
+   - Current workload
+   - Proximity to fault location
+   - Urgency of the fault
+
+3. **Route Optimization**: For multiple faults assigned to the same engineer, suggest an optimal route sequence
+
+4. **Pattern Detection**: Identify any patterns (e.g., multiple faults in same feeder, time-based patterns, geographical clusters)
+
+5. **Predictive Insights**: Based on the data, predict potential cascading failures or areas at risk
+
+The cycle's faults are analyzed in chunks; this request covers only the faults listed below.
+
+Fault Data:
+{json.dumps(fault_summary, indent=2)}
+
+Provide your analysis in JSON format with the following structure:
+{{
+  "failure_classifications": [
+    {{"customer_id": <id>, "fault_type": "<type>", "severity": "<low/medium/high>", "reason": "<explanation>"}}
+  ],
+  "engineer_assignments": [
+    {{"customer_id": <id>, "assigned_engineer": "<name>", "reason": "<why this engineer>", "estimated_travel_time": "<minutes>"}}
+  ],
+  "optimized_routes": [
+    {{"engineer": "<name>", "route_sequence": [<customer_ids>], "total_distance": "<km>", "estimated_time": "<hours>"}}
+  ],
+  "patterns_detected": ["<pattern 1>", "<pattern 2>"],
+  "predictions": ["<prediction 1>", "<prediction 2>"],
+  "recommendations": ["<recommendation 1>", "<recommendation 2>"]
+}}"""
+
+
+def parse_response(response_text):
+    """Extract the JSON object from a model reply, or None."""
+    json_start = response_text.find('{')
+    json_end = response_text.rfind('}') + 1
+    if json_start == -1 or json_end <= json_start:
+        return None
+    try:
+        return json.loads(response_text[json_start:json_end])
+    except ValueError:
+        return None
+
+
+def merge_analysis(merged, part):
+    """Fold one chunk's analysis into ``merged`` (modified in place)."""
+    for key in LIST_KEYS:
+        merged.setdefault(key, []).extend(part.get(key) or [])
+    for key in TEXT_KEYS:
+        existing = merged.setdefault(key, [])
+        for text in part.get(key) or []:
+            if text not in existing:
+                existing.append(text)
+    return merged
+
+
+class ChunkedAnalyzer:
+    """Runs AI analysis in the background, a chunk of faults per request.
+
+    ``submit`` returns immediately. Chunks of ``chunk_size`` faults wait in a
+    queue served by ``max_workers`` threads, so at most that many requests
+    are in flight across all cycles. Each request gives up after ``timeout``
+    seconds. At most ``max_backlog`` cycles may have chunks waiting: when a
+    newer cycle arrives the unsent chunks of the oldest are shed (counted as
+    failed and in ``chunks_shed``) rather than letting the queue grow while
+    the API is slower than the cycle interval. As every chunk finishes
+    ``on_chunk(cycle_number, part, status)`` is called from a worker thread
+    with that chunk's analysis (None if it failed); ``status`` counts finished
+    chunks for the cycle. Once the last chunk is in,
+    ``on_complete(cycle_number, analysis)`` gets the merged analysis of the
+    whole cycle. ``base_url`` points the client at another server, e.g. a
+    local stub of the API. With a ``metrics`` registry every request is timed
+    and counted.
+    """
+
+    def __init__(self, api_key, on_chunk, on_complete=None, chunk_size=50, max_workers=4, timeout=60.0,
+                 base_url=None, model=AI_MODEL, max_tokens=4000, max_backlog=2, metrics=None):
+        import anthropic  # Deferred: the SDK is slow to import and only needed with an API key
+
+        self.timeout = timeout
+        self.client = anthropic.Anthropic(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=1)
+        self.on_chunk = on_chunk
+        self.on_complete = on_complete
+        self.chunk_size = chunk_size
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_backlog = max_backlog
+        self.metrics = metrics
+        self._cycles = {}  # cycle number -> {'status': {...}, 'analysis': merged so far}
+        self._pending = deque()  # (cycle number, prompt) not sent yet, oldest first
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._closed = False
+        self._workers = [threading.Thread(target=self._work, name=f'ai-analysis-{i}', daemon=True)
+                         for i in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close, drop_pending=True)
+
+    def submit(self, cycle_number, faults, engineer_info):
+        """Queue every fault of a cycle for analysis; return the number of chunks."""
+        chunks = [faults[i:i + self.chunk_size] for i in range(0, len(faults), self.chunk_size)]
+        if not chunks:
+            return 0
+
+        prompts = [build_prompt(chunk, len(faults), engineer_info, index, len(chunks))
+                   for index, chunk in enumerate(chunks)]
+        with self._lock:
+            self._cycles[cycle_number] = {
+                'status': {'chunks_total': len(chunks), 'chunks_done': 0, 'chunks_failed': 0,
+                           'chunks_shed': 0, 'complete': False},
+                'analysis': {},
+            }
+            self._pending.extend((cycle_number, prompt) for prompt in prompts)
+            waiting = list(dict.fromkeys(number for number, _ in self._pending))
+            oldest = set(waiting[:max(len(waiting) - self.max_backlog, 0)])
+            shed = Counter(number for number, _ in self._pending if number in oldest)
+            if shed:
+                self._pending = deque(item for item in self._pending if item[0] not in shed)
+            self._ready.notify_all()
+
+        self._shed(shed, "AI backlog full")
+        return len(chunks)
+
+    def _shed(self, shed, reason):
+        """Report ``shed`` (cycle number -> count) unsent chunks as failed."""
+        for number, count in shed.items():
+            print(f"\n⚠️  {reason}: shedding {count} unsent chunk(s) of cycle {number}")
+            if self.metrics is not None:
+                self.metrics.inc('monitor_ai_shed_total', count)
+            self._finish(number, None, shed=count)
+
+    def analyze(self, prompt):
+        """Send one prompt and return the parsed analysis, or None."""
+        message = self.client.messages.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return parse_response(message.content[0].text)
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._ready.wait()
+                if not self._pending:
+                    return
+                cycle_number, prompt = self._pending.popleft()
+            self._run_chunk(cycle_number, prompt)
+
+    def _run_chunk(self, cycle_number, prompt):
+        started = time.perf_counter()
+        try:
+            part = self.analyze(prompt)
+        except Exception as e:
+            print(f"\n⚠️  AI Analysis Error (cycle {cycle_number}): {e}")
+            part = None
+        if self.metrics is not None:
+            self.metrics.observe('monitor_ai_request_seconds', time.perf_counter() - started)
+            self.metrics.inc('monitor_ai_calls_total')
+            if part is None:
+                self.metrics.inc('monitor_ai_failures_total')
+        self._finish(cycle_number, part)
+
+    def _finish(self, cycle_number, part, shed=0):
+        """Record a finished chunk (or ``shed`` dropped ones) and notify the handlers."""
+        with self._lock:
+            state = self._cycles[cycle_number]
+            status = state['status']
+            count = shed or 1
+            status['chunks_done'] += count
+            status['chunks_shed'] += shed
+            if part is None:
+                status['chunks_failed'] += count
+            else:
+                merge_analysis(state['analysis'], part)
+            status['complete'] = status['chunks_done'] == status['chunks_total']
+            status = dict(status)
+            if status['complete']:
+                del self._cycles[cycle_number]
+                analysis = state['analysis'] if status['chunks_failed'] < status['chunks_total'] else None
+
+        try:
+            self.on_chunk(cycle_number, part, status)
+            if status['complete'] and self.on_complete is not None:
+                self.on_complete(cycle_number, analysis)
+        except Exception as e:
+            print(f"\n⚠️  AI result handler failed (cycle {cycle_number}): {e}")
+
+    def close(self, wait=True, drop_pending=False):
+        """Stop the workers once the queued chunks are sent; with ``wait`` block until they are.
+
+        With ``drop_pending`` (what runs at interpreter exit) unsent chunks are
+        shed instead, and only requests already in flight are waited for, up
+        to one request ``timeout``.
+        """
+        with self._lock:
+            self._closed = True
+            shed = Counter(number for number, _ in self._pending) if drop_pending else Counter()
+            if drop_pending:
+                self._pending.clear()
+            self._ready.notify_all()
+        self._shed(shed, "Shutting down")
+        if wait:
+            deadline = time.monotonic() + self.timeout if drop_pending else None
+            for worker in self._workers:
+                worker.join(None if deadline is None else max(deadline - time.monotonic(), 0))
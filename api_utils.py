@@ -0,0 +1,181 @@
+"""HTTP helpers for the JSON API: conditional GET, compression, deltas and paging.
+
+``cached_json`` answers with 304 when the client's ``If-None-Match`` (or
+``If-Modified-Since``) still matches, and otherwise serializes the payload
+once per version and encoding: polling clients that share a URL share one
+encoded body from a small LRU. Bodies over ``COMPRESS_MIN_BYTES`` are sent
+gzip- or deflate-encoded when the client accepts it.
+
+Listings take ``sort=<field>`` (``-field`` for descending), ``limit``,
+``cursor`` and ``fields=a,b,c``. Cursors are keyset positions (the sort
+value and id of the last record sent), so pages stay consistent while new
+records arrive.
+"""
+import base64
+import bisect
+import gzip
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import current_app, request
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 5
+BODY_CACHE_ENTRIES = 64
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+_bodies = OrderedDict()  # (url, etag, encoding) -> bytes
+_bodies_lock = threading.Lock()
+
+
+def make_etag(*parts):
+    """Weak ETag over ``parts``; weak because the encoded bytes vary by encoding."""
+    digest = hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _not_modified(etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        # Weak comparison: W/"x" matches "x"
+        return '*' in tags or any(t.removeprefix('W/') == etag.removeprefix('W/') for t in tags)
+    if last_modified is not None and request.if_modified_since is not None:
+        return int(last_modified.timestamp()) <= int(request.if_modified_since.timestamp())
+    return False
+
+
+def _encode(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+    if encoding == 'deflate':
+        return zlib.compress(body, COMPRESS_LEVEL)
+    return body
+
+
+def _cached_body(key, build):
+    with _bodies_lock:
+        body = _bodies.get(key)
+        if body is not None:
+            _bodies.move_to_end(key)
+            return body
+    body = build()
+    with _bodies_lock:
+        _bodies[key] = body
+        while len(_bodies) > BODY_CACHE_ENTRIES:
+            _bodies.popitem(last=False)
+    return body
+
+
+def cached_json(etag, build, last_modified=None):
+    """JSON response for ``build()`` with validators, 304s and compression.
+
+    ``etag`` must change whenever ``build()`` would return something else;
+    ``build`` is only called when the client's copy is stale.
+    """
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if last_modified is not None:
+        headers['Last-Modified'] = last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')
+    if _not_modified(etag, last_modified):
+        return current_app.response_class(status=304, headers=headers)
+
+    url = request.full_path
+    body = _cached_body((url, etag, None), lambda: current_app.json.dumps(build()).encode('utf-8') + b'\n')
+
+    encoding = None
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = request.accept_encodings.best_match(['gzip', 'deflate'])
+    if encoding is not None:
+        body = _cached_body((url, etag, encoding), lambda: _encode(body, encoding))
+        headers['Content-Encoding'] = encoding
+
+    return current_app.response_class(body, mimetype='application/json', headers=headers)
+
+
+def diff_by_key(old, new, key):
+    """Return ``(changed, removed)``: records of ``new`` not identical in ``old``,
+    and keys present in ``old`` but gone from ``new``."""
+    before = {record.get(key): record for record in old}
+    after = {record.get(key) for record in new}
+    changed = [record for record in new if before.get(record.get(key)) != record]
+    removed = [k for k in before if k not in after]
+    return changed, removed
+
+
+class BadRequest(ValueError):
+    """A malformed paging parameter; routes answer it with a 400."""
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise BadRequest(f"invalid cursor {cursor!r}")
+    if not isinstance(position, list) or len(position) != 3:
+        raise BadRequest(f"invalid cursor {cursor!r}")
+    return tuple(position)
+
+
+def page_args(default_sort=None, default_limit=PAGE_SIZE):
+    """Read ``sort``, ``cursor``, ``limit`` and ``fields`` from the query string."""
+    limit = request.args.get('limit', default_limit, type=int)
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise BadRequest(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    cursor = request.args.get('cursor')
+    fields = request.args.get('fields')
+    return {
+        'sort': request.args.get('sort', default_sort),
+        'cursor': decode_cursor(cursor) if cursor else None,
+        'limit': limit,
+        'fields': [f for f in fields.split(',') if f] if fields else None,
+    }
+
+
+def paginate(records, key, sort=None, cursor=None, limit=PAGE_SIZE, fields=None):
+    """Return ``(page, next_cursor)`` of ``records`` sorted by ``sort`` (default ``key``).
+
+    ``key`` is a unique field that breaks ties. Records missing the sort
+    field come last in either direction; a field no record has is a
+    ``BadRequest``. ``limit=None`` returns everything after the cursor.
+    """
+    field = (sort or key).lstrip('-')
+    descending = bool(sort) and sort.startswith('-')
+    if records and not any(field in record for record in records):
+        raise BadRequest(f"unknown sort field {field!r}")
+
+    def position(record):
+        value = record.get(field)
+        return (value is not None if descending else value is None, value, record.get(key))
+
+    try:
+        ordered = sorted(records, key=position)
+        if descending:
+            end = bisect.bisect_left(ordered, cursor, key=position) if cursor else len(ordered)
+            start = 0 if limit is None else max(0, end - limit)
+            page = ordered[start:end][::-1]
+            more = start > 0
+        else:
+            start = bisect.bisect_right(ordered, cursor, key=position) if cursor else 0
+            end = len(ordered) if limit is None else start + limit
+            page = ordered[start:end]
+            more = end < len(ordered)
+    except TypeError:
+        raise BadRequest(f"cannot sort by {field!r}")
+
+    next_cursor = encode_cursor(list(position(page[-1]))) if page and more else None
+    return project(page, fields), next_cursor
+
+
+def project(records, fields):
+    """Keep only ``fields`` of each record (all of them when ``fields`` is None)."""
+    if not fields:
+        return records
+    return [{f: record[f] for f in fields if f in record} for record in records]
@@ -1,9 +1,19 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, g, render_template, request, jsonify, session, redirect, url_for
+import calendar
 import json
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 from collections import defaultdict
-import glob
+
+from api_utils import PAGE_SIZE, BadRequest, cached_json, diff_by_key, make_etag, page_args, paginate
+from archive import ArchiveReader
+from cycle_cache import CycleCache, CustomerHistoryIndex, JsonCycleFiles
+from cycle_segments import SegmentReader
+from events import CachePoller, CycleEvents, EventBus
+from metrics import Registry
+from rollups import DEFAULT_WINDOW, KINDS, RESOLUTIONS, RollupStore
+from store import JournaledStore, SqliteStore
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
@@ -26,15 +36,9 @@ USERS = {
     'admin': {'password': 'admin123', 'role': 'admin', 'name': 'System Administrator'}
 }
 
-# In-memory storage for issues, notifications, and task status
-# In production, use a proper database
-ISSUES = []
-NOTIFICATIONS = []
-TASK_STATUS = {}  # {customer_id: {'status': 'pending/in_progress/completed', 'engineer': 'name', 'notes': '...'}}
-
 
 def load_issues():
-    """Load issues from file."""
+    """Load issues from the pre-journal issues.json file."""
     try:
         if os.path.exists('issues.json'):
             with open('issues.json', 'r', encoding='utf-8') as f:
@@ -44,17 +48,8 @@ def load_issues():
     return []
 
 
-def save_issues():
-    """Save issues to file."""
-    try:
-        with open('issues.json', 'w', encoding='utf-8') as f:
-            json.dump(ISSUES, f, indent=2)
-    except:
-        pass
-
-
 def load_notifications():
-    """Load notifications from file."""
+    """Load notifications from the pre-journal notifications.json file."""
     try:
         if os.path.exists('notifications.json'):
             with open('notifications.json', 'r', encoding='utf-8') as f:
@@ -64,17 +59,8 @@ def load_notifications():
     return []
 
 
-def save_notifications():
-    """Save notifications to file."""
-    try:
-        with open('notifications.json', 'w', encoding='utf-8') as f:
-            json.dump(NOTIFICATIONS, f, indent=2)
-    except:
-        pass
-
-
 def load_task_status():
-    """Load task status from file."""
+    """Load task status from the pre-journal task_status.json file."""
     try:
         if os.path.exists('task_status.json'):
             with open('task_status.json', 'r', encoding='utf-8') as f:
@@ -84,75 +70,99 @@ def load_task_status():
     return {}
 
 
-def save_task_status():
-    """Save task status to file."""
-    try:
-        with open('task_status.json', 'w', encoding='utf-8') as f:
-            json.dump(TASK_STATUS, f, indent=2)
-    except:
-        pass
-
-
-# Load data on startup
-ISSUES = load_issues()
-NOTIFICATIONS = load_notifications()
-TASK_STATUS = load_task_status()
+# Issues, notifications and task status. 'json' replays a snapshot + journal
+# on startup (one process only); 'sqlite' shares one WAL database between
+# worker processes, e.g. under gunicorn -w 4.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+if STORAGE_BACKEND == 'sqlite':
+    STORE = SqliteStore(os.environ.get('STATE_DB', 'state.db'))
+else:
+    STORE = JournaledStore(os.environ.get('STATE_DIR', 'state'))
+if STORE.is_new:
+    # First start with a journal: carry over the old JSON files once
+    STORE.import_state(load_issues(), load_notifications(), load_task_status())
+
+ISSUES = STORE.issues
+NOTIFICATIONS = STORE.notifications
+TASK_STATUS = STORE.task_status
+
+# Trend rollups written by the monitor as it logs each cycle
+ROLLUPS = RollupStore(os.environ.get('ROLLUP_DB', 'rollups.db'))
+
+# Dashboards render only this many issues/tasks; the rest is paged through the API
+DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 50))
+
+CYCLE_SEGMENT_DIR = os.environ.get('CYCLE_SEGMENT_DIR', 'cycle_segments')
+CYCLE_ARCHIVE_DIR = os.environ.get('CYCLE_ARCHIVE_DIR', 'cycle_archive')
+
+# Parsed cycles from segments, exported JSON files and the daily archives
+# (a cycle found in several is served once), shared by every route that reads cycles
+CYCLE_CACHE = CycleCache(
+    [JsonCycleFiles('.'), SegmentReader(CYCLE_SEGMENT_DIR), ArchiveReader(CYCLE_ARCHIVE_DIR)],
+    max_bytes=int(os.environ.get('CYCLE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+)
+
+# customer_id -> recent fault records, built on the first history request and
+# extended as the cache picks up new cycles
+CUSTOMER_INDEX = CustomerHistoryIndex(CYCLE_CACHE, int(os.environ.get('CUSTOMER_HISTORY_MAX_RECORDS', 100)))
+
+# Push notifications for /api/events. The bus is per process: with several
+# workers a dashboard only receives the issue/task events of the worker that
+# serves its stream. Cycle events reach every worker, since each one polls the
+# shared cycle store; updates to a cycle are coalesced to one per interval.
+EVENTS = EventBus()
+CYCLE_EVENTS = CycleEvents(EVENTS, float(os.environ.get('CYCLE_UPDATE_INTERVAL', 30.0)))
+CYCLE_CACHE.subscribe(CYCLE_EVENTS)
+CYCLE_POLLER = CachePoller(CYCLE_CACHE, float(os.environ.get('CYCLE_POLL_INTERVAL', 2.0)),
+                           on_ready=CYCLE_EVENTS.start, on_tick=CYCLE_EVENTS.flush)
+
+# Route timings for /metrics, which also serves the monitor's metrics file
+METRICS = Registry()
+METRICS.describe('http_request_duration_seconds', 'histogram', "Wall time of each request until the response is returned")
+MONITOR_METRICS_FILE = os.environ.get('METRICS_FILE', 'monitor_metrics.prom')
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        METRICS.observe('http_request_duration_seconds', time.perf_counter() - started,
+                        route=route, method=request.method, status=response.status_code)
+    return response
 
 
 def get_latest_cycle_data():
-    """Get the most recent cycle JSON file."""
-    json_files = glob.glob('cycle_*.json')
-    if not json_files:
-        return None
-
-    latest_file = max(json_files, key=os.path.getctime)
-
-    try:
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return None
+    """Get the most recent cycle."""
+    return CYCLE_CACHE.latest()
 
 
 def get_all_cycle_data():
-    """Get all cycle JSON files sorted by cycle number."""
-    json_files = glob.glob('cycle_*.json')
-    if not json_files:
-        return []
-
-    cycles = []
-    for file in json_files:
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                cycles.append(data)
-        except:
-            continue
-
-    # Sort by cycle number
-    cycles.sort(key=lambda x: x.get('cycle_number', 0))
-    return cycles
+    """Get all cached cycles sorted by cycle number."""
+    return CYCLE_CACHE.cycles()
 
 
 def get_customer_history(customer_id):
     """Get fault history for a specific customer."""
-    cycles = get_all_cycle_data()
-    history = []
+    CYCLE_CACHE.refresh()
+    return CUSTOMER_INDEX.history(customer_id)
 
-    for cycle in cycles:
-        for fault in cycle.get('faults', []):
-            if fault.get('customer_id') == customer_id:
-                history.append({
-                    'cycle': cycle.get('cycle_number'),
-                    'timestamp': cycle.get('timestamp'),
-                    'old_output': fault.get('old_output'),
-                    'new_output': fault.get('new_output'),
-                    'change_percentage': fault.get('change_percentage'),
-                    'assigned_engineer': fault.get('assigned_engineer'),
-                    'status': 'Resolved' if cycle.get('cycle_number', 0) < len(cycles) - 2 else 'Pending'
-                })
 
-    return history
+def get_cycle_insights(cycle):
+    """The cycle's AI analysis, with the local routes and fault clusters filling in what the AI did not give."""
+    if not cycle:
+        return None
+    insights = cycle.get('ai_analysis')
+    if cycle.get('optimized_routes') and not (insights or {}).get('optimized_routes'):
+        insights = dict(insights or {}, optimized_routes=cycle['optimized_routes'])
+    if cycle.get('clusters') and not (insights or {}).get('patterns_detected'):
+        insights = dict(insights or {}, patterns_detected=[c['description'] for c in cycle['clusters'][:10]])
+    return insights or None
 
 
 def get_engineer_tasks(engineer_name):
@@ -238,7 +248,7 @@ def customer_dashboard():
     history = get_customer_history(customer_id)
 
     # Get customer's issues
-    customer_issues = [issue for issue in ISSUES if issue['customer_id'] == customer_id]
+    customer_issues = ISSUES.for_customer(customer_id)
 
     # Get task status
     task_status = TASK_STATUS.get(str(customer_id))
@@ -269,12 +279,11 @@ def engineer_dashboard():
     latest_data = get_latest_cycle_data()
 
     # Get assigned issues
-    assigned_issues = [issue for issue in ISSUES if
-                       issue.get('assigned_engineer') == engineer_name and issue['status'] != 'resolved']
+    assigned_issues = ISSUES.for_engineer(engineer_name)
 
     # Get notifications
-    engineer_notifications = [notif for notif in NOTIFICATIONS if notif['engineer_name'] == engineer_name]
-    unread_count = sum(1 for n in engineer_notifications if not n.get('read', False))
+    engineer_notifications = NOTIFICATIONS.for_engineer(engineer_name, limit=10)
+    unread_count = NOTIFICATIONS.unread_count(engineer_name)
 
     # Calculate statistics
     total_tasks = len(tasks) + len(assigned_issues)
@@ -282,16 +291,15 @@ def engineer_dashboard():
     high_priority += sum(1 for i in assigned_issues if i.get('priority') == 'high')
 
     # Get AI analysis for current tasks
-    ai_insights = None
-    if latest_data and latest_data.get('ai_analysis'):
-        ai_insights = latest_data.get('ai_analysis')
+    ai_insights = get_cycle_insights(latest_data)
 
     return render_template('engineer_dashboard.html',
                            engineer_name=engineer_name,
                            specialty=user_data.get('specialty'),
-                           tasks=tasks,
-                           assigned_issues=assigned_issues,
-                           notifications=engineer_notifications[-10:],  # Last 10 notifications
+                           tasks=tasks[:DASHBOARD_PAGE_SIZE],
+                           task_count=len(tasks),
+                           assigned_issues=assigned_issues[:DASHBOARD_PAGE_SIZE],
+                           notifications=engineer_notifications,  # Last 10 notifications
                            unread_count=unread_count,
                            total_tasks=total_tasks,
                            high_priority=high_priority,
@@ -313,11 +321,11 @@ def admin_dashboard():
 
     # Calculate statistics
     stats = {
-        'total_cycles': len(cycles),
+        'total_cycles': CYCLE_CACHE.total_cycles,
         'total_customers': 1000,  # From your monitoring system
         'active_faults': latest_data.get('total_faults', 0) if latest_data else 0,
         'total_engineers': 5,
-        'open_issues': sum(1 for i in ISSUES if i['status'] != 'resolved'),
+        'open_issues': ISSUES.open_count(),
         'total_issues': len(ISSUES)
     }
 
@@ -326,7 +334,7 @@ def admin_dashboard():
     engineer_summary = latest_data.get('summary', {}).get('engineers', {}) if latest_data else {}
 
     # Get AI analysis
-    ai_analysis = latest_data.get('ai_analysis') if latest_data else None
+    ai_analysis = get_cycle_insights(latest_data)
 
     # Get all engineers for dropdown
     engineers = [
@@ -344,29 +352,241 @@ def admin_dashboard():
                            feeder_summary=feeder_summary,
                            engineer_summary=engineer_summary,
                            ai_analysis=ai_analysis,
-                           issues=ISSUES,
+                           issues=ISSUES.recent(DASHBOARD_PAGE_SIZE),  # newest first
                            engineers=engineers)
 
 
+def api_validators(*parts):
+    """ETag and Last-Modified for a response built from the cycles and the store."""
+    cycle_number, count, size, written_ns = CYCLE_CACHE.fingerprint()
+    etag = make_etag(cycle_number, count, size, written_ns, STORE.version, *parts)
+    last_modified = datetime.fromtimestamp(written_ns / 1e9, timezone.utc) if written_ns else None
+    return etag, last_modified
+
+
+def since_arg():
+    """The ``since=<cycle>`` delta parameter, or None."""
+    return request.args.get('since', type=int)
+
+
+def latest_delta(latest, since):
+    """Faults of the latest cycle that differ from cycle ``since``, or None if it is not cached."""
+    base = CYCLE_CACHE.find(since)
+    if base is None:
+        return None
+    changed, removed = diff_by_key(base.get('faults', []), latest.get('faults', []), 'customer_id')
+    return changed, removed
+
+
+@app.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify({'error': str(error)}), 400
+
+
+def paged_list(records, key, default_sort=None):
+    """Sort and project ``records``; page them only when ``limit`` or ``cursor`` is given.
+
+    Paged responses are ``{"items": [...], "next_cursor": ...}``; otherwise
+    the plain list is returned as before.
+    """
+    paging = 'limit' in request.args or 'cursor' in request.args
+    args = page_args(default_sort, default_limit=PAGE_SIZE if paging else None)
+    items, next_cursor = paginate(records, key, **args)
+    return {'items': items, 'next_cursor': next_cursor} if paging else items
+
+
 @app.route('/api/latest-data')
 def api_latest_data():
-    """API endpoint to get latest cycle data."""
-    data = get_latest_cycle_data()
-    return jsonify(data if data else {})
+    """API endpoint to get latest cycle data.
+
+    Faults are sortable with ``sort=`` (e.g. ``-change_percentage``) and
+    projectable with ``fields=``. Like the other listings they are paged only
+    when ``limit`` or ``cursor`` is given; ``next_cursor`` then fetches the
+    following page. With ``?since=<cycle>`` only faults that are new or
+    changed since that cycle are listed, plus ``removed_customer_ids``.
+    """
+    since = since_arg()
+    paging = 'limit' in request.args or 'cursor' in request.args
+    args = page_args(default_limit=PAGE_SIZE if paging else None)
+
+    def build():
+        data = get_latest_cycle_data()
+        if not data:
+            return {}
+        faults = data.get('faults', [])
+        extra = {}
+        if since is not None:
+            delta = latest_delta(data, since)
+            if delta is None:
+                extra = {'delta': False}
+            else:
+                faults, removed = delta
+                extra = {'removed_customer_ids': removed, 'since': since, 'delta': True}
+        page, next_cursor = paginate(faults, 'customer_id', **args)
+        if paging:
+            extra['next_cursor'] = next_cursor
+        return {**data, 'faults': page, **extra}
+
+    etag, last_modified = api_validators('latest', since, sorted(request.args.items()))
+    return cached_json(etag, build, last_modified)
 
 
 @app.route('/api/customer/<int:customer_id>')
 def api_customer_data(customer_id):
-    """API endpoint to get specific customer data."""
-    history = get_customer_history(customer_id)
-    return jsonify(history)
+    """API endpoint to get specific customer data.
+
+    With ``?since=<cycle>`` only records after that cycle are returned, plus
+    the two before it whose Pending status may have changed since.
+    """
+    since = since_arg()
+    page_args()  # reject bad paging parameters before the 304 check
+
+    def build():
+        history = get_customer_history(customer_id)
+        if since is not None:
+            history = [record for record in history if (record.get('cycle') or 0) > since - 3]
+        return paged_list(history, 'cycle')
+
+    etag, last_modified = api_validators('customer', customer_id, sorted(request.args.items()))
+    return cached_json(etag, build, last_modified)
 
 
 @app.route('/api/engineer/<engineer_name>')
 def api_engineer_tasks(engineer_name):
-    """API endpoint to get engineer tasks."""
-    tasks = get_engineer_tasks(engineer_name)
-    return jsonify(tasks)
+    """API endpoint to get engineer tasks.
+
+    With ``?since=<cycle>`` the response is ``{"tasks": [...changed...],
+    "removed_customer_ids": [...]}`` relative to that cycle's tasks.
+    """
+    since = since_arg()
+    page_args()
+
+    def build():
+        tasks = get_engineer_tasks(engineer_name)
+        if since is None:
+            return paged_list(tasks, 'customer_id')
+        latest = get_latest_cycle_data() or {}
+        base = CYCLE_CACHE.find(since)
+        if base is None:
+            return {'cycle_number': latest.get('cycle_number'), 'tasks': paged_list(tasks, 'customer_id'),
+                    'delta': False}
+        previous = [f for f in base.get('faults', []) if f.get('assigned_engineer') == engineer_name]
+        changed, removed = diff_by_key(previous, tasks, 'customer_id')
+        return {'cycle_number': latest.get('cycle_number'), 'since': since, 'delta': True,
+                'tasks': paged_list(changed, 'customer_id'), 'removed_customer_ids': removed}
+
+    etag, last_modified = api_validators('engineer', engineer_name, sorted(request.args.items()))
+    return cached_json(etag, build, last_modified)
+
+
+@app.route('/api/cycles')
+def api_cycles():
+    """Cached cycles without their faults, newest first; paged like the faults."""
+    args = page_args(default_sort='-cycle_number')
+
+    def build():
+        cycles = [{'cycle_number': c.get('cycle_number'), 'timestamp': c.get('timestamp'),
+                   'total_faults': c.get('total_faults', 0), 'ai_analysis': bool(c.get('ai_analysis'))}
+                  for c in get_all_cycle_data()]
+        page, next_cursor = paginate(cycles, 'cycle_number', **args)
+        return {'cycles': page, 'total_cycles': CYCLE_CACHE.total_cycles, 'next_cursor': next_cursor}
+
+    etag, last_modified = api_validators('cycles', sorted(request.args.items()))
+    return cached_json(etag, build, last_modified)
+
+
+@app.route('/api/issues')
+def api_issues():
+    """Issues for the admin, newest first, optionally filtered by ``status=``; paged."""
+    if 'username' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 401
+    args = page_args(default_sort='-id')
+    status = request.args.get('status')
+
+    def build():
+        issues = ISSUES.with_status(status) if status else ISSUES.all()
+        page, next_cursor = paginate(issues, 'id', **args)
+        return {'issues': page, 'total_issues': len(issues), 'next_cursor': next_cursor}
+
+    etag, _ = api_validators('issues', sorted(request.args.items()))
+    return cached_json(etag, build)
+
+
+def time_arg(name):
+    """``start``/``end`` as rollup bucket seconds: epoch seconds or an ISO date/time."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        return calendar.timegm(datetime.fromisoformat(value).timetuple())
+    except ValueError:
+        raise BadRequest(f"invalid {name} {value!r}")
+
+
+@app.route('/api/rollups')
+def api_rollups():
+    """Fault trends: ``?resolution=minute|hour|day&kind=all|feeder|engineer[&name=..][&start=..&end=..]``.
+
+    Without ``start`` the window ends at the newest data and spans 6 hours
+    (minute), 7 days (hour) or a year (day). Series are columnar, one per
+    feeder or engineer.
+    """
+    resolution = request.args.get('resolution', 'hour')
+    kind = request.args.get('kind', 'all')
+    if resolution not in RESOLUTIONS or kind not in KINDS:
+        raise BadRequest(f"resolution must be one of {sorted(RESOLUTIONS)} and kind one of {sorted(KINDS)}")
+    names = request.args.getlist('name') or None
+    start, end = time_arg('start'), time_arg('end')
+
+    def build():
+        window_start, window_end = start, end
+        if window_start is None:
+            last = ROLLUPS.last_bucket()
+            window_end = window_end if window_end is not None else (last + 60 if last is not None else None)
+            window_start = window_end - DEFAULT_WINDOW[resolution] if window_end is not None else None
+        return {'resolution': resolution, 'kind': kind, 'start': window_start, 'end': window_end,
+                'series': ROLLUPS.series(resolution, kind, names, window_start, window_end)}
+
+    etag, last_modified = api_validators('rollups', sorted(request.args.items(multi=True)))
+    return cached_json(etag, build, last_modified)
+
+
+@app.route('/api/events')
+def api_events():
+    """Server-Sent Events: new cycles, issue assignments and task status changes.
+
+    Engineers and customers only receive their own events; admins (or callers
+    without a session) may filter with ?engineer= or ?customer_id=. Issue and
+    task events come from this worker process only (see EVENTS).
+    """
+    role = session.get('role')
+    user_data = session.get('user_data') or {}
+    if role == 'engineer':
+        engineer, customer = user_data.get('engineer_name'), None
+    elif role == 'customer':
+        engineer, customer = None, user_data.get('customer_id')
+    else:
+        engineer, customer = request.args.get('engineer'), request.args.get('customer_id')
+
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    CYCLE_POLLER.ensure_started()
+    return Response(EVENTS.stream(int(last_id) if last_id and last_id.isdigit() else None, engineer, customer),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition: this process's route timings and the monitor's metrics."""
+    body = METRICS.render()
+    try:
+        with open(MONITOR_METRICS_FILE, encoding='utf-8') as f:
+            body += f.read()
+    except FileNotFoundError:
+        pass
+    return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 @app.route('/raise-issue', methods=['POST'])
@@ -379,7 +599,6 @@ def raise_issue():
     customer_id = user_data.get('customer_id')
 
     issue_data = {
-        'id': len(ISSUES) + 1,
         'customer_id': customer_id,
         'customer_name': user_data.get('name'),
         'issue_type': request.form.get('issue_type'),
@@ -390,8 +609,10 @@ def raise_issue():
         'assigned_engineer': None
     }
 
-    ISSUES.append(issue_data)
-    save_issues()
+    issue = STORE.add_issue(issue_data)
+    EVENTS.publish('issue_raised', {'issue_id': issue['id'], 'customer_id': customer_id,
+                                    'priority': issue_data['priority']},
+                   customers=[customer_id])
 
     return redirect(url_for('customer_dashboard'))
 
@@ -406,26 +627,21 @@ def assign_engineer():
     engineer_name = request.form.get('engineer_name')
 
     # Find and update issue
-    for issue in ISSUES:
-        if issue['id'] == issue_id:
-            issue['assigned_engineer'] = engineer_name
-            issue['status'] = 'assigned'
-
-            # Create notification for engineer
-            notification = {
-                'id': len(NOTIFICATIONS) + 1,
-                'engineer_name': engineer_name,
-                'issue_id': issue_id,
-                'customer_id': issue['customer_id'],
-                'message': f"New task assigned: {issue['issue_type']} for Customer #{issue['customer_id']}",
-                'timestamp': datetime.now().isoformat(),
-                'read': False
-            }
-            NOTIFICATIONS.append(notification)
-            save_notifications()
-            break
-
-    save_issues()
+    issue = STORE.update_issue(issue_id, assigned_engineer=engineer_name, status='assigned')
+    if issue:
+        # Create notification for engineer
+        STORE.add_notification({
+            'engineer_name': engineer_name,
+            'issue_id': issue_id,
+            'customer_id': issue['customer_id'],
+            'message': f"New task assigned: {issue['issue_type']} for Customer #{issue['customer_id']}",
+            'timestamp': datetime.now().isoformat(),
+            'read': False
+        })
+        EVENTS.publish('issue_assigned', {'issue_id': issue_id, 'customer_id': issue['customer_id'],
+                                          'engineer': engineer_name},
+                       engineers=[engineer_name], customers=[issue['customer_id']])
+
     return redirect(url_for('admin_dashboard'))
 
 
@@ -443,19 +659,18 @@ def update_task_status():
     notes = request.form.get('notes', '')
 
     # Update task status
-    TASK_STATUS[customer_id] = {
+    STORE.set_task_status(customer_id, {
         'status': status,
         'engineer': engineer_name,
         'notes': notes,
         'timestamp': datetime.now().isoformat()
-    }
-    save_task_status()
+    })
 
     # Mark notifications as read
-    for notification in NOTIFICATIONS:
-        if notification['engineer_name'] == engineer_name and str(notification['customer_id']) == customer_id:
-            notification['read'] = True
-    save_notifications()
+    STORE.mark_notifications_read(engineer_name, customer_id)
+
+    EVENTS.publish('task_status', {'customer_id': customer_id, 'status': status, 'engineer': engineer_name},
+                   engineers=[engineer_name], customers=[customer_id])
 
     return redirect(url_for('engineer_dashboard'))
 
@@ -470,14 +685,12 @@ def mark_issue_resolved():
     notes = request.form.get('notes', '')
 
     # Find and update issue
-    for issue in ISSUES:
-        if issue['id'] == issue_id:
-            issue['status'] = 'resolved'
-            issue['resolution_notes'] = notes
-            issue['resolved_at'] = datetime.now().isoformat()
-            break
-
-    save_issues()
+    issue = STORE.update_issue(issue_id, status='resolved', resolution_notes=notes,
+                               resolved_at=datetime.now().isoformat())
+    if issue:
+        EVENTS.publish('issue_resolved', {'issue_id': issue_id, 'customer_id': issue['customer_id']},
+                       engineers=[issue.get('assigned_engineer')], customers=[issue['customer_id']])
+
     return redirect(url_for('engineer_dashboard'))
 
 
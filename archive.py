@@ -0,0 +1,262 @@
+"""Retention: compact old cycles into daily zip archives the app can still read.
+
+Cycles older than the retention window move out of the exported
+``cycle_*.json`` files and the sealed segments of the segment store into
+one zip per day (``cycles_YYYY-MM-DD.zip``, a compact JSON member per
+cycle). ``index.json`` lists every archived cycle with its original write
+time and size, so ``ArchiveReader`` (a ``CycleCache`` source) scans the
+archive without opening any zip. Archives and the index are rebuilt in a
+temporary file and renamed into place; the source files are deleted only
+after that, so a reader sees each cycle at least once throughout.
+
+``rotate_fault_log`` moves whole blocks of ``fault_log.txt`` older than the
+window into ``fault_log_YYYY-MM-DD.txt.gz``. It rewrites the live log, so
+only the process appending to it (the monitor) may call it.
+
+Compact by hand (with the monitor stopped if ``--fault-log`` is given):
+
+    python archive.py --keep-hours 48 --fault-log fault_log.txt
+"""
+import argparse
+import fnmatch
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from collections import defaultdict
+
+from cycle_segments import SegmentReader
+
+INDEX_NAME = 'index.json'
+ARCHIVE_PREFIX = 'cycles_'
+LOG_SEPARATOR = '=' * 80 + '\n'
+
+
+def _replace(path, write, binary=True):
+    """Write ``path`` through ``write(f)`` on a temporary file, then rename it into place."""
+    directory, name = os.path.split(path)
+    temp = os.path.join(directory, f".{name}.tmp")
+    try:
+        with open(temp, 'wb' if binary else 'w', **({} if binary else {'encoding': 'utf-8'})) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+
+def load_index(directory):
+    """``{archive name: [[member, cycle_number, written_ns, size], ...]}``."""
+    try:
+        with open(os.path.join(directory, INDEX_NAME), encoding='utf-8') as f:
+            return json.load(f)['archives']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def archive_cycles(directory, cycles):
+    """Add ``(day, written_ns, cycle)`` tuples to the daily archives and the index."""
+    os.makedirs(directory, exist_ok=True)
+    index = load_index(directory)
+    by_day = defaultdict(list)
+    for day, written_ns, cycle in cycles:
+        by_day[day].append((written_ns, cycle))
+
+    for day, new in sorted(by_day.items()):
+        name = f"{ARCHIVE_PREFIX}{day}.zip"
+        path = os.path.join(directory, name)
+        entries = [entry for entry in index.get(name, []) if os.path.exists(path)]
+
+        def write(f):
+            with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as out:
+                if entries:
+                    with zipfile.ZipFile(path) as old:
+                        for entry in entries:
+                            out.writestr(old.getinfo(entry[0]), old.read(entry[0]))
+                for written_ns, cycle in sorted(new, key=lambda item: item[0]):
+                    member = f"cycle_{cycle.get('cycle_number', 0):06d}_{written_ns}.json"
+                    raw = json.dumps(cycle, separators=(',', ':')).encode('utf-8')
+                    out.writestr(member, raw)
+                    entries.append([member, cycle.get('cycle_number', 0), written_ns, len(raw)])
+
+        _replace(path, write)
+        index[name] = entries
+
+    _replace(os.path.join(directory, INDEX_NAME),
+             lambda f: json.dump({'archives': index}, f, separators=(',', ':')), binary=False)
+
+
+def _day(cycle, written_ns):
+    timestamp = cycle.get('timestamp')
+    if timestamp:
+        return timestamp[:10]
+    return time.strftime('%Y-%m-%d', time.localtime(written_ns / 1e9))
+
+
+def compact(archive_dir, segment_dir=None, json_dir=None, keep_hours=48, now=None):
+    """Archive cycles last written more than ``keep_hours`` ago; return how many moved.
+
+    Only sealed segments whose every record is older than the window are
+    archived, so the segment being written (and cycles still receiving AI
+    updates) stay where they are.
+    """
+    cutoff_ns = int(((now if now is not None else time.time()) - keep_hours * 3600) * 1e9)
+    cycles = []
+    remove = []
+
+    if json_dir is not None:
+        with os.scandir(json_dir) as it:
+            for entry in it:
+                if fnmatch.fnmatch(entry.name, 'cycle_*.json') and entry.is_file():
+                    written_ns = entry.stat().st_mtime_ns
+                    if written_ns < cutoff_ns:
+                        try:
+                            with open(entry.path, encoding='utf-8') as f:
+                                cycle = json.load(f)
+                        except (OSError, ValueError):
+                            continue
+                        cycles.append((_day(cycle, written_ns), written_ns, cycle))
+                        remove.append(entry.path)
+
+    if segment_dir is not None and os.path.isdir(segment_dir):
+        reader = SegmentReader(segment_dir)
+        keys = reader.scan()
+        old = {name for name, newest in reader.sealed().items() if newest < cutoff_ns}
+        for key, (written_ns, _) in sorted(keys.items(), key=lambda item: item[1][0]):
+            if key[0] in old:
+                cycle = reader.load(key)
+                if cycle is not None:
+                    cycles.append((_day(cycle, written_ns), written_ns, cycle))
+        remove.extend(os.path.join(segment_dir, name) for name in sorted(old))
+
+    if not cycles and not remove:
+        return 0
+    if cycles:
+        archive_cycles(archive_dir, cycles)
+    for path in remove:
+        os.remove(path)
+    return len(cycles)
+
+
+def rotate_fault_log(path, archive_dir, keep_hours=48, now=None):
+    """Move blocks of the text log older than ``keep_hours`` into daily gzip files.
+
+    Returns the number of blocks moved. Blocks are in time order, so
+    everything from the first recent block on is kept as is.
+    """
+    cutoff = time.strftime('%Y-%m-%d %H:%M:%S',
+                           time.localtime((now if now is not None else time.time()) - keep_hours * 3600))
+    if not os.path.exists(path):
+        return 0
+    os.makedirs(archive_dir, exist_ok=True)
+    moved = 0
+    outputs = {}
+
+    def flush(block):
+        nonlocal moved
+        if not ''.join(block).strip():
+            return
+        stamp = next((line for line in block if line.startswith('Timestamp: ')), None)
+        day = stamp[11:21] if stamp else 'undated'
+        out = outputs.get(day)
+        if out is None:
+            out = outputs[day] = gzip.open(os.path.join(archive_dir, f"fault_log_{day}.txt.gz"), 'at',
+                                           encoding='utf-8')
+        out.write(''.join(block))
+        moved += 1
+
+    def write(keep):
+        with open(path, encoding='utf-8') as f:
+            block = []
+            for line in f:
+                # Every block starts with a blank line, the separator and its timestamp
+                if line == LOG_SEPARATOR and block and block[-1] == '\n':
+                    flush(block[:-1])
+                    stamp = f.readline()
+                    block = ['\n', line, stamp]
+                    if stamp.startswith('Timestamp: ') and stamp[11:30] >= cutoff:
+                        keep.write(''.join(block))
+                        shutil.copyfileobj(f, keep)
+                        return
+                    continue
+                block.append(line)
+            flush(block)
+
+    try:
+        _replace(path, write, binary=False)
+    finally:
+        for out in outputs.values():
+            out.close()
+    return moved
+
+
+class ArchiveReader:
+    """``CycleCache`` source over the archive directory, driven by its index."""
+
+    def __init__(self, directory='cycle_archive'):
+        self.directory = directory
+        self._index_stamp = None
+        self._found = {}
+        self._zips = {}  # archive name -> (mtime_ns, ZipFile)
+        self._lock = threading.Lock()
+
+    def scan(self):
+        try:
+            st = os.stat(os.path.join(self.directory, INDEX_NAME))
+        except OSError:
+            return {}
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if stamp != self._index_stamp:
+                self._found = {(name, member): (written_ns, size)
+                               for name, entries in load_index(self.directory).items()
+                               for member, _, written_ns, size in entries}
+                self._index_stamp = stamp
+            return dict(self._found)
+
+    def _zip(self, name):
+        path = os.path.join(self.directory, name)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._zips.get(name)
+        if cached is None or cached[0] != mtime:
+            if cached is not None:
+                cached[1].close()
+            cached = self._zips[name] = (mtime, zipfile.ZipFile(path))
+        return cached[1]
+
+    def load(self, key):
+        name, member = key
+        try:
+            with self._lock:
+                raw = self._zip(name).read(member)
+            return json.loads(raw)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact old cycles into daily archives.")
+    parser.add_argument('--archive', default='cycle_archive')
+    parser.add_argument('--segments', default='cycle_segments')
+    parser.add_argument('--json-dir', default='.')
+    parser.add_argument('--keep-hours', type=float, default=48)
+    parser.add_argument('--fault-log', help="also rotate this text log (only while the monitor is stopped)")
+    args = parser.parse_args(argv)
+
+    count = compact(args.archive, args.segments, args.json_dir, args.keep_hours)
+    print(f"🗄️  Archived {count} cycles into {args.archive}")
+    if args.fault_log:
+        blocks = rotate_fault_log(args.fault_log, args.archive, args.keep_hours)
+        print(f"🗄️  Moved {blocks} fault log blocks into {args.archive}")
+
+
+if __name__ == '__main__':
+    main()
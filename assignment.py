@@ -0,0 +1,272 @@
+import time
+
+import numpy as np
+
+from geo import GridIndex, haversine_matrix, haversine_pairs, haversine_prepared, to_radians
+
+WORKLOAD_PENALTY_KM = 2  # Score = distance + workload * WORKLOAD_PENALTY_KM
+
+
+def greedy_assign_matrix(fault_lat, fault_lon, eng_lat, eng_lon, workload, block=2048):
+    """Greedy distance + workload assignment over a precomputed distance matrix.
+
+    Faults are taken in order and each goes to the lowest-scoring engineer
+    (first one on ties), exactly like the per-pair loop. Distances are computed
+    ``block`` faults at a time to bound memory. ``workload`` is updated in
+    place. Returns ``(engineer index, score)`` arrays per fault.
+    """
+    fault_lat = np.asarray(fault_lat, dtype=np.float64)
+    fault_lon = np.asarray(fault_lon, dtype=np.float64)
+    penalty = np.asarray(workload, dtype=np.float64) * WORKLOAD_PENALTY_KM
+
+    chosen = np.empty(len(fault_lat), dtype=np.int64)
+    scores = np.empty(len(fault_lat), dtype=np.float64)
+
+    for start in range(0, len(fault_lat), block):
+        stop = start + block
+        distances = haversine_matrix(fault_lat[start:stop], fault_lon[start:stop], eng_lat, eng_lon)
+        for i, row in enumerate(distances, start):
+            score = row + penalty
+            j = int(np.argmin(score))
+            chosen[i] = j
+            scores[i] = score[j]
+            penalty[j] += WORKLOAD_PENALTY_KM
+            workload[j] += 1
+
+    return chosen, scores
+
+
+def greedy_assign_grid(fault_lat, fault_lon, eng_lat, eng_lon, workload, cell_km=2.0, radius_km=4.0):
+    """Same assignments as ``greedy_assign_matrix``, scoring only nearby engineers.
+
+    Engineers are bucketed in a ``GridIndex``. For each fault the search radius
+    doubles until the best candidate scores below it; every engineer outside the
+    radius then scores at least the radius, so the choice matches a full scan.
+    """
+    index = GridIndex(eng_lat, eng_lon, cell_km=cell_km)
+    e_lat, e_cos, e_lon = to_radians(eng_lat, eng_lon)
+    f_lat, f_cos, f_lon = to_radians(fault_lat, fault_lon)
+    penalty = np.asarray(workload, dtype=np.float64) * WORKLOAD_PENALTY_KM
+
+    chosen = np.empty(len(f_lat), dtype=np.int64)
+    scores = np.empty(len(f_lat), dtype=np.float64)
+    everyone = len(index)
+
+    for i, (lat, lon) in enumerate(zip(np.asarray(fault_lat).tolist(), np.asarray(fault_lon).tolist())):
+        radius = radius_km
+        while True:
+            candidates = index.query(lat, lon, radius)
+            if len(candidates):
+                distance = haversine_prepared(f_lat[i], f_cos[i], f_lon[i],
+                                              e_lat[candidates], e_cos[candidates], e_lon[candidates])
+                score = distance + penalty[candidates]
+                k = int(np.argmin(score))
+                if score[k] < radius or len(candidates) == everyone:
+                    break
+            radius *= 2
+
+        j = int(candidates[k])
+        chosen[i] = j
+        scores[i] = score[k]
+        penalty[j] += WORKLOAD_PENALTY_KM
+        workload[j] += 1
+
+    return chosen, scores
+
+
+SPECIALTIES = ('transformer', 'line', 'meter', 'general')
+SPECIALTY_MISMATCH_KM = 5.0  # Extra cost when the engineer's specialty does not match the fault
+GENERAL_MISMATCH_KM = 2.0  # Extra cost for a 'general' engineer on a specialist fault
+
+
+def fault_specialty(fault):
+    """Guess which specialty a fault needs.
+
+    Uses the AI ``fault_type`` when one has been merged into the fault,
+    otherwise the shape of the reading: a collapse to near zero looks like a
+    line break, a large surge like a transformer problem, anything else is
+    left to meter specialists.
+    """
+    fault_type = str(fault.get('fault_type', '')).lower()
+    for specialty in ('transformer', 'line', 'meter'):
+        if specialty in fault_type:
+            return specialty
+
+    change = fault.get('change_percentage', 0)
+    if change <= -60:
+        return 'line'
+    if change >= 150:
+        return 'transformer'
+    return 'meter'
+
+
+def _specialty_codes(fault_specialties, engineer_specialties):
+    """``(table, fault codes, engineer codes)`` for looking up specialty match costs."""
+    table = np.full((len(SPECIALTIES), len(SPECIALTIES)), SPECIALTY_MISMATCH_KM)
+    table[:, SPECIALTIES.index('general')] = GENERAL_MISMATCH_KM
+    np.fill_diagonal(table, 0.0)
+
+    fault_codes = np.array([SPECIALTIES.index(s) for s in fault_specialties], dtype=np.intp)
+    eng_codes = np.array([SPECIALTIES.index(s) for s in engineer_specialties], dtype=np.intp)
+    return table, fault_codes, eng_codes
+
+
+def specialty_penalty(fault_specialties, engineer_specialties):
+    """Matrix of specialty match costs (faults x engineers)."""
+    table, fault_codes, eng_codes = _specialty_codes(fault_specialties, engineer_specialties)
+    # One-hot rows times the table's engineer columns: a small matrix product
+    # instead of gathering every element
+    identity = np.eye(len(SPECIALTIES))
+    return identity[fault_codes] @ table[:, eng_codes]
+
+
+def assignment_cost_matrix(fault_lat, fault_lon, eng_lat, eng_lon, fault_specialties, engineer_specialties):
+    """Cost of sending each engineer to each fault: distance + specialty mismatch."""
+    cost = haversine_matrix(fault_lat, fault_lon, eng_lat, eng_lon)
+    cost += specialty_penalty(fault_specialties, engineer_specialties)
+    return cost
+
+
+def assignment_costs(fault_lat, fault_lon, eng_lat, eng_lon, fault_specialties, engineer_specialties):
+    """The same cost for given pairs only: fault ``i`` against the ``i``-th engineer of each list."""
+    table, fault_codes, eng_codes = _specialty_codes(fault_specialties, engineer_specialties)
+    return haversine_pairs(fault_lat, fault_lon, eng_lat, eng_lon) + table[fault_codes, eng_codes]
+
+
+def _top_two(prices):
+    """Lowest and second-lowest slot price of each engineer."""
+    if prices.shape[1] == 1:
+        return prices[:, 0].copy(), np.full(len(prices), np.inf)
+    part = np.partition(prices, 1, axis=1)
+    return part[:, 0].copy(), part[:, 1].copy()
+
+
+def _candidates(cost, k):
+    """The ``k`` cheapest engineers per fault and the cheapest cost left out."""
+    n_engineers = cost.shape[1]
+    if k >= n_engineers:
+        return np.broadcast_to(np.arange(n_engineers), cost.shape).copy(), np.full(len(cost), np.inf)
+    part = np.argpartition(cost, k, axis=1)
+    rows = np.arange(len(cost))[:, None]
+    return part[:, :k].copy(), cost[rows[:, 0], part[:, k]]
+
+
+def _forward_auction(cost, capacity, price, holder, epsilon, candidates, deadline=None):
+    """Run the auction until every fault holds a slot.
+
+    ``price`` and ``holder`` are (engineer x slot) arrays updated in place;
+    returns the engineer index per fault. Raises TimeoutError once
+    ``time.monotonic()`` passes ``deadline``.
+    """
+    n_faults, n_engineers = cost.shape
+    max_cap = price.shape[1]
+    missing = ~np.isfinite(price)
+    holder[:] = -1
+
+    low, second = _top_two(price)
+    assigned = np.full(n_faults, -1, dtype=np.int64)
+    rows = np.arange(n_faults)
+
+    k = min(candidates, n_engineers)
+    cand, outside = _candidates(cost, k)
+    cand_value = -np.take_along_axis(cost, cand, axis=1)
+
+    unassigned = rows
+    while len(unassigned):
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"{len(unassigned)} of {n_faults} faults still unassigned")
+
+        # Bids: best engineer at its cheapest slot vs. the next best option
+        idx = np.arange(len(unassigned))
+        engs = cand[unassigned]
+        net = cand_value[unassigned] - low[engs]
+        pos = np.argmax(net, axis=1)
+        best = engs[idx, pos]
+        w1 = net[idx, pos]
+
+        if k < n_engineers and (w1 < -outside[unassigned]).any():
+            # An engineer outside the candidate lists may now be better: widen them
+            k = min(2 * k, n_engineers)
+            cand, outside = _candidates(cost, k)
+            cand_value = -np.take_along_axis(cost, cand, axis=1)
+            continue
+
+        net[idx, pos] = cand_value[unassigned, pos] - second[best]
+        w2 = np.maximum(net.max(axis=1), -outside[unassigned])
+        w2 = np.where(np.isfinite(w2), w2, w1)
+        bids = cand_value[unassigned, pos] - w2 + epsilon
+
+        # Each engineer keeps its highest prices among current slots and new bids
+        engaged = np.unique(best)
+        slot_eng = np.repeat(engaged, max_cap)
+        slot_price = price[engaged].ravel()
+        slot_who = holder[engaged].ravel()
+        keep = ~missing[engaged].ravel()
+
+        eng_all = np.concatenate([slot_eng[keep], best])
+        price_all = np.concatenate([slot_price[keep], bids])
+        who_all = np.concatenate([slot_who[keep], unassigned])
+        is_new = np.concatenate([np.zeros(keep.sum(), dtype=bool), np.ones(len(best), dtype=bool)])
+
+        order = np.lexsort((is_new, -price_all, eng_all))
+        eng_all, price_all, who_all = eng_all[order], price_all[order], who_all[order]
+        starts = np.searchsorted(eng_all, engaged)
+        rank = np.arange(len(eng_all)) - np.repeat(starts, np.diff(np.append(starts, len(eng_all))))
+        won = rank < capacity[eng_all]
+
+        # Displaced holders become unassigned, winning bidders take their slots
+        lost = who_all[~won]
+        assigned[lost[lost >= 0]] = -1
+        winners = who_all[won]
+        placed = winners >= 0
+        assigned[winners[placed]] = eng_all[won][placed]
+
+        price[engaged] = np.where(missing[engaged], np.inf, 0.0)
+        holder[engaged] = -1
+        price[eng_all[won], rank[won]] = price_all[won]
+        holder[eng_all[won], rank[won]] = winners
+
+        low[engaged], second[engaged] = _top_two(price[engaged])
+        unassigned = rows[assigned < 0]
+
+    return assigned
+
+
+def optimal_assign(cost, capacity, epsilon=0.1, candidates=64, budget_s=None):
+    """Min-cost assignment of faults (rows) to engineers (columns) with capacities.
+
+    Solved as a transportation problem with a forward auction (Bertsekas)
+    over engineer slots: every unassigned fault bids on its best engineer in
+    the same round and each engineer keeps its ``capacity`` highest bids.
+    Prices start at zero, so slots left empty are never priced and the result
+    is within ``len(cost) * epsilon`` of the optimal total cost.
+
+    Faults only bid among their ``candidates`` cheapest engineers; the cheapest
+    excluded engineer is kept as an outside option in every bid and the lists
+    are widened if it ever becomes the best one, so the bound holds against
+    all engineers.
+
+    Price wars between faults competing for the same engineers can take
+    hundreds of small rounds on wide layouts, and epsilon scaling does not
+    help: slots priced in a coarse phase and left empty later break the bound.
+    Pass ``budget_s`` to give up instead; TimeoutError is raised once the
+    auction has run that many seconds.
+
+    Returns the engineer index chosen for every fault. Raises ValueError when
+    total capacity is below the number of faults.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    n_faults, n_engineers = cost.shape
+    capacity = np.broadcast_to(np.asarray(capacity, dtype=np.int64), (n_engineers,))
+    if capacity.sum() < n_faults:
+        raise ValueError(f"total engineer capacity {int(capacity.sum())} is below {n_faults} faults")
+    if n_faults == 0:
+        return np.empty(0, dtype=np.int64)
+
+    capacity = np.minimum(capacity, n_faults)
+    max_cap = int(capacity.max())
+    price = np.where(np.arange(max_cap)[None, :] >= capacity[:, None], np.inf, 0.0)
+    holder = np.full((n_engineers, max_cap), -1, dtype=np.int64)
+
+    deadline = None if budget_s is None else time.monotonic() + budget_s
+    return _forward_auction(cost, capacity, price, holder, epsilon, candidates, deadline)
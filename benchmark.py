@@ -0,0 +1,299 @@
+"""Benchmarks for the monitoring cycle and the dashboard read paths.
+
+Everything is generated from ``--seed``, so two runs of the same revision
+see identical populations, readings and cycle directories. Each stage is
+timed ``--repeat`` times; peak memory comes from a separate tracemalloc run
+(numpy reports its buffers to tracemalloc). Results are written as JSON:
+
+    python benchmark.py --meters 1000,100000,1000000 --cycles 10,1000,50000 --output bench.json
+
+``--spread 0.5`` spreads meters and engineers over a district instead of a
+town, which is where the optimal engine's auction is slowest.
+
+Stages:
+    monitor_outputs             batched detection over one set of readings
+    assign_engineers_smartly    fallback assignment of the detected faults
+    log_faults_and_assignments  append the cycle to a segment store and rollups (+ text log)
+    generate_cycles             write the synthetic cycle directory (setup, timed once)
+    get_all_cycle_data          cold (first parse) and warm
+    get_customer_history        cold (builds the index) and warm
+    get_engineer_tasks          warm
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import customer  # noqa: E402
+from cycle_cache import CycleCache, CustomerHistoryIndex, JsonCycleFiles  # noqa: E402
+from cycle_segments import SegmentReader, SegmentWriter  # noqa: E402
+from ingest import random_source  # noqa: E402
+from meter_store import MeterStore  # noqa: E402
+from rollups import RollupStore  # noqa: E402
+
+app = None  # Imported by main() from inside the scratch directory: it creates its stores in the cwd
+
+
+def measure(fn, repeat, setup=None):
+    """Time ``fn`` ``repeat`` times, then once more under tracemalloc for peak memory.
+
+    ``setup`` is called before every run, untimed, and its result passed to ``fn``.
+    """
+    times = []
+    for _ in range(repeat):
+        call = fn if setup is None else (lambda arg=setup(): fn(arg))
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+
+    call = fn if setup is None else (lambda arg=setup(): fn(arg))
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'times_s': [round(t, 6) for t in times],
+        'best_s': round(min(times), 6),
+        'median_s': round(statistics.median(times), 6),
+        'peak_bytes': peak,
+    }
+
+
+def make_engineers(count, seed, spread=0.05):
+    """The repo's engineers, padded with seeded synthetic ones up to ``count``.
+
+    Synthetic engineers are placed within ``spread`` degrees of the centre.
+    """
+    engineers = list(customer.engineers)[:count]
+    rng = np.random.default_rng(seed)
+    specialties = ['transformer', 'line', 'meter', 'general']
+    for i in range(len(engineers), count):
+        engineers.append(customer.Engineer(
+            f"Eng. Bench_{i}", i + 1, specialties[int(rng.integers(len(specialties)))],
+            23.8103 + rng.uniform(-spread, spread), 91.2514 + rng.uniform(-spread, spread)))
+    return engineers
+
+
+def bench_cycle(meters, engineers, seed, repeat, workdir, spread=0.05):
+    """Benchmark the three monitoring-cycle stages for one population size."""
+    results = []
+    store = MeterStore.generate(meters, len(customer.FEEDERS), spread=spread, seed=seed)
+    readings = random_source(store, seed=seed + 1)
+    base_output = store.last_output.copy()
+
+    def fresh_batch():
+        np.copyto(store.last_output, base_output)
+        return [next(readings)]
+
+    stats = measure(lambda batches: customer.monitor_outputs_batched(store, batches), repeat, fresh_batch)
+    results.append({'stage': 'monitor_outputs', 'meters': meters, 'detector': customer.DETECTOR, **stats})
+
+    np.copyto(store.last_output, base_output)
+    faults = customer.monitor_outputs_batched(store, [next(random_source(store, seed=seed + 1))])
+    customer.engineers = make_engineers(engineers, seed, spread)
+
+    def reset_workload():
+        for eng in customer.engineers:
+            eng.workload = 0
+
+    assignments = []
+
+    def assign(_):
+        assignments[:] = customer.assign_engineers_smartly(faults, None)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = measure(assign, repeat, reset_workload)
+    results.append({'stage': 'assign_engineers_smartly', 'meters': meters, 'faults': len(faults),
+                    'engineers': engineers, 'spread': spread, 'engine': customer.ASSIGNMENT_ENGINE,
+                    'engine_used': (customer.LAST_ASSIGNMENT_STATS or {}).get('engine'), **stats})
+
+    segment_dir = os.path.join(workdir, f"log_{meters}")
+
+    def fresh_writer():
+        for store in (customer.segment_writer, customer.rollup_store):
+            if store is not None:
+                store.close()
+        shutil.rmtree(segment_dir, ignore_errors=True)
+        os.makedirs(segment_dir)
+        customer.segment_writer = SegmentWriter(segment_dir)
+        customer.rollup_store = RollupStore(os.path.join(segment_dir, 'rollups.db'))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = measure(lambda _: customer.log_faults_and_assignments(assignments, None, 1), repeat, fresh_writer)
+    customer.segment_writer.close()
+    results.append({'stage': 'log_faults_and_assignments', 'meters': meters, 'faults': len(assignments),
+                    'text_log': customer.WRITE_TEXT_LOG, **stats})
+    return results
+
+
+def generate_cycles(directory, count, faults_per_cycle, customers, engineer_names, seed, fmt):
+    """Write ``count`` synthetic cycles as JSON files or segments."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 1)
+    writer = SegmentWriter(os.path.join(directory, 'cycle_segments')) if fmt == 'segments' else None
+
+    for n in range(1, count + 1):
+        k = int(rng.integers(0, 2 * faults_per_cycle + 1))
+        ids = rng.integers(1, customers + 1, size=k)
+        old = rng.integers(50, 501, size=k)
+        new = rng.integers(50, 501, size=k)
+        engineers = rng.integers(0, len(engineer_names), size=k)
+        timestamp = (start + timedelta(minutes=2 * n)).strftime("%Y-%m-%d %H:%M:%S")
+        faults = [{
+            "customer_id": int(i), "customer_name": f"Customer_{int(i) - 1}",
+            "feeder_id": int(i) % len(customer.FEEDERS), "feeder_name": customer.FEEDERS[int(i) % len(customer.FEEDERS)],
+            "old_output": int(o), "new_output": int(w), "change_percentage": round((int(w) - int(o)) / int(o) * 100, 2),
+            "latitude": 23.81, "longitude": 91.25,
+            "assigned_engineer": engineer_names[e], "engineer_specialty": "general",
+            "assignment_reason": "Distance + workload optimization", "ai_assigned": False,
+        } for i, o, w, e in zip(ids.tolist(), old.tolist(), new.tolist(), engineers.tolist())]
+        cycle = {"cycle_number": n, "timestamp": timestamp, "total_faults": k, "faults": faults,
+                 "summary": {"feeders": {}, "engineers": {}}, "ai_analysis": None}
+
+        if writer is not None:
+            writer.append(cycle)
+        else:
+            name = f"cycle_{n:04d}_{timestamp.replace('-', '').replace(':', '').replace(' ', '_')}.json"
+            with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+                json.dump(cycle, f)
+
+    if writer is not None:
+        writer.close()
+
+
+def bench_reads(cycles, fmt, seed, repeat, workdir, faults_per_cycle, customers):
+    """Benchmark the dashboard read helpers over a synthetic cycle directory."""
+    results = []
+    directory = os.path.join(workdir, f"cycles_{fmt}_{cycles}")
+    engineer_names = [u['engineer_name'] for u in app.USERS.values() if u['role'] == 'engineer']
+
+    # Setup: timed once for reference, not profiled
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    start = time.perf_counter()
+    generate_cycles(directory, cycles, faults_per_cycle, customers, engineer_names, seed, fmt)
+    results.append({'stage': 'generate_cycles', 'cycles': cycles, 'format': fmt,
+                    'best_s': round(time.perf_counter() - start, 6)})
+
+    def fresh_cache():
+        # Mirrors app.py's module setup, pointed at the synthetic directory
+        app.CYCLE_CACHE = CycleCache(
+            [JsonCycleFiles(directory), SegmentReader(os.path.join(directory, 'cycle_segments'))],
+            max_bytes=int(os.environ.get('CYCLE_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+        app.CUSTOMER_INDEX = CustomerHistoryIndex(app.CYCLE_CACHE)
+
+    base = {'cycles': cycles, 'format': fmt}
+    stats = measure(lambda _: app.get_all_cycle_data(), repeat, fresh_cache)
+    results.append({'stage': 'get_all_cycle_data', 'mode': 'cold', **base, **stats})
+
+    fresh_cache()
+    app.get_all_cycle_data()
+    results.append({'stage': 'get_all_cycle_data', 'mode': 'warm', **base,
+                    **measure(app.get_all_cycle_data, repeat)})
+
+    customer_id = 1
+    stats = measure(lambda _: app.get_customer_history(customer_id), repeat, fresh_cache)
+    results.append({'stage': 'get_customer_history', 'mode': 'cold', **base, **stats})
+
+    fresh_cache()
+    app.get_customer_history(customer_id)
+    results.append({'stage': 'get_customer_history', 'mode': 'warm', **base,
+                    **measure(lambda: app.get_customer_history(customer_id), repeat)})
+
+    results.append({'stage': 'get_engineer_tasks', 'mode': 'warm', **base,
+                    **measure(lambda: app.get_engineer_tasks(engineer_names[0]), repeat)})
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def int_list(text):
+    return [int(x) for x in text.split(',') if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--meters', type=int_list, default=[1000, 10000, 100000, 1000000],
+                        help='comma-separated population sizes')
+    parser.add_argument('--cycles', type=int_list, default=[10, 1000, 10000, 50000],
+                        help='comma-separated cycle directory sizes')
+    parser.add_argument('--cycle-format', choices=['json', 'segments'], default='segments')
+    parser.add_argument('--faults-per-cycle', type=int, default=20, help='mean faults per synthetic cycle')
+    parser.add_argument('--engineers', type=int, default=len(customer.engineers))
+    parser.add_argument('--spread', type=float, default=0.05,
+                        help='meters and synthetic engineers lie within +/- this many degrees of the centre')
+    parser.add_argument('--engine', default=customer.ASSIGNMENT_ENGINE, help='customer.ASSIGNMENT_ENGINE')
+    parser.add_argument('--detector', choices=['threshold', 'ewma'], default=customer.DETECTOR)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', help='scratch directory (default: a temporary one, removed afterwards)')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    customer.ASSIGNMENT_ENGINE = args.engine
+    customer.DETECTOR = args.detector
+    workdir = args.workdir or tempfile.mkdtemp(prefix='instinct_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(workdir)  # fault_log.txt, any JSON exports and app's state/ and rollups.db land here
+    global app
+    import app
+
+    report = {'environment': environment(), 'config': vars(args), 'results': []}
+    try:
+        for meters in args.meters:
+            print(f"⏱️  cycle stages, {meters:,} meters", file=sys.stderr)
+            report['results'].extend(bench_cycle(meters, args.engineers, args.seed, args.repeat, workdir,
+                                                 args.spread))
+        for cycles in args.cycles:
+            print(f"⏱️  read paths, {cycles:,} cycles ({args.cycle_format})", file=sys.stderr)
+            report['results'].extend(bench_reads(cycles, args.cycle_format, args.seed, args.repeat, workdir,
+                                                 args.faults_per_cycle, max(args.meters)))
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
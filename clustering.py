@@ -0,0 +1,156 @@
+"""Grid-bucketed, DBSCAN-style clustering of fault locations.
+
+Faults are bucketed into square cells ``eps_km`` wide. A cell is dense
+when its 3x3 block of cells holds at least ``min_samples`` faults (the
+grid stand-in for DBSCAN's eps-neighbourhood count); touching dense cells
+form one cluster, and faults in a sparse cell next to a dense one join it
+as border points. Everything else is noise (cluster id -1). All of it is
+array work over the occupied cells: 100k faults cluster in tens of
+milliseconds whether they form a few tight blobs or spread evenly into
+thousands of clusters.
+"""
+import math
+
+import numpy as np
+
+from geo import KM_PER_DEGREE
+
+CLUSTER_EPS_KM = 0.3
+CLUSTER_MIN_SAMPLES = 8
+
+
+def connected_roots(n, a, b):
+    """Smallest node of each node's connected component, for edges ``a[i]``-``b[i]``.
+
+    Vectorized union-find: every round hooks each edge's larger root under
+    the smaller one, then compresses every path fully, so trees are stars
+    again. Each star merges with a neighbour every round, so the number of
+    rounds grows with the log of the component size, not its diameter.
+    """
+    parent = np.arange(n)
+    while True:
+        ra, rb = parent[a], parent[b]
+        differ = ra != rb
+        if not differ.any():
+            return parent
+        a, b, ra, rb = a[differ], b[differ], ra[differ], rb[differ]
+        np.minimum.at(parent, np.maximum(ra, rb), np.minimum(ra, rb))
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+
+def cluster_points(lat, lon, eps_km=CLUSTER_EPS_KM, min_samples=CLUSTER_MIN_SAMPLES):
+    """Cluster id per point, numbered by cluster size (0 = largest); -1 is noise."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if not len(lat):
+        return np.empty(0, dtype=np.int64)
+
+    # Equirectangular projection around the mean latitude is exact enough at city scale
+    y = lat * KM_PER_DEGREE
+    x = lon * KM_PER_DEGREE * math.cos(math.radians(float(lat.mean())))
+    cx = ((x - x.min()) // eps_km).astype(np.int64) + 1
+    cy = ((y - y.min()) // eps_km).astype(np.int64) + 1
+    width = int(cy.max()) + 2
+    cells, point_cell, counts = np.unique(cx * width + cy, return_inverse=True, return_counts=True)
+    point_cell = point_cell.ravel()
+    m = len(cells)
+
+    # Index of each of the 8 neighbouring cells, -1 when unoccupied
+    neighbours = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if dx or dy:
+                target = cells + (dx * width + dy)
+                pos = np.minimum(np.searchsorted(cells, target), m - 1)
+                neighbours.append(np.where(cells[pos] == target, pos, -1))
+    forward = neighbours[4:]  # (0, 1), (1, -1), (1, 0), (1, 1): every adjacent pair once
+
+    density = counts.copy()
+    for nb in neighbours:
+        density += np.where(nb >= 0, counts[nb], 0)
+    core = density >= min_samples
+
+    # Connected components of dense cells
+    a, b = [], []
+    for nb in forward:
+        linked = core & (nb >= 0)
+        linked[linked] = core[nb[linked]]
+        a.append(np.flatnonzero(linked))
+        b.append(nb[linked])
+    root = connected_roots(m, np.concatenate(a), np.concatenate(b))
+    label = np.where(core, root, m)
+
+    # Sparse cells touching a dense one take its cluster
+    cell_label = label.copy()
+    for nb in neighbours:
+        border = ~core & (nb >= 0)
+        border[border] = core[nb[border]]
+        cell_label[border] = np.minimum(cell_label[border], label[nb[border]])
+
+    point_label = cell_label[point_cell]
+    clustered = point_label < m
+    if not clustered.any():
+        return np.full(len(lat), -1, dtype=np.int64)
+    roots, compact, sizes = np.unique(point_label[clustered], return_inverse=True, return_counts=True)
+    rank = np.empty(len(roots), dtype=np.int64)
+    rank[np.argsort(-sizes, kind='stable')] = np.arange(len(roots))
+    result = np.full(len(lat), -1, dtype=np.int64)
+    result[clustered] = rank[compact.ravel()]
+    return result
+
+
+def summarize_clusters(labels, lat, lon, feeder_names):
+    """Size, centroid, radius and feeder mix of every cluster, largest first."""
+    labels = np.asarray(labels)
+    members = labels >= 0
+    if not members.any():
+        return []
+    ids = labels[members]
+    lat = np.asarray(lat, dtype=np.float64)[members]
+    lon = np.asarray(lon, dtype=np.float64)[members]
+    feeders, feeder_code = np.unique(np.asarray(feeder_names)[members], return_inverse=True)
+    feeder_code = feeder_code.ravel()
+
+    k = int(ids.max()) + 1
+    sizes = np.bincount(ids, minlength=k)
+    c_lat = np.bincount(ids, lat, k) / sizes
+    c_lon = np.bincount(ids, lon, k) / sizes
+    dy = (lat - c_lat[ids]) * KM_PER_DEGREE
+    dx = (lon - c_lon[ids]) * KM_PER_DEGREE * np.cos(np.radians(c_lat[ids]))
+    radius = np.zeros(k)
+    np.maximum.at(radius, ids, np.sqrt(dx * dx + dy * dy))
+    mix = np.bincount(ids * len(feeders) + feeder_code, minlength=k * len(feeders)).reshape(k, len(feeders))
+
+    clusters = []
+    for cluster_id in range(k):
+        size = int(sizes[cluster_id])
+        order = np.argsort(-mix[cluster_id], kind='stable')
+        mix_of = {str(feeders[f]): int(mix[cluster_id, f]) for f in order.tolist() if mix[cluster_id, f]}
+        dominant = str(feeders[order[0]])
+        clusters.append({
+            'cluster_id': cluster_id,
+            'size': size,
+            'latitude': round(float(c_lat[cluster_id]), 6),
+            'longitude': round(float(c_lon[cluster_id]), 6),
+            'radius_km': round(float(radius[cluster_id]), 3),
+            'feeders': mix_of,
+            'dominant_feeder': dominant,
+            'description': (f"Cluster of {size} faults within {radius[cluster_id]:.2f} km of "
+                            f"({c_lat[cluster_id]:.4f}, {c_lon[cluster_id]:.4f}), "
+                            f"{mix_of[dominant] * 100 // size}% on {dominant}"),
+        })
+    return clusters
+
+
+def cluster_faults(faults, eps_km=CLUSTER_EPS_KM, min_samples=CLUSTER_MIN_SAMPLES):
+    """Set ``cluster_id`` on every fault dict and return the cluster summaries."""
+    lat = [f['latitude'] for f in faults]
+    lon = [f['longitude'] for f in faults]
+    labels = cluster_points(lat, lon, eps_km, min_samples)
+    for fault, cluster_id in zip(faults, labels.tolist()):
+        fault['cluster_id'] = cluster_id
+    return summarize_clusters(labels, lat, lon, [f['feeder_name'] for f in faults])
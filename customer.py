@@ -1,10 +1,19 @@
 import random
 import time
-import json
 from datetime import datetime
 from collections import defaultdict
-import anthropic
+import math
 import os
+import threading
+
+# numpy and the modules built on it (assignment, clustering, geo, ingest,
+# meter_store, routing, sharding), the rollup database and the archiver are
+# imported by the functions that use them, so importing this module stays cheap
+from ai_analysis import ChunkedAnalyzer
+from cycle_segments import SegmentWriter
+from cycle_writer import append_fault_log, collect_faults, fault_columns, write_cycle_json
+from metrics import Registry
+from scheduler import CycleScheduler
 
 
 class Customer:
@@ -48,29 +57,93 @@ engineers = [
 ]
 
 NUM_CUSTOMERS = 1000  # Reduced for testing
+POPULATION_SEED = None  # Seed for the generated customer population
 THRESHOLD = 100
 INTERVAL = 120
-
-# Generate customers with random locations (around Agartala, Tripura)
-customers = [
-    Customer(
-        name=f"Customer_{i}",
-        customer_id=i + 1,
-        last_output=random.randint(50, 500),
-        last_bill=random.randint(500, 10000),
-        feeder_id=random.randrange(len(FEEDERS)),
-        latitude=23.8103 + random.uniform(-0.05, 0.05),
-        longitude=91.2514 + random.uniform(-0.05, 0.05)
-    )
-    for i in range(NUM_CUSTOMERS)
-]
+SCHEDULE_POLICY = "skip"  # Overrunning cycles: 'skip' missed boundaries or 'catchup' back-to-back
+SCHEDULE_MAX_CATCHUP = 10  # Missed cycles run back-to-back under 'catchup' before the rest are skipped
+BATCHED_MONITORING = True  # Vectorized detection over the MeterStore arrays
+DETECTOR = "threshold"  # Batched detection: 'threshold' (fixed THRESHOLD) or 'ewma' (per-meter z-score)
+EWMA_ALPHA = 0.1  # Weight of the newest reading in each meter's mean and variance
+EWMA_SENSITIVITY = 4.0  # Standard deviations from a meter's mean that count as a fault
+EWMA_WARMUP = 10  # Readings before a meter's own statistics are trusted (THRESHOLD until then)
+CYCLE_SEGMENT_DIR = "cycle_segments"
+ROLLUP_DB = os.environ.get("ROLLUP_DB", "rollups.db")  # Minute/hour/day trend rollups, updated per cycle
+EXPORT_JSON_CYCLES = False  # Also write one cycle_NNNN_<ts>.json per cycle
+EXPORT_JSON_INDENT = None  # None = compact JSON exports (one fault per line); e.g. 2 to pretty-print
+WRITE_TEXT_LOG = True  # Append a human-readable block per cycle to fault_log.txt
+CYCLE_ARCHIVE_DIR = "cycle_archive"  # Daily zip archives of cycles older than RETENTION_HOURS
+RETENTION_HOURS = 48  # Cycles and fault_log.txt blocks kept as live files; None = never archive
+ARCHIVE_INTERVAL = 3600  # Seconds between retention passes
+METRICS_FILE = os.environ.get("METRICS_FILE", "monitor_metrics.prom")  # Prometheus text for the app's /metrics; "" = off
+ASSIGNMENT_ENGINE = "matrix"  # Fallback assignment: 'loop', 'matrix', 'grid' or 'optimal'
+ENGINEER_CAPACITY = None  # Max faults per engineer for 'optimal'; None = 25% over an even split
+OPTIMAL_BUDGET_S = 0.5  # Seconds the 'optimal' auction may run before the cycle is assigned greedily; None = no limit
+FAULT_CLUSTERING = True  # Group each cycle's faults into spatial clusters (grid DBSCAN) before assignment
+CLUSTER_EPS_KM = 0.3  # Cluster grid cell size; faults within about this distance are neighbours
+CLUSTER_MIN_SAMPLES = 8  # Faults in a cell's 3x3 block for it to seed or extend a cluster
+ROUTE_PLANNING = True  # Plan each engineer's visit order locally (nearest neighbour + 2-opt) for fallback assignments
+AI_CHUNK_SIZE = 50  # Faults per AI request
+AI_MAX_CONCURRENCY = 4  # AI requests in flight at once
+AI_REQUEST_TIMEOUT = 60  # Seconds before an AI request is abandoned
+AI_MAX_BACKLOG = 2  # Cycles that may wait for AI at once; older ones are shed
+AI_BASE_URL = os.environ.get("ANTHROPIC_BASE_URL")  # e.g. a local stub server for testing
+INGEST_SOURCE = os.environ.get("INGEST_SOURCE", "random")  # 'random', 'csv:<path>', 'ndjson:<path>', 'tcp:<host>:<port>', 'udp:<host>:<port>'
+INGEST_SEED = None  # Seed for the random source
+INGEST_BUFFER_BATCHES = 8  # Batches buffered ahead of detection before the source is paused
+INGEST_BATCHES_PER_CYCLE = 1  # Batches scored per cycle; None = everything buffered
+INGEST_WAIT = 5.0  # Seconds a cycle waits for the first batch
+SHARD_WORKERS = 0  # >1: detect in this many processes, one range of feeders each, on per-feeder
+                   # synthetic readings (matches INGEST_SOURCE 'random-feeders' with the same INGEST_SEED);
+                   # only with a random INGEST_SOURCE, other sources are scored in this process
+
+# Customer population, its columnar view and the stores are created on first
+# use (see get_meter_store() and friends), so importing this module is cheap
+# and has no side effects; set NUM_CUSTOMERS etc. before the first cycle
+customers = None
+
+# Columnar view of the same population used by batched monitoring
+meter_store = None
+
+# Append-only cycle store read by the dashboard
+segment_writer = None
+
+# Per-feeder and per-engineer trend rollups served by /api/rollups
+rollup_store = None
+
+last_archive_pass = None  # time.monotonic() of the last retention pass
+
+# Stage timings and counters, written to METRICS_FILE after every cycle
+monitor_metrics = Registry()
+monitor_metrics.describe('monitor_stage_seconds', 'histogram', "Wall time of each monitoring cycle stage")
+monitor_metrics.describe('monitor_cycles_total', 'counter', "Monitoring cycles run")
+monitor_metrics.describe('monitor_faults_total', 'counter', "Faults detected")
+monitor_metrics.describe('monitor_ingest_rejected_total', 'counter', "Readings skipped as malformed, by source")
+monitor_metrics.describe('monitor_ai_request_seconds', 'histogram', "Wall time of each AI analysis request")
+monitor_metrics.describe('monitor_ai_calls_total', 'counter', "AI analysis requests")
+monitor_metrics.describe('monitor_ai_failures_total', 'counter', "AI analysis requests that failed or timed out")
+monitor_metrics.describe('monitor_ai_shed_total', 'counter', "AI analysis chunks dropped because the backlog was full")
+monitor_metrics.describe('monitor_bytes_written_total', 'counter', "Bytes written, by target")
+monitor_metrics.describe('monitor_cycle_lag_seconds', 'gauge', "How late the last cycle started")
+monitor_metrics.describe('monitor_last_cycle_timestamp_seconds', 'gauge', "Scheduled time of the last cycle")
+
+# Solve time and cost of the latest fallback assignment (None when the AI assigned)
+LAST_ASSIGNMENT_STATS = None
+
+# Background AI analysis, created on first use
+ai_analyzer = None
+
+# Meter readings feeding batched monitoring, started on first use
+reading_pipeline = None
+ingest_stop = threading.Event()
+
+# Feeder-sharded detection workers, started on first use when SHARD_WORKERS > 1
+sharded_monitor = None
 
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calculate approximate distance between two coordinates in km."""
     # Simplified distance calculation (Haversine approximation)
-    import math
-
     lat1_rad = math.radians(lat1)
     lat2_rad = math.radians(lat2)
     delta_lat = math.radians(lat2 - lat1)
@@ -82,11 +155,67 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     return 6371 * c  # Earth radius in km
 
 
-def monitor_outputs():
+def generate_customers(count, seed=None):
+    """Customers with random outputs, bills, feeders and locations (around Agartala, Tripura)."""
+    rng = random.Random(seed) if seed is not None else random
+    return [
+        Customer(
+            name=f"Customer_{i}",
+            customer_id=i + 1,
+            last_output=rng.randint(50, 500),
+            last_bill=rng.randint(500, 10000),
+            feeder_id=rng.randrange(len(FEEDERS)),
+            latitude=23.8103 + rng.uniform(-0.05, 0.05),
+            longitude=91.2514 + rng.uniform(-0.05, 0.05)
+        )
+        for i in range(count)
+    ]
+
+
+def get_customers():
+    """Generate the NUM_CUSTOMERS population on first use."""
+    global customers
+    if customers is None:
+        customers = generate_customers(NUM_CUSTOMERS, POPULATION_SEED)
+    return customers
+
+
+def get_meter_store():
+    """Build the columnar view of the population on first use."""
+    global meter_store
+    if meter_store is None:
+        from meter_store import MeterStore
+        meter_store = MeterStore.from_customers(get_customers())
+    return meter_store
+
+
+def get_segment_writer():
+    """Open the cycle segment store on first use."""
+    global segment_writer
+    if segment_writer is None:
+        segment_writer = SegmentWriter(CYCLE_SEGMENT_DIR)
+    return segment_writer
+
+
+def get_rollup_store():
+    """Open the rollup database on first use."""
+    global rollup_store
+    if rollup_store is None:
+        from rollups import RollupStore
+        rollup_store = RollupStore(ROLLUP_DB)
+    return rollup_store
+
+
+def monitor_outputs(batched=None):
     """Monitor customer outputs and detect anomalies."""
+    if batched is None:
+        batched = BATCHED_MONITORING
+    if batched:
+        return monitor_outputs_batched()
+
     flagged = []
 
-    for c in customers:
+    for c in get_customers():
         new_out = random.randint(50, 500)
 
         if abs(new_out - c.last_output) > THRESHOLD:
@@ -114,103 +243,196 @@ def monitor_outputs():
     return flagged
 
 
-def analyze_faults_with_ai(faults):
-    """Use Claude AI to analyze faults and provide intelligent insights."""
-    if not faults:
-        return None
-
-    # Check for API key
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if not api_key:
-        print("\n⚠️  ANTHROPIC_API_KEY not found in environment variables")
-        print("To enable AI analysis, set your API key:")
-        print("export ANTHROPIC_API_KEY='your-api-key-here'  # Linux/Mac")
-        print("set ANTHROPIC_API_KEY=your-api-key-here  # Windows CMD")
-        return None
+def get_reading_pipeline():
+    """Start the configured ingestion source on first use."""
+    global reading_pipeline
+    if reading_pipeline is None:
+        from ingest import ReadingPipeline, open_source
+        if SHARD_WORKERS > 1 and not sharded_readings():
+            print(f"⚠️  SHARD_WORKERS only applies to the random sources; "
+                  f"scoring {INGEST_SOURCE!r} readings in one process")
+        source = open_source(INGEST_SOURCE, get_meter_store(), seed=INGEST_SEED, stop=ingest_stop,
+                             metrics=monitor_metrics)
+        reading_pipeline = ReadingPipeline(source, max_batches=INGEST_BUFFER_BATCHES, stop=ingest_stop)
+    return reading_pipeline
+
+
+def sharded_readings():
+    """True when the shard workers draw and score the cycle's readings themselves.
+
+    They generate synthetic per-feeder readings, so real sources (files,
+    sockets) always go through the ingestion pipeline instead.
+    """
+    return SHARD_WORKERS > 1 and INGEST_SOURCE in ('random', 'random-feeders')
+
+
+def get_sharded_monitor():
+    """Start the feeder shard workers on first use."""
+    global sharded_monitor
+    if sharded_monitor is None:
+        from sharding import ShardedMonitor
+        store = get_meter_store()
+        sharded_monitor = ShardedMonitor(store, SHARD_WORKERS, seed=INGEST_SEED)
+        print(f"🧩 Monitoring {len(store):,} meters in {sharded_monitor.workers} feeder shards")
+    return sharded_monitor
+
+
+def stop_ingestion():
+    """Stop the reading source and the shard workers, if they were started.
+
+    Closing the shards copies their ``last_output`` and EWMA state back into
+    the meter store.
+    """
+    global reading_pipeline, sharded_monitor
+    ingest_stop.set()
+    if sharded_monitor is not None:
+        sharded_monitor.close()
+        sharded_monitor = None
+    if reading_pipeline is not None:
+        reading_pipeline.close()
+        reading_pipeline = None
+
+
+def monitor_outputs_batched(store=None, batches=None):
+    """Score incoming readings in vectorized passes.
+
+    ``batches`` defaults to what the ingestion pipeline has buffered for this
+    cycle. Deltas, the fault mask (fixed THRESHOLD, or per-meter z-scores
+    with ``DETECTOR = "ewma"``) and change percentages are computed on the
+    store arrays; fault records are only built for the flagged rows. With
+    ``SHARD_WORKERS > 1`` and a random ``INGEST_SOURCE`` the shard processes
+    draw and score the readings.
+    """
+    import numpy as np
+    from meter_store import EwmaDetector
+
+    store = get_meter_store() if store is None else store
+    if DETECTOR == "ewma" and store.detector is None:
+        store.detector = EwmaDetector(store.last_output, alpha=EWMA_ALPHA, sensitivity=EWMA_SENSITIVITY,
+                                      warmup=EWMA_WARMUP)
+    elif DETECTOR != "ewma":
+        store.detector = None
+    found = []
+    if batches is None and sharded_readings() and store is meter_store:
+        found.append(get_sharded_monitor().run(THRESHOLD))
+        batches = []
+    elif batches is None:
+        batches = get_reading_pipeline().take(INGEST_BATCHES_PER_CYCLE, timeout=INGEST_WAIT)
+
+    for customer_ids, new_output in batches:
+        if customer_ids is store.customer_ids:
+            found.append(store.detect(new_output, THRESHOLD))
+        else:
+            rows = store.rows_for(customer_ids)
+            known = rows >= 0
+            found.append(store.detect_rows(rows[known], new_output[known], THRESHOLD))
+    if not found:
+        return []
+    rows, old, new, change = (np.concatenate(parts) for parts in zip(*found))
+
+    timestamp = datetime.now().isoformat()
+    flagged = []
 
-    try:
-        client = anthropic.Anthropic(api_key=api_key)
-
-        # Prepare fault summary for AI
-        fault_summary = {
-            'total_faults': len(faults),
-            'feeders_affected': list(set(f['feeder_name'] for f in faults)),
-            'fault_samples': faults[:20],  # Send first 20 for analysis
-            'available_engineers': [
-                {
-                    'name': eng.name,
-                    'specialty': eng.specialty,
-                    'current_workload': eng.workload,
-                    'location': {'lat': eng.current_latitude, 'lng': eng.current_longitude}
-                }
-                for eng in engineers
-            ]
+    for row, old_out, new_out, pct in zip(rows.tolist(), old.tolist(), new.tolist(), change.tolist()):
+        feeder_id = int(store.feeder_id[row])
+        fault_data = {
+            'customer_id': int(store.customer_ids[row]),
+            'customer_name': store.name_of(row),
+            'old_output': old_out,
+            'new_output': new_out,
+            'change_percentage': pct,
+            'feeder_id': feeder_id,
+            'feeder_name': FEEDERS[feeder_id],
+            'latitude': float(store.latitude[row]),
+            'longitude': float(store.longitude[row]),
+            'last_bill': int(store.last_bill[row]),
+            'timestamp': timestamp
         }
+        flagged.append(fault_data)
+
+    return flagged
 
-        prompt = f"""You are an AI assistant for an electricity distribution monitoring system. Analyze the following fault data and provide:
-
-1. **Failure Type Classification**: For each fault, classify the likely cause (transformer failure, line break, meter malfunction, voltage fluctuation, etc.)
-
-2. **Smart Engineer Assignment**: Assign the most suitable engineer based on:
-   - Engineer specialty matching the fault type
-   - Current workload
-   - Proximity to fault location
-   - Urgency of the fault
-
-3. **Route Optimization**: For multiple faults assigned to the same engineer, suggest an optimal route sequence
-
-4. **Pattern Detection**: Identify any patterns (e.g., multiple faults in same feeder, time-based patterns, geographical clusters)
-
-5. **Predictive Insights**: Based on the data, predict potential cascading failures or areas at risk
-
-Fault Data:
-{json.dumps(fault_summary, indent=2)}
-
-Provide your analysis in JSON format with the following structure:
-{{
-  "failure_classifications": [
-    {{"customer_id": <id>, "fault_type": "<type>", "severity": "<low/medium/high>", "reason": "<explanation>"}}
-  ],
-  "engineer_assignments": [
-    {{"customer_id": <id>, "assigned_engineer": "<name>", "reason": "<why this engineer>", "estimated_travel_time": "<minutes>"}}
-  ],
-  "optimized_routes": [
-    {{"engineer": "<name>", "route_sequence": [<customer_ids>], "total_distance": "<km>", "estimated_time": "<hours>"}}
-  ],
-  "patterns_detected": ["<pattern 1>", "<pattern 2>"],
-  "predictions": ["<prediction 1>", "<prediction 2>"],
-  "recommendations": ["<recommendation 1>", "<recommendation 2>"]
-}}"""
-
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4000,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
+
+def get_ai_analyzer():
+    """Create the background AI analyzer on first use; None without an API key."""
+    global ai_analyzer
+    if ai_analyzer is None:
+        api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            print("\n⚠️  ANTHROPIC_API_KEY not found in environment variables")
+            print("To enable AI analysis, set your API key:")
+            print("export ANTHROPIC_API_KEY='your-api-key-here'  # Linux/Mac")
+            print("set ANTHROPIC_API_KEY=your-api-key-here  # Windows CMD")
+            return None
+        ai_analyzer = ChunkedAnalyzer(
+            api_key,
+            on_chunk=save_ai_chunk,
+            on_complete=display_ai_insights_for_cycle,
+            chunk_size=AI_CHUNK_SIZE,
+            max_workers=AI_MAX_CONCURRENCY,
+            timeout=AI_REQUEST_TIMEOUT,
+            base_url=AI_BASE_URL,
+            max_backlog=AI_MAX_BACKLOG,
+            metrics=monitor_metrics,
         )
+    return ai_analyzer
 
-        # Parse AI response
-        response_text = message.content[0].text
 
-        # Extract JSON from response (in case there's extra text)
-        json_start = response_text.find('{')
-        json_end = response_text.rfind('}') + 1
+def analyze_faults_with_ai(faults, cycle_count):
+    """Queue every fault of the cycle for background AI analysis.
+
+    Returns the number of chunks submitted (0 when AI is disabled). Results
+    are merged into the stored cycle as each chunk finishes.
+    """
+    if not faults:
+        return 0
+
+    analyzer = get_ai_analyzer()
+    if analyzer is None:
+        return 0
+
+    engineer_info = [
+        {
+            'name': eng.name,
+            'specialty': eng.specialty,
+            'current_workload': eng.workload,
+            'location': {'lat': eng.current_latitude, 'lng': eng.current_longitude}
+        }
+        for eng in engineers
+    ]
+    return analyzer.submit(cycle_count, faults, engineer_info)
+
+
+def save_ai_chunk(cycle_count, part, status):
+    """Merge one chunk's AI analysis into the stored cycle (runs on a worker thread)."""
+    get_segment_writer().append_update(cycle_count, {'ai_analysis': part or {}, 'ai_status': status})
+    print(f"\n🤖 Cycle {cycle_count}: AI chunk {status['chunks_done']}/{status['chunks_total']} "
+          f"{'merged' if part is not None else 'failed'}")
+    write_metrics()
+
+
+def write_metrics():
+    """Publish the monitor's metrics to METRICS_FILE for the app to expose."""
+    if not METRICS_FILE:
+        return
+    if segment_writer is not None:
+        monitor_metrics.set('monitor_bytes_written_total', segment_writer.bytes_written, target='segments')
+    try:
+        monitor_metrics.write(METRICS_FILE)
+    except OSError as e:
+        print(f"\n⚠️  Could not write metrics to {METRICS_FILE}: {e}")
 
-        if json_start != -1 and json_end > json_start:
-            ai_analysis = json.loads(response_text[json_start:json_end])
-            return ai_analysis
-        else:
-            print("\n⚠️  Could not parse AI response as JSON")
-            return None
 
-    except Exception as e:
-        print(f"\n⚠️  AI Analysis Error: {e}")
-        return None
+def display_ai_insights_for_cycle(cycle_count, ai_analysis):
+    if ai_analysis:
+        print(f"\n🤖 AI analysis for cycle {cycle_count} complete")
+        display_ai_insights(ai_analysis)
 
 
 def assign_engineers_smartly(faults, ai_analysis):
     """Assign engineers based on AI recommendations or fallback to basic logic."""
+    global LAST_ASSIGNMENT_STATS
+    LAST_ASSIGNMENT_STATS = None
     assignments = []
 
     if ai_analysis and 'engineer_assignments' in ai_analysis:
@@ -229,7 +451,55 @@ def assign_engineers_smartly(faults, ai_analysis):
                         'ai_assigned': True
                     })
                     engineer.workload += 1
+    elif ASSIGNMENT_ENGINE == 'optimal' and faults and engineers:
+        # Fallback: whole cycle as one min-cost assignment with capacities
+        import numpy as np
+        from assignment import optimal_assign
+        from geo import haversine_pairs
+
+        started = time.perf_counter()
+        cost = fault_cost_matrix(faults)
+        capacity = ENGINEER_CAPACITY or math.ceil(1.25 * len(faults) / len(engineers))
+        try:
+            chosen = optimal_assign(cost, capacity, budget_s=OPTIMAL_BUDGET_S)
+        except ValueError as e:
+            print(f"⚠️  Optimal assignment unavailable ({e}), using greedy")
+            return assign_engineers_greedy(faults)
+        except TimeoutError as e:
+            print(f"⏱️  Optimal assignment over its {OPTIMAL_BUDGET_S} s budget ({e}), using greedy")
+            return assign_engineers_greedy(faults)
+        solve_ms = (time.perf_counter() - started) * 1000
+        chosen_engineers = [engineers[j] for j in chosen.tolist()]
+        distances = haversine_pairs(
+            [f['latitude'] for f in faults], [f['longitude'] for f in faults],
+            [eng.current_latitude for eng in chosen_engineers], [eng.current_longitude for eng in chosen_engineers]
+        )
+
+        for fault, engineer, distance in zip(faults, chosen_engineers, distances.round(2).tolist()):
+            engineer.workload += 1
+            assignments.append({
+                **fault,
+                'assigned_engineer': engineer.name,
+                'engineer_specialty': engineer.specialty,
+                'distance_km': distance,
+                'assignment_reason': 'Capacity + specialty optimal assignment',
+                'ai_assigned': False
+            })
+
+        record_assignment_stats('optimal', solve_ms, cost[np.arange(len(chosen)), chosen], chosen)
     else:
+        assignments = assign_engineers_greedy(faults)
+
+    return assignments
+
+
+def assign_engineers_greedy(faults):
+    """Greedy distance + workload assignment with the configured engine."""
+    assignments = []
+    engine = 'matrix' if ASSIGNMENT_ENGINE == 'optimal' else ASSIGNMENT_ENGINE
+    started = time.perf_counter()
+
+    if engine == 'loop':
         # Fallback: Basic assignment by distance and workload
         for fault in faults:
             best_engineer = None
@@ -257,10 +527,88 @@ def assign_engineers_smartly(faults, ai_analysis):
                     'ai_assigned': False
                 })
                 best_engineer.workload += 1
+    elif faults and engineers:
+        # Fallback: same scoring, batched over a distance matrix or a grid index
+        import numpy as np
+        from assignment import greedy_assign_grid, greedy_assign_matrix
+
+        assign = greedy_assign_grid if engine == 'grid' else greedy_assign_matrix
+        workload = np.array([eng.workload for eng in engineers], dtype=np.int64)
+        chosen, scores = assign(
+            [f['latitude'] for f in faults], [f['longitude'] for f in faults],
+            [eng.current_latitude for eng in engineers], [eng.current_longitude for eng in engineers],
+            workload
+        )
+
+        for fault, j, score in zip(faults, chosen.tolist(), scores.tolist()):
+            engineer = engineers[j]
+            assignments.append({
+                **fault,
+                'assigned_engineer': engineer.name,
+                'engineer_specialty': engineer.specialty,
+                'distance_km': round(score, 2),
+                'assignment_reason': 'Distance + workload optimization',
+                'ai_assigned': False
+            })
+
+        for eng, load in zip(engineers, workload.tolist()):
+            eng.workload = load
+
+    if assignments:
+        import numpy as np
+
+        solve_ms = (time.perf_counter() - started) * 1000
+        index = {eng.name: j for j, eng in enumerate(engineers)}
+        chosen = np.array([index[a['assigned_engineer']] for a in assignments], dtype=np.int64)
+        record_assignment_stats(engine, solve_ms, chosen_costs(faults, chosen), chosen)
 
     return assignments
 
 
+def fault_cost_matrix(faults):
+    """Distance + specialty mismatch cost of every engineer (columns) for every fault (rows)."""
+    from assignment import assignment_cost_matrix, fault_specialty
+
+    return assignment_cost_matrix(
+        [f['latitude'] for f in faults], [f['longitude'] for f in faults],
+        [eng.current_latitude for eng in engineers], [eng.current_longitude for eng in engineers],
+        [fault_specialty(f) for f in faults], [eng.specialty for eng in engineers]
+    )
+
+
+def chosen_costs(faults, chosen):
+    """Distance + specialty mismatch cost of each fault's chosen engineer (index into ``engineers``)."""
+    from assignment import assignment_costs, fault_specialty
+
+    chosen_engineers = [engineers[j] for j in chosen.tolist()]
+    return assignment_costs(
+        [f['latitude'] for f in faults], [f['longitude'] for f in faults],
+        [eng.current_latitude for eng in chosen_engineers], [eng.current_longitude for eng in chosen_engineers],
+        [fault_specialty(f) for f in faults], [eng.specialty for eng in chosen_engineers]
+    )
+
+
+def record_assignment_stats(engine, solve_ms, costs, chosen):
+    """Store and print how long an assignment took and what it costs.
+
+    ``costs`` holds each fault's cost for its chosen engineer. ``total_cost``
+    always uses the distance + specialty cost, so the greedy and optimal
+    engines can be compared on the same scale.
+    """
+    import numpy as np
+
+    global LAST_ASSIGNMENT_STATS
+    load = np.bincount(chosen, minlength=len(engineers))
+    LAST_ASSIGNMENT_STATS = {
+        'engine': engine,
+        'solve_time_ms': round(solve_ms, 2),
+        'total_cost': round(float(costs.sum()), 2),
+        'max_engineer_load': int(load.max()),
+    }
+    print(f"\n🧮 Assignment [{engine}]: total cost {LAST_ASSIGNMENT_STATS['total_cost']:.2f} "
+          f"in {LAST_ASSIGNMENT_STATS['solve_time_ms']:.1f} ms")
+
+
 def display_ai_insights(ai_analysis):
     """Display AI-generated insights in a readable format."""
     if not ai_analysis:
@@ -298,90 +646,97 @@ def display_ai_insights(ai_analysis):
 
     # Optimized Routes
     if 'optimized_routes' in ai_analysis:
-        print("\n🗺️  OPTIMIZED ROUTES:")
-        for route in ai_analysis['optimized_routes']:
-            print(f"  • {route.get('engineer')}: {len(route.get('route_sequence', []))} stops")
-            print(f"    Total Distance: {route.get('total_distance', 'N/A')}, "
-                  f"Est. Time: {route.get('estimated_time', 'N/A')}")
+        display_routes(ai_analysis['optimized_routes'])
 
     print("\n" + "=" * 80)
 
 
-def log_faults_and_assignments(assignments, ai_analysis, cycle_count):
-    """Log detected faults and AI analysis to file."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    timestamp_file = datetime.now().strftime('%Y%m%d_%H%M%S')
+def display_routes(routes):
+    """Print visit orders in the ``optimized_routes`` structure."""
+    print("\n🗺️  OPTIMIZED ROUTES:")
+    for route in routes:
+        sequence = route.get('route_sequence', [])
+        print(f"  • {route.get('engineer')}: {len(sequence)} stops")
+        print(f"    Total Distance: {route.get('total_distance', 'N/A')}, "
+              f"Est. Time: {route.get('estimated_time', 'N/A')}")
+        if sequence:
+            more = f" → ... (+{len(sequence) - 8})" if len(sequence) > 8 else ""
+            print(f"    Route: {' → '.join(str(c) for c in sequence[:8])}{more}")
+
 
-    # Always create a JSON file for each cycle
-    cycle_data = {
+def log_faults_and_assignments(assignments, ai_analysis, cycle_count, assignment_stats=None, ai_status=None,
+                               tick=None, routes=None, clusters=None):
+    """Log detected faults and AI analysis to file."""
+    # Simulated (backfill) cycles are logged at their scheduled time
+    now = datetime.fromtimestamp(tick['scheduled_at']) if tick and tick['simulated'] else datetime.now()
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+    timestamp_file = now.strftime('%Y%m%d_%H%M%S')
+
+    # One pass over the assignments: fault rows for the writers and the summary counts
+    assignments = assignments or []
+    rows, summary = collect_faults(assignments)
+    header = {
         "cycle_number": cycle_count,
         "timestamp": timestamp,
-        "total_faults": len(assignments) if assignments else 0,
-        "faults": [],
-        "summary": {
-            "feeders": {},
-            "engineers": {}
-        },
-        "ai_analysis": ai_analysis if ai_analysis else None
+        "total_faults": len(assignments),
+    }
+    trailer = {
+        "summary": summary,
+        "ai_analysis": ai_analysis if ai_analysis else None,
+        "ai_status": ai_status,
+        "assignment_stats": assignment_stats,
+        "optimized_routes": routes,
+        "clusters": clusters,
+        "schedule": {
+            "scheduled_at": datetime.fromtimestamp(tick['scheduled_at']).strftime("%Y-%m-%d %H:%M:%S"),
+            "lag_seconds": round(tick['lag'], 3),
+            "simulated": tick['simulated'],
+        } if tick else None
     }
 
-    # Add fault details
-    if assignments:
-        for assignment in assignments:
-            fault_entry = {
-                "customer_id": assignment['customer_id'],
-                "customer_name": assignment['customer_name'],
-                "feeder_id": assignment['feeder_id'],
-                "feeder_name": assignment['feeder_name'],
-                "old_output": assignment['old_output'],
-                "new_output": assignment['new_output'],
-                "change_percentage": round(assignment['change_percentage'], 2),
-                "latitude": assignment['latitude'],
-                "longitude": assignment['longitude'],
-                "assigned_engineer": assignment['assigned_engineer'],
-                "engineer_specialty": assignment['engineer_specialty'],
-                "assignment_reason": assignment.get('assignment_reason', 'N/A'),
-                "ai_assigned": assignment.get('ai_assigned', False)
-            }
-            cycle_data["faults"].append(fault_entry)
+    # Rollups first: the API's ETags change when the segment lands, so
+    # rollups are never older than the cycles they are served alongside
+    get_rollup_store().record(dict(header, faults=assignments))
 
-        # Generate summary statistics
-        feeder_counts = defaultdict(int)
-        engineer_counts = defaultdict(int)
+    # Append complete cycle data to the segment store, faults column-wise
+    segment_path = get_segment_writer().append(dict(header, fault_columns=fault_columns(rows), **trailer))
+    print(f"\n💾 Data saved to: {segment_path}")
 
-        for assignment in assignments:
-            feeder_counts[assignment['feeder_name']] += 1
-            engineer_counts[assignment['assigned_engineer']] += 1
+    # Optional per-cycle JSON export, streamed and renamed into place
+    if EXPORT_JSON_CYCLES:
+        json_filename = f"cycle_{cycle_count:04d}_{timestamp_file}.json"
+        size = write_cycle_json(json_filename, header, rows, trailer, EXPORT_JSON_INDENT)
+        monitor_metrics.inc('monitor_bytes_written_total', size, target='json_export')
+        print(f"💾 JSON export: {json_filename}")
 
-        cycle_data["summary"]["feeders"] = dict(feeder_counts)
-        cycle_data["summary"]["engineers"] = dict(engineer_counts)
+    # Also append to text log
+    if assignments and WRITE_TEXT_LOG:
+        size = append_fault_log("fault_log.txt", cycle_count, timestamp, assignments)
+        monitor_metrics.inc('monitor_bytes_written_total', size, target='fault_log')
 
-    # Save complete cycle data to JSON
-    json_filename = f"cycle_{cycle_count:04d}_{timestamp_file}.json"
-    with open(json_filename, "w", encoding="utf-8") as f:
-        json.dump(cycle_data, f, indent=2)
 
-    print(f"\n💾 Data saved to: {json_filename}")
+def archive_old_cycles():
+    """Move cycles and log blocks older than RETENTION_HOURS into the daily archives.
 
-    # Also append to text log
-    if assignments:
-        with open("fault_log.txt", "a", encoding="utf-8") as f:
-            f.write(f"\n{'=' * 80}\n")
-            f.write(f"Timestamp: {timestamp}\n")
-            f.write(f"Cycle: {cycle_count}\n")
-            f.write(f"Total Faults Detected: {len(assignments)}\n")
-            f.write(f"{'-' * 80}\n")
-
-            for assignment in assignments:
-                f.write(
-                    f"Customer ID: {assignment['customer_id']:6d} | "
-                    f"Feeder: {assignment['feeder_id']} | "
-                    f"Output: {assignment['old_output']:3d} -> {assignment['new_output']:3d} | "
-                    f"Location: {assignment['feeder_name']:20s} | "
-                    f"Engineer: {assignment['assigned_engineer']} ({assignment['engineer_specialty']})\n"
-                )
-                if assignment.get('ai_assigned'):
-                    f.write(f"  AI Reason: {assignment.get('assignment_reason', 'N/A')}\n")
+    Runs in the monitor, between cycles, because rotating fault_log.txt
+    rewrites the file the monitor appends to.
+    """
+    global last_archive_pass
+    if RETENTION_HOURS is None:
+        return
+    if last_archive_pass is not None and time.monotonic() - last_archive_pass < ARCHIVE_INTERVAL:
+        return
+    last_archive_pass = time.monotonic()
+    from archive import compact, rotate_fault_log
+
+    try:
+        cycles = compact(CYCLE_ARCHIVE_DIR, CYCLE_SEGMENT_DIR, '.', RETENTION_HOURS)
+        blocks = rotate_fault_log("fault_log.txt", CYCLE_ARCHIVE_DIR, RETENTION_HOURS)
+    except OSError as e:
+        print(f"\n⚠️  Archiving failed: {e}")
+        return
+    if cycles or blocks:
+        print(f"\n🗄️  Archived {cycles} cycles and {blocks} fault log blocks into {CYCLE_ARCHIVE_DIR}")
 
 
 def generate_summary(assignments):
@@ -408,12 +763,15 @@ def generate_summary(assignments):
         print(f"{eng:<25} {engineer_counts[eng]:>10}")
 
 
-def run_monitoring_cycle(cycle_count):
+def run_monitoring_cycle(cycle_count, tick=None):
     """Run a single monitoring cycle with AI analysis."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    started = time.perf_counter()
+    now = datetime.fromtimestamp(tick['scheduled_at']) if tick and tick['simulated'] else datetime.now()
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
 
     print(f"\n{'=' * 80}")
-    print(f"[Cycle {cycle_count}] {timestamp}")
+    lag = f" (started {tick['lag']:.1f}s late)" if tick and tick['lag'] >= 1 else ""
+    print(f"[Cycle {cycle_count}] {timestamp}{lag}")
     print(f"{'=' * 80}")
 
     # Reset engineer workloads
@@ -422,17 +780,28 @@ def run_monitoring_cycle(cycle_count):
         eng.assigned_faults = []
 
     # Monitor outputs
-    faults = monitor_outputs()
+    with monitor_metrics.time('monitor_stage_seconds', stage='monitor_outputs'):
+        faults = monitor_outputs()
+    monitor_metrics.inc('monitor_faults_total', len(faults))
 
     if faults:
         print(f"\n⚠️  {len(faults)} faults detected")
 
-        # AI Analysis
-        print("\n🤖 Running AI analysis...")
-        ai_analysis = analyze_faults_with_ai(faults)
+        # Spatial clusters, local and every cycle; assignments inherit each fault's cluster_id
+        clusters = None
+        if FAULT_CLUSTERING:
+            from clustering import cluster_faults
 
-        # Smart engineer assignment
-        assignments = assign_engineers_smartly(faults, ai_analysis)
+            with monitor_metrics.time('monitor_stage_seconds', stage='cluster_faults'):
+                clusters = cluster_faults(faults, CLUSTER_EPS_KM, CLUSTER_MIN_SAMPLES)
+            clustered = sum(c['size'] for c in clusters)
+            print(f"🧭 {len(clusters)} fault clusters covering {clustered} faults")
+            for cluster in clusters[:5]:
+                print(f"  • {cluster['description']}")
+
+        # Assign now; AI analysis runs in the background and is merged into the cycle later
+        with monitor_metrics.time('monitor_stage_seconds', stage='assign_engineers_smartly'):
+            assignments = assign_engineers_smartly(faults, None)
 
         # Display assignments
         print(f"\n{'=' * 80}")
@@ -454,57 +823,102 @@ def run_monitoring_cycle(cycle_count):
         if len(assignments) > 20:
             print(f"\n... and {len(assignments) - 20} more assignments")
 
-        # Display AI insights
-        display_ai_insights(ai_analysis)
-
         # Generate summary
         generate_summary(assignments)
 
+        # Visit order per engineer; AI-assigned cycles get routes from the AI analysis
+        routes = None
+        if ROUTE_PLANNING and not any(a.get('ai_assigned') for a in assignments):
+            from routing import plan_routes
+
+            with monitor_metrics.time('monitor_stage_seconds', stage='plan_routes'):
+                routes = plan_routes(assignments, {eng.name: (eng.current_latitude, eng.current_longitude)
+                                                   for eng in engineers})
+            display_routes(routes)
+
         # Log everything (now includes cycle_count parameter)
-        log_faults_and_assignments(assignments, ai_analysis, cycle_count)
+        ai_status = None
+        if get_ai_analyzer() is not None:
+            chunks = -(-len(faults) // AI_CHUNK_SIZE)
+            ai_status = {'chunks_total': chunks, 'chunks_done': 0, 'chunks_failed': 0, 'complete': False}
+        with monitor_metrics.time('monitor_stage_seconds', stage='log_faults_and_assignments'):
+            log_faults_and_assignments(assignments, None, cycle_count, LAST_ASSIGNMENT_STATS, ai_status, tick,
+                                       routes, clusters)
+
+        # AI Analysis, off the critical path: the cycle record exists before any result is merged
+        if ai_status is not None:
+            with monitor_metrics.time('monitor_stage_seconds', stage='analyze_faults_with_ai'):
+                analyze_faults_with_ai(faults, cycle_count)
+            print(f"\n🤖 AI analysis queued: {ai_status['chunks_total']} chunk(s) of up to {AI_CHUNK_SIZE} faults")
 
     else:
         print("\n✅ No anomalies detected")
         # Still create JSON file even with no faults
-        log_faults_and_assignments([], None, cycle_count)
+        with monitor_metrics.time('monitor_stage_seconds', stage='log_faults_and_assignments'):
+            log_faults_and_assignments([], None, cycle_count, tick=tick)
+
+    with monitor_metrics.time('monitor_stage_seconds', stage='archive_old_cycles'):
+        archive_old_cycles()
+
+    monitor_metrics.observe('monitor_stage_seconds', time.perf_counter() - started, stage='cycle')
+    monitor_metrics.inc('monitor_cycles_total')
+    if tick:
+        monitor_metrics.set('monitor_cycle_lag_seconds', tick['lag'])
+        monitor_metrics.set('monitor_last_cycle_timestamp_seconds', tick['scheduled_at'])
+    write_metrics()
 
     print("\n" + "-" * 80)
 
 
-# Main execution
-print("=" * 80)
-print("⚡ SMART CUSTOMER OUTPUT MONITORING SYSTEM")
-print("=" * 80)
-print(f"\nMonitoring {NUM_CUSTOMERS:,} customers across {len(FEEDERS)} feeders")
-print(f"Threshold: {THRESHOLD} units | Interval: {INTERVAL}s ({INTERVAL // 60} minutes)")
-print(f"\nAI Features:")
-print("  • Smart Engineer Assignment")
-print("  • Route Optimization")
-print("  • Failure Type Classification")
-print("  • Pattern Detection")
-print("  • Predictive Analytics")
-print("\n" + "=" * 80)
-
-# Check for API key
-api_key = os.environ.get("ANTHROPIC_API_KEY")
-if not api_key:
-    print("\n⚠️  WARNING: ANTHROPIC_API_KEY not found!")
-    print("AI features will be disabled. To enable:")
-    print("  1. Get an API key from https://console.anthropic.com/")
-    print("  2. Set environment variable:")
-    print("     export ANTHROPIC_API_KEY='your-key'  # Linux/Mac")
-    print("     set ANTHROPIC_API_KEY=your-key      # Windows CMD")
-    print("\nRunning in basic mode...\n")
-
-cycle_count = 0
-
-while True:
-    cycle_count += 1
-
-    # Run monitoring cycle
-    run_monitoring_cycle(cycle_count)
-
-    # Wait for the specified interval (2 minutes)
-    print(f"\n⏳ Waiting {INTERVAL}s until next cycle...")
-    print(f"Next cycle at: {datetime.fromtimestamp(time.time() + INTERVAL).strftime('%Y-%m-%d %H:%M:%S')}")
-    time.sleep(INTERVAL)
\ No newline at end of file
+def run_monitor(policy=None, backfill=None, start=None):
+    """Run monitoring cycles forever, or replay ``backfill`` cycles without waiting.
+
+    ``start`` is the first simulated boundary of a backfill (epoch seconds).
+    monitor_cli.py is the command-line entry point.
+    """
+    policy = policy or SCHEDULE_POLICY
+    print("=" * 80)
+    print("⚡ SMART CUSTOMER OUTPUT MONITORING SYSTEM")
+    print("=" * 80)
+    print(f"\nMonitoring {NUM_CUSTOMERS:,} customers across {len(FEEDERS)} feeders")
+    print(f"Threshold: {THRESHOLD} units | Interval: {INTERVAL}s ({INTERVAL // 60} minutes) "
+          f"on wall-clock boundaries, overruns: {policy}")
+    if DETECTOR == "ewma":
+        print(f"Adaptive detection: {EWMA_SENSITIVITY}σ per meter (α={EWMA_ALPHA}, warm-up {EWMA_WARMUP} readings)")
+    print(f"\nAI Features:")
+    print("  • Smart Engineer Assignment")
+    print("  • Route Optimization")
+    print("  • Failure Type Classification")
+    print("  • Pattern Detection")
+    print("  • Predictive Analytics")
+    print("\n" + "=" * 80)
+
+    # Check for API key
+    api_key = os.environ.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        print("\n⚠️  WARNING: ANTHROPIC_API_KEY not found!")
+        print("AI features will be disabled. To enable:")
+        print("  1. Get an API key from https://console.anthropic.com/")
+        print("  2. Set environment variable:")
+        print("     export ANTHROPIC_API_KEY='your-key'  # Linux/Mac")
+        print("     set ANTHROPIC_API_KEY=your-key      # Windows CMD")
+        print("\nRunning in basic mode...\n")
+
+    scheduler = CycleScheduler(INTERVAL, policy, SCHEDULE_MAX_CATCHUP)
+
+    try:
+        if backfill:
+            stats = scheduler.backfill(lambda tick: run_monitoring_cycle(tick['cycle_number'], tick), backfill, start)
+            print(f"\n⏩ Backfilled {backfill} cycles in {stats['elapsed']:.1f}s "
+                  f"({stats['cycles_per_second'] or 0:.1f} cycles/s)")
+            return
+
+        scheduler.run(lambda tick: run_monitoring_cycle(tick['cycle_number'], tick))
+    finally:
+        stop_ingestion()
+
+
+if __name__ == "__main__":
+    import monitor_cli
+
+    monitor_cli.main()
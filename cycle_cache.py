@@ -0,0 +1,359 @@
+import bisect
+import fnmatch
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class JsonCycleFiles:
+    """Cycle source over ``cycle_*.json`` files in a directory."""
+
+    def __init__(self, directory='.', pattern='cycle_*.json'):
+        self.directory = directory
+        self.pattern = pattern
+
+    def scan(self):
+        """Return ``{name: (mtime_ns, size)}`` for every matching file."""
+        found = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if fnmatch.fnmatch(entry.name, self.pattern) and entry.is_file():
+                        st = entry.stat()
+                        found[entry.name] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            pass
+        return found
+
+    def load(self, name):
+        try:
+            with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+class CycleCache:
+    """In-process cache of parsed cycles.
+
+    Cycles come from one or more sources (``JsonCycleFiles``,
+    ``cycle_segments.SegmentReader``). A source's ``scan()`` maps each cycle
+    key to a ``(write_time_ns, size)`` signature and ``load(key)`` parses it.
+    Each cycle is parsed once and re-read only when its signature changes;
+    a source with ``patch(key, data, old_signature)`` (segments) is asked to
+    merge just what was appended to the cycle since, instead of a reload.
+    Parsed cycles are kept newest-first up to ``max_bytes`` of source data;
+    older entries are evicted but stay counted in ``total_cycles``.
+
+    The same cycle can be in several sources at once (a segment record and
+    its JSON export, or an archived copy); copies are matched by cycle number
+    and timestamp and only the first written (the segment record, which
+    carries merged AI results) is served and announced to listeners.
+    Returned dicts are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, sources, max_bytes=64 * 1024 * 1024, refresh_interval=1.0):
+        self.sources = list(sources)
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+
+        self._signatures = {}  # (source index, key) -> (write_time_ns, size)
+        self._identity = {}  # (source index, key) -> (cycle_number, timestamp) of parsed cycles
+        self._copies = {}  # identity -> names holding that cycle
+        self._served = {}  # identity -> the name served for it
+        self._entries = OrderedDict()  # served name -> parsed cycle, oldest first
+        self._bytes = 0
+        self._sorted = None
+        self._last_refresh = 0.0
+        self._fingerprint = (None, 0, 0, 0)
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def subscribe(self, listener, evicted=False):
+        """Register an object with ``cycle_added(name, data)`` and ``cycle_removed(name)``.
+
+        The listener is replayed every cycle already cached (with
+        ``evicted=True`` also the evicted ones, re-read one at a time and not
+        kept), then notified of each cycle parsed or dropped by later
+        refreshes. When a cycle changes but its fault list does not (an AI
+        result merged in), a listener with ``cycle_updated(name, data)`` gets
+        that instead of removed + added.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+            names = self._served.values() if evicted else self._entries
+            for name in sorted(names, key=self._rank):
+                data = self._entries.get(name)
+                if data is None:
+                    data = self._load(name)
+                if data is not None:
+                    listener.cycle_added(name, data)
+
+    def _scan(self):
+        found = {}
+        for i, source in enumerate(self.sources):
+            for key, signature in source.scan().items():
+                found[(i, key)] = signature
+        return found
+
+    def _load(self, name):
+        index, key = name
+        return self.sources[index].load(key)
+
+    def _rank(self, name):
+        return self._signatures[name][0], name[0]
+
+    def _show(self, name, data):
+        self._served[self._identity[name]] = name
+        self._entries[name] = data
+        self._bytes += self._signatures[name][1]
+        for listener in self._listeners:
+            listener.cycle_added(name, data)
+
+    def _hide(self, name):
+        if name in self._entries:
+            del self._entries[name]
+            self._bytes -= self._signatures[name][1]
+        for listener in self._listeners:
+            listener.cycle_removed(name)
+
+    def _add(self, name, data):
+        """Record a parsed cycle and serve it unless an earlier copy is served."""
+        identity = (data.get('cycle_number'), data.get('timestamp'))
+        self._identity[name] = identity
+        self._copies.setdefault(identity, set()).add(name)
+        current = self._served.get(identity)
+        if current is None or self._rank(name) < self._rank(current):
+            if current is not None:
+                self._hide(current)
+            self._show(name, data)
+
+    def _forget(self, name):
+        """Drop a parsed cycle; serve its next copy if it was the served one."""
+        identity = self._identity.pop(name, None)
+        if identity is None:
+            return
+        copies = self._copies[identity]
+        copies.discard(name)
+        if self._served.get(identity) != name:
+            return
+        del self._served[identity]
+        self._hide(name)
+        for other in sorted(copies, key=self._rank):
+            data = self._load(other)
+            if data is not None:
+                self._show(other, data)
+                break
+            copies.discard(other)
+            del self._identity[other]
+        if not copies:
+            del self._copies[identity]
+
+    def _patch(self, name, old_signature):
+        """Merge what was appended to a served, cached cycle; False when it needs a reload."""
+        index, key = name
+        patch = getattr(self.sources[index], 'patch', None)
+        data = self._entries.get(name)
+        if patch is None or data is None:
+            return False
+        patched = patch(key, data, old_signature)
+        if patched is None:
+            return False
+        self._entries[name] = patched
+        self._bytes += self._signatures[name][1] - old_signature[1]
+        for listener in self._listeners:
+            updated = getattr(listener, 'cycle_updated', None)
+            if updated is not None and patched.get('faults') is data.get('faults'):
+                updated(name, patched)
+            else:
+                listener.cycle_removed(name)
+                listener.cycle_added(name, patched)
+        return True
+
+    def refresh(self, force=False):
+        """Pick up new, changed and removed files since the last scan."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = now
+
+            found = self._scan()
+            changed = False
+
+            for name in list(self._signatures):
+                if name not in found:
+                    self._forget(name)
+                    del self._signatures[name]
+                    changed = True
+
+            fresh = [name for name, sig in found.items() if self._signatures.get(name) != sig]
+            fresh.sort(key=lambda n: (found[n][0], n[0]))
+
+            for name in fresh:
+                old_signature = self._signatures.get(name)
+                self._signatures[name] = found[name]
+                changed = True
+                if old_signature is not None:
+                    if self._patch(name, old_signature):
+                        continue
+                    self._forget(name)
+                data = self._load(name)
+                if data is not None:
+                    self._add(name, data)
+
+            if changed:
+                # Keep entries ordered by mtime so eviction drops the oldest cycles
+                order = sorted(self._entries, key=lambda n: self._signatures[n][0])
+                self._entries = OrderedDict((n, self._entries[n]) for n in order)
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    name, _ = self._entries.popitem(last=False)
+                    self._bytes -= self._signatures[name][1]
+                self._sorted = None
+
+                latest = next(reversed(self._entries.values()), None) if self._entries else None
+                self._fingerprint = (
+                    latest.get('cycle_number') if latest else None,
+                    len(self._signatures),
+                    sum(size for _, size in self._signatures.values()),
+                    max((t for t, _ in self._signatures.values()), default=0),
+                )
+
+    @property
+    def total_cycles(self):
+        """Number of distinct cycles in the sources, including evicted ones."""
+        self.refresh()
+        return len(self._copies)
+
+    def fingerprint(self):
+        """``(latest cycle_number, cycle count, total bytes, last write time in ns)``.
+
+        Derived from the source signatures only, so every worker process
+        computes the same value for the same cycles on disk.
+        """
+        self.refresh()
+        with self._lock:
+            return self._fingerprint
+
+    def find(self, cycle_number):
+        """Return the cached cycle with this number, or None (unknown or evicted)."""
+        cycles = self.cycles()
+        i = bisect.bisect_left(cycles, cycle_number, key=lambda x: x.get('cycle_number', 0))
+        if i < len(cycles) and cycles[i].get('cycle_number') == cycle_number:
+            return cycles[i]
+        return None
+
+    def latest(self):
+        """Return the most recently written cycle, or None."""
+        self.refresh()
+        with self._lock:
+            if not self._entries:
+                return None
+            return next(reversed(self._entries.values()))
+
+    def cycles(self):
+        """Return the cached cycles sorted by cycle number."""
+        self.refresh()
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(self._entries.values(), key=lambda x: x.get('cycle_number', 0))
+            return self._sorted
+
+
+class CustomerHistoryIndex:
+    """Inverted index from customer_id to that customer's most recent fault records.
+
+    Built on the first ``history`` call by replaying every cycle of ``cache``
+    (evicted ones included), then extended as the cache parses new cycles.
+    Records are kept as tuples, at most ``max_records`` per customer (the
+    oldest are dropped), and a cycle's customer ids only while one of its
+    records is kept, so memory is bounded by customers rather than cycles.
+    """
+
+    def __init__(self, cache=None, max_records=100):
+        self.cache = cache
+        self.max_records = max_records
+        self._by_customer = {}  # customer_id -> [(cycle_number, seq, name, timestamp, old, new, pct, engineer)]
+        self._cycles = {}  # name -> [customer ids with a record from that cycle, records still kept]
+        self._total = 0  # cycles indexed, including those with no record left
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._attach_lock = threading.Lock()
+        self._attached = cache is None
+
+    def _attach(self):
+        with self._attach_lock:
+            if not self._attached:
+                self.cache.refresh()
+                self.cache.subscribe(self, evicted=True)
+                self._attached = True
+
+    def cycle_added(self, name, data):
+        cycle_number = data.get('cycle_number', 0)
+        timestamp = data.get('timestamp')
+
+        with self._lock:
+            self._total += 1
+            state = self._cycles[name] = [[], 0]
+            for fault in data.get('faults', []):
+                customer_id = fault.get('customer_id')
+                entry = (cycle_number, next(self._seq), name, timestamp, fault.get('old_output'),
+                         fault.get('new_output'), fault.get('change_percentage'), fault.get('assigned_engineer'))
+                entries = self._by_customer.setdefault(customer_id, [])
+                if not entries or entries[-1][:2] < entry[:2]:
+                    entries.append(entry)
+                else:
+                    bisect.insort(entries, entry)
+                state[0].append(customer_id)
+                state[1] += 1
+                if len(entries) > self.max_records:
+                    self._release(entries.pop(0)[2])
+            if state[1] <= 0:
+                self._cycles.pop(name, None)
+
+    def _release(self, name):
+        state = self._cycles.get(name)
+        if state is not None:
+            state[1] -= 1
+            if state[1] <= 0:
+                del self._cycles[name]
+
+    def cycle_updated(self, name, data):
+        """The cycle's faults are unchanged (an AI result was merged); nothing to re-index."""
+
+    def cycle_removed(self, name):
+        with self._lock:
+            self._total -= 1
+            state = self._cycles.pop(name, None)
+            for customer_id in set(state[0]) if state else ():
+                entries = [e for e in self._by_customer.get(customer_id, ()) if e[2] != name]
+                if entries:
+                    self._by_customer[customer_id] = entries
+                else:
+                    self._by_customer.pop(customer_id, None)
+
+    @property
+    def total_cycles(self):
+        return self._total
+
+    def history(self, customer_id):
+        """Return the customer's fault history ordered by cycle number."""
+        self._attach()
+        with self._lock:
+            entries = self._by_customer.get(customer_id, ())
+            total = self._total
+            return [
+                {
+                    'cycle': cycle_number,
+                    'timestamp': timestamp,
+                    'old_output': old_output,
+                    'new_output': new_output,
+                    'change_percentage': change_percentage,
+                    'assigned_engineer': engineer,
+                    'status': 'Resolved' if cycle_number < total - 2 else 'Pending',
+                }
+                for cycle_number, _, _, timestamp, old_output, new_output, change_percentage, engineer in entries
+            ]
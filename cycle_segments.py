@@ -0,0 +1,391 @@
+"""Append-only segment store for monitoring cycles.
+
+A segment file holds many cycles back to back::
+
+    header   | magic, version, segment number, creation time
+    record*  | kind, cycle number, write time (ns), payload length, crc32, payload
+    footer   | one index entry per record, then a fixed-size trailer
+
+Payloads are zlib-compressed compact JSON with the fault list stored
+column-wise. The footer is only written when a segment is sealed; the active
+segment is indexed by walking record headers, which skips the payloads.
+
+Update records carry a patch for an earlier cycle (e.g. AI results that
+arrive after the cycle was written). Readers merge them into the cycle with
+``apply_update``, in write order.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b'CYSG'
+INDEX_MAGIC = b'CYIX'
+VERSION = 1
+
+KIND_CYCLE = 1
+KIND_UPDATE = 2
+
+HEADER = struct.Struct('<4sHHId')  # magic, version, flags, segment number, created
+RECORD = struct.Struct('<BIQII')  # kind, cycle number, written_ns, payload length, crc32
+INDEX_ENTRY = struct.Struct('<BIQQ')  # kind, cycle number, written_ns, record offset
+TRAILER = struct.Struct('<4sIQ')  # magic, entry count, index offset
+
+SEGMENT_PREFIX = 'segment_'
+SEGMENT_SUFFIX = '.seg'
+
+
+def encode_cycle(cycle_data):
+    """Serialize a cycle dict into a compressed, column-wise payload.
+
+    A cycle that already carries ``fault_columns`` (see
+    ``cycle_writer.fault_columns``) is stored as is.
+    """
+    payload = dict(cycle_data)
+    faults = payload.pop('faults', None) or []
+
+    if 'fault_columns' not in payload:
+        keys = list(faults[0]) if faults else []
+        if all(len(f) == len(keys) and all(k in f for k in keys) for f in faults):
+            payload['fault_columns'] = {
+                'keys': keys,
+                'values': [[f[k] for f in faults] for k in keys],
+            }
+        else:
+            payload['faults'] = faults
+
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return zlib.compress(raw, 6)
+
+
+def decode_cycle(blob):
+    """Inverse of ``encode_cycle``."""
+    payload = json.loads(zlib.decompress(blob).decode('utf-8'))
+    columns = payload.pop('fault_columns', None)
+    if columns is not None:
+        keys = columns['keys']
+        payload['faults'] = [dict(zip(keys, row)) for row in zip(*columns['values'])]
+    return payload
+
+
+def encode_update(patch):
+    return zlib.compress(json.dumps(patch, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def decode_update(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def apply_update(cycle_data, patch):
+    """Merge ``patch`` into ``cycle_data`` in place.
+
+    Nested dicts are merged, lists are extended (skipping strings already
+    present) and anything else is replaced.
+    """
+    for key, value in patch.items():
+        current = cycle_data.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            apply_update(current, value)
+        elif isinstance(current, list) and isinstance(value, list):
+            seen = {item for item in current if isinstance(item, str)}
+            current.extend(item for item in value if not (isinstance(item, str) and item in seen))
+        else:
+            cycle_data[key] = value
+    return cycle_data
+
+
+def merged_update(cycle_data, patch):
+    """``apply_update`` on a copy: only the dicts and lists ``patch`` touches are copied."""
+    merged = dict(cycle_data)
+    for key, value in patch.items():
+        current = merged.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            merged[key] = merged_update(current, value)
+        elif isinstance(current, list) and isinstance(value, list):
+            seen = {item for item in current if isinstance(item, str)}
+            merged[key] = current + [item for item in value if not (isinstance(item, str) and item in seen)]
+        else:
+            merged[key] = value
+    return merged
+
+
+def segment_name(number):
+    return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory):
+    """Return segment file names in write order."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(n for n in names if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX))
+
+
+def read_footer(f, file_size):
+    """Return ``(entries, index_offset)`` of a sealed segment, or None if it is still open."""
+    if file_size < HEADER.size + TRAILER.size:
+        return None
+    f.seek(file_size - TRAILER.size)
+    magic, count, index_offset = TRAILER.unpack(f.read(TRAILER.size))
+    if magic != INDEX_MAGIC or index_offset + count * INDEX_ENTRY.size + TRAILER.size != file_size:
+        return None
+    f.seek(index_offset)
+    raw = f.read(count * INDEX_ENTRY.size)
+    return [INDEX_ENTRY.unpack_from(raw, i * INDEX_ENTRY.size) for i in range(count)], index_offset
+
+
+def scan_records(f, start, end, verify=False):
+    """Walk record headers from ``start``; return (entries, offset of the first bad byte)."""
+    entries = []
+    offset = start
+    while offset + RECORD.size <= end:
+        f.seek(offset)
+        kind, cycle_number, written_ns, length, crc = RECORD.unpack(f.read(RECORD.size))
+        if kind not in (KIND_CYCLE, KIND_UPDATE) or offset + RECORD.size + length > end:
+            break
+        if verify and zlib.crc32(f.read(length)) != crc:
+            break
+        entries.append((kind, cycle_number, written_ns, offset))
+        offset += RECORD.size + length
+    return entries, offset
+
+
+class SegmentWriter:
+    """Appends records to the newest segment, sealing it after ``max_cycles`` records."""
+
+    def __init__(self, directory='cycle_segments', max_cycles=720):
+        self.directory = directory
+        self.max_cycles = max_cycles
+        self._file = None
+        self._opened = False
+        self._number = 0
+        self._index = []
+        self._lock = threading.Lock()
+        self.bytes_written = 0  # record bytes appended by this writer
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        segments = list_segments(self.directory)
+
+        if segments:
+            last = segments[-1]
+            self._number = int(last[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            path = os.path.join(self.directory, last)
+            f = open(path, 'r+b')
+            size = os.fstat(f.fileno()).st_size
+            if size >= HEADER.size and read_footer(f, size) is None:
+                # Resume the open segment, dropping any torn record at the tail
+                self._index, end = scan_records(f, HEADER.size, size, verify=True)
+                f.truncate(end)
+                f.seek(end)
+                self._file = f
+                return
+            f.close()
+            self._number += 1
+
+        self._start_segment()
+
+    def _start_segment(self):
+        path = os.path.join(self.directory, segment_name(self._number))
+        self._file = open(path, 'w+b')
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, self._number, time.time()))
+        self._index = []
+
+    def _seal(self):
+        f = self._file
+        index_offset = f.tell()
+        f.write(b''.join(INDEX_ENTRY.pack(*entry) for entry in self._index))
+        f.write(TRAILER.pack(INDEX_MAGIC, len(self._index), index_offset))
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        self._file = None
+        self._number += 1
+
+    def append(self, cycle_data):
+        """Append one cycle; return the path of the segment it was written to."""
+        return self._write(KIND_CYCLE, cycle_data.get('cycle_number', 0), encode_cycle(cycle_data))
+
+    def append_update(self, cycle_number, patch):
+        """Append a patch for an already written cycle; see ``apply_update``."""
+        return self._write(KIND_UPDATE, cycle_number, encode_update(patch))
+
+    def _write(self, kind, cycle_number, blob):
+        with self._lock:
+            if not self._opened:
+                self._open()
+                self._opened = True
+            elif self._file is None:
+                self._start_segment()
+
+            f = self._file
+            offset = f.tell()
+            written_ns = time.time_ns()
+            f.write(RECORD.pack(kind, cycle_number, written_ns, len(blob), zlib.crc32(blob)))
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+            self.bytes_written += RECORD.size + len(blob)
+            self._index.append((kind, cycle_number, written_ns, offset))
+            path = f.name
+
+            if len(self._index) >= self.max_cycles:
+                self._seal()
+
+        return path
+
+    def close(self):
+        """Seal the active segment."""
+        with self._lock:
+            if self._file is not None:
+                self._seal()
+
+
+class SegmentReader:
+    """Incremental reader over a directory of segments.
+
+    ``scan()`` returns ``{(segment, offset): (written_ns, length)}`` for every
+    cycle record, so it can be used as a ``CycleCache`` source. Update records
+    are attached to the latest earlier cycle with the same number: they add to
+    its length, so the cycle's signature changes, ``load`` applies them and
+    ``patch`` applies just the new ones to an already loaded copy. Sealed
+    segments are indexed from their footer; the open one is re-walked from
+    where the previous scan stopped.
+    """
+
+    def __init__(self, directory='cycle_segments'):
+        self.directory = directory
+        self._segments = {}  # name -> {'size', 'sealed', 'end', 'entries'}
+        self._updates = {}  # cycle key -> [(segment, offset, length), ...] in write order
+        self._lengths = {}  # cycle key -> length of the cycle record alone
+        self._latest = {}  # cycle number -> key of its most recent cycle record
+        self._lock = threading.Lock()
+
+    def _update(self, name):
+        path = os.path.join(self.directory, name)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+
+        state = self._segments.get(name)
+        if state is not None and (state['sealed'] or state['size'] == size):
+            return state
+        if state is None or size < state['size']:
+            state = {'size': 0, 'sealed': False, 'end': HEADER.size, 'entries': []}
+
+        with open(path, 'rb') as f:
+            footer = read_footer(f, size)
+            if footer is not None:
+                state['entries'], state['end'] = footer
+                state['sealed'] = True
+            else:
+                entries, end = scan_records(f, state['end'], size)
+                state['entries'].extend(entries)
+                state['end'] = end
+        state['size'] = size
+        self._segments[name] = state
+        return state
+
+    def scan(self):
+        found = {}
+        updates = {}
+        lengths = {}
+        latest = {}
+        with self._lock:
+            names = list_segments(self.directory)
+            for name in set(self._segments) - set(names):
+                del self._segments[name]
+            for name in names:
+                state = self._update(name)
+                if state is None:
+                    continue
+                entries = state['entries']
+                for i, (kind, cycle_number, written_ns, offset) in enumerate(entries):
+                    end = entries[i + 1][3] if i + 1 < len(entries) else state['end']
+                    if kind == KIND_CYCLE:
+                        key = (name, offset)
+                        found[key] = lengths[key] = (written_ns, end - offset)
+                        latest[cycle_number] = key
+                    elif cycle_number in latest:
+                        key = latest[cycle_number]
+                        updates.setdefault(key, []).append((name, offset, end - offset))
+                        written, length = found[key]
+                        found[key] = (written, length + end - offset)
+            self._updates = updates
+            self._lengths = {key: length for key, (_, length) in lengths.items()}
+            self._latest = latest
+        return found
+
+    def sealed(self):
+        """``{name: newest record write time (ns)}`` of the sealed segments seen by the last ``scan``."""
+        with self._lock:
+            return {name: max((entry[2] for entry in state['entries']), default=0)
+                    for name, state in self._segments.items() if state['sealed']}
+
+    def _read(self, name, offset):
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                f.seek(offset)
+                kind, cycle_number, written_ns, length, crc = RECORD.unpack(f.read(RECORD.size))
+                blob = f.read(length)
+        except (OSError, struct.error):
+            return None
+        if len(blob) != length or zlib.crc32(blob) != crc:
+            return None
+        return kind, blob
+
+    def load(self, key):
+        """Read and decode the cycle record at ``(segment, offset)``, with its updates applied."""
+        record = self._read(*key)
+        if record is None or record[0] != KIND_CYCLE:
+            return None
+        data = decode_cycle(record[1])
+
+        with self._lock:
+            updates = list(self._updates.get(key, ()))
+        for name, offset, _ in updates:
+            update = self._read(name, offset)
+            if update is not None:
+                apply_update(data, decode_update(update[1]))
+        return data
+
+    def patch(self, key, data, signature):
+        """Return ``data`` (loaded when the cycle had ``signature``) with the updates written
+        since then merged into a copy; None when it must be reloaded instead."""
+        with self._lock:
+            updates = list(self._updates.get(key, ()))
+            covered = self._lengths.get(key)
+        if covered is None:
+            return None
+        fresh = []
+        for update in updates:
+            if covered < signature[1]:
+                covered += update[2]
+            else:
+                fresh.append(update)
+        if covered != signature[1]:
+            return None
+        for name, offset, _ in fresh:
+            update = self._read(name, offset)
+            if update is None:
+                return None
+            data = merged_update(data, decode_update(update[1]))
+        return data
+
+    def find(self, cycle_number):
+        """Return the most recently written cycle with ``cycle_number``, or None."""
+        self.scan()
+        with self._lock:
+            key = self._latest.get(cycle_number)
+        return None if key is None else self.load(key)
+
+    def iter_cycles(self):
+        """Yield every cycle in write order."""
+        for key, _ in sorted(self.scan().items(), key=lambda item: item[1][0]):
+            data = self.load(key)
+            if data is not None:
+                yield data
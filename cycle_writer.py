@@ -0,0 +1,121 @@
+"""Streaming serialization of a cycle's faults.
+
+``collect_faults`` walks the assignments once, keeping each fault as a
+tuple of ``FAULT_KEYS`` values (no per-fault dict copy) and counting faults
+per feeder and engineer on the way. The rows are then written
+column-wise to the segment store, streamed fault by fault into the
+optional JSON export, and formatted into the text log in batches.
+
+``write_cycle_json`` writes to a hidden temporary file next to the target
+and renames it into place, so readers only ever see complete cycles.
+"""
+import json
+import os
+from collections import defaultdict
+
+FAULT_KEYS = ('customer_id', 'customer_name', 'feeder_id', 'feeder_name', 'old_output', 'new_output',
+              'change_percentage', 'latitude', 'longitude', 'assigned_engineer', 'engineer_specialty',
+              'assignment_reason', 'ai_assigned', 'cluster_id')
+WRITE_BUFFER_BYTES = 1024 * 1024
+WRITE_BATCH = 5000  # Faults formatted per write call
+
+FAULT_LOG_LINE = ("Customer ID: %6d | Feeder: %s | Output: %3d -> %3d | Location: %-20s | "
+                  "Engineer: %s (%s)\n")
+
+
+def collect_faults(assignments):
+    """Return ``(rows, summary)``: one ``FAULT_KEYS`` tuple per assignment and
+    the per-feeder and per-engineer fault counts."""
+    rows = []
+    feeders = defaultdict(int)
+    engineers = defaultdict(int)
+    for a in assignments:
+        rows.append((a['customer_id'], a['customer_name'], a['feeder_id'], a['feeder_name'],
+                     a['old_output'], a['new_output'], round(a['change_percentage'], 2),
+                     a['latitude'], a['longitude'], a['assigned_engineer'], a['engineer_specialty'],
+                     a.get('assignment_reason', 'N/A'), a.get('ai_assigned', False), a.get('cluster_id')))
+        feeders[a['feeder_name']] += 1
+        engineers[a['assigned_engineer']] += 1
+    return rows, {'feeders': dict(feeders), 'engineers': dict(engineers)}
+
+
+def fault_columns(rows):
+    """The ``fault_columns`` payload of the segment store for ``rows``."""
+    return {'keys': list(FAULT_KEYS), 'values': [list(column) for column in zip(*rows)] if rows else []}
+
+
+def write_cycle_json(path, header, rows, trailer, indent=None):
+    """Write a cycle as JSON through a temporary file and an atomic rename.
+
+    The document is ``header``'s keys, then ``"faults"`` streamed from
+    ``rows`` one fault at a time, then ``trailer``'s keys. ``indent=None``
+    writes compact JSON with one fault per line. Returns the bytes written.
+    """
+    directory, name = os.path.split(path)
+    temp = os.path.join(directory, f".{name}.tmp")
+    separators = (',', ':') if indent is None else (',', ': ')
+    pad = '' if indent is None else ' ' * indent
+    space = '' if indent is None else ' '
+
+    def member(key, value):
+        text = json.dumps(value, indent=indent, separators=separators)
+        if indent is not None:
+            text = text.replace('\n', '\n' + pad)
+        return f"{pad}{json.dumps(key)}:{space}{text}"
+
+    try:
+        with open(temp, 'w', encoding='utf-8', buffering=WRITE_BUFFER_BYTES) as f:
+            f.write('{\n')
+            for key, value in header.items():
+                f.write(member(key, value) + ',\n')
+
+            f.write(f'{pad}"faults":{space}[')
+            item_pad = '\n' + pad * 2 if indent is not None else '\n'
+            encode = json.JSONEncoder(indent=indent, separators=separators).encode
+            for start in range(0, len(rows), WRITE_BATCH):
+                batch = rows[start:start + WRITE_BATCH]
+                entries = (encode(dict(zip(FAULT_KEYS, row))) for row in batch)
+                if indent is not None:
+                    entries = (entry.replace('\n', item_pad) for entry in entries)
+                f.write((',' if start else '') + item_pad + (',' + item_pad).join(entries))
+            f.write(('\n' + pad if rows else '') + ']')
+
+            for key, value in trailer.items():
+                f.write(',\n' + member(key, value))
+            f.write('\n}\n')
+            size = f.tell()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def format_fault_log(cycle_count, timestamp, assignments):
+    """Yield the text-log block for one cycle in chunks of ``WRITE_BATCH`` faults."""
+    yield (f"\n{'=' * 80}\nTimestamp: {timestamp}\nCycle: {cycle_count}\n"
+           f"Total Faults Detected: {len(assignments)}\n{'-' * 80}\n")
+    for start in range(0, len(assignments), WRITE_BATCH):
+        lines = []
+        for a in assignments[start:start + WRITE_BATCH]:
+            lines.append(FAULT_LOG_LINE % (a['customer_id'], a['feeder_id'], a['old_output'], a['new_output'],
+                                           a['feeder_name'], a['assigned_engineer'], a['engineer_specialty']))
+            if a.get('ai_assigned'):
+                lines.append(f"  AI Reason: {a.get('assignment_reason', 'N/A')}\n")
+        yield ''.join(lines)
+
+
+def append_fault_log(path, cycle_count, timestamp, assignments):
+    """Append one cycle's block to the text log, one write per batch; return the bytes written."""
+    written = 0
+    with open(path, 'ab', buffering=WRITE_BUFFER_BYTES) as f:
+        for chunk in format_fault_log(cycle_count, timestamp, assignments):
+            data = chunk.encode('utf-8')
+            f.write(data)
+            written += len(data)
+    return written
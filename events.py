@@ -0,0 +1,206 @@
+"""In-process event bus behind the dashboards' Server-Sent Events stream.
+
+Events live in one ring buffer shared by every subscriber; a subscriber is
+just a position in it plus a filter, so an idle dashboard is a thread parked
+on a condition variable. Each event names the engineers and customers it
+concerns; subscribers filtered to an engineer or customer only see those
+(unfiltered subscribers, e.g. the admin dashboard, see everything).
+
+The bus lives in one process and does not fan out between processes. Under
+a multi-worker server (e.g. gunicorn -w 4) a subscriber only receives the
+issue and task events published by the worker it is connected to. Cycle
+events still reach everyone, because every worker polls the shared cycle
+store and announces new cycles itself.
+"""
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+
+class EventBus:
+    def __init__(self, history=1000):
+        self._events = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self.last_id = 0
+
+    def publish(self, kind, data, engineers=(), customers=()):
+        """Record an event; ``engineers``/``customers`` select who receives it."""
+        with self._cond:
+            event_id = next(self._ids)
+            self._events.append({
+                'id': event_id,
+                'type': kind,
+                'data': data,
+                'engineers': frozenset(engineers),
+                'customers': frozenset(str(c) for c in customers),
+            })
+            self.last_id = event_id
+            self._cond.notify_all()
+        return event_id
+
+    def _matching(self, after_id, engineer, customer):
+        found = []
+        for event in reversed(self._events):
+            if event['id'] <= after_id:
+                break
+            if engineer is not None and engineer not in event['engineers']:
+                continue
+            if customer is not None and str(customer) not in event['customers']:
+                continue
+            found.append(event)
+        found.reverse()
+        return found
+
+    def wait(self, after_id, engineer=None, customer=None, timeout=15.0):
+        """Return ``(events after after_id for this filter, new position)``, waiting up to ``timeout``."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events = self._matching(after_id, engineer, customer)
+                position = self.last_id
+                if events:
+                    return events, position
+                after_id = position
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    return [], self.last_id
+
+    def stream(self, last_id=None, engineer=None, customer=None, heartbeat=15.0):
+        """Yield SSE-formatted text forever; comments keep idle connections open."""
+        position = self.last_id if last_id is None else last_id
+        yield "retry: 5000\n\n"
+        while True:
+            events, position = self.wait(position, engineer, customer, heartbeat)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                payload = json.dumps({'type': event['type'], **event['data']}, separators=(',', ':'))
+                yield f"id: {event['id']}\ndata: {payload}\n\n"
+
+
+class CycleEvents:
+    """``CycleCache`` listener that publishes a compact event per new or updated cycle.
+
+    Dashboards show the latest cycle, so a new cycle is announced both to
+    the engineers and customers in it and to those in the cycle it replaces.
+    Updates (AI chunks merging in) are coalesced: at most one
+    ``cycle_updated`` per cycle every ``update_interval`` seconds, sent by
+    ``flush``, except that the one completing the AI analysis goes out at once.
+    """
+
+    def __init__(self, bus, update_interval=30.0):
+        self.bus = bus
+        self.update_interval = update_interval
+        self._seen = set()
+        self._live = False
+        self._latest = None  # (cycle number, engineers, customers) of the newest announced cycle
+        self._pending = {}  # name -> newest data of an update not published yet
+        self._sent = {}  # name -> monotonic time of its last published update
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Publish from now on; cycles loaded before this are only remembered."""
+        self._live = True
+
+    def cycle_added(self, name, data):
+        updated = name in self._seen
+        self._seen.add(name)
+        if not self._live:
+            return
+        if updated:
+            self.cycle_updated(name, data)
+            return
+
+        engineers, customers = _recipients(data)
+        cycle_number = data.get('cycle_number')
+        with self._lock:
+            previous = self._latest
+            if previous is None or (cycle_number or 0) >= (previous[0] or 0):
+                self._latest = (cycle_number, engineers, customers)
+        if previous is not None and self._latest is not previous:
+            engineers, customers = engineers | previous[1], customers | previous[2]
+        self.bus.publish('cycle', _summary(data), engineers=engineers, customers=customers)
+
+    def cycle_updated(self, name, data):
+        self._seen.add(name)
+        if not self._live:
+            return
+        with self._lock:
+            self._pending[name] = data
+        self.flush()
+
+    def cycle_removed(self, name):
+        pass
+
+    def flush(self):
+        """Publish the pending updates whose interval has passed (called by the poller every tick)."""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for name, data in list(self._pending.items()):
+                complete = (data.get('ai_status') or {}).get('complete')
+                if complete or now - self._sent.get(name, -self.update_interval) >= self.update_interval:
+                    due.append(data)
+                    del self._pending[name]
+                    self._sent[name] = now
+            for name in [n for n, sent in self._sent.items() if now - sent >= self.update_interval]:
+                del self._sent[name]
+        for data in due:
+            engineers, customers = _recipients(data)
+            self.bus.publish('cycle_updated', _summary(data), engineers=engineers, customers=customers)
+
+
+def _summary(data):
+    return {
+        'cycle_number': data.get('cycle_number'),
+        'timestamp': data.get('timestamp'),
+        'total_faults': data.get('total_faults', len(data.get('faults', []))),
+    }
+
+
+def _recipients(data):
+    faults = data.get('faults', [])
+    return ({f.get('assigned_engineer') for f in faults},
+            {str(f.get('customer_id')) for f in faults})
+
+
+class CachePoller:
+    """Background thread refreshing a ``CycleCache`` so new cycles are noticed without requests.
+
+    ``on_ready`` runs once the first refresh has loaded the existing cycles,
+    so only cycles that land after that are announced; ``on_tick`` runs after
+    every refresh.
+    """
+
+    def __init__(self, cache, interval=2.0, on_ready=None, on_tick=None):
+        self.cache = cache
+        self.interval = interval
+        self.on_ready = on_ready
+        self.on_tick = on_tick
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='cycle-poller', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        ready = False
+        while True:
+            try:
+                self.cache.refresh()
+            except Exception as e:
+                print(f"⚠️  Cycle refresh failed: {e}")
+            else:
+                if not ready and self.on_ready is not None:
+                    self.on_ready()
+                ready = True
+            if self.on_tick is not None:
+                self.on_tick()
+            time.sleep(self.interval)
@@ -0,0 +1,114 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def to_radians(lat, lon):
+    """Return (lat_rad, cos(lat_rad), lon_rad) arrays, the reusable half of a haversine."""
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+    return lat_rad, np.cos(lat_rad), lon_rad
+
+
+def haversine_prepared(lat1, cos1, lon1, lat2, cos2, lon2):
+    """Haversine distance in km on ``to_radians`` output; inputs broadcast."""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + cos1 * cos2 * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
+
+
+def haversine_pairs(lat1, lon1, lat2, lon2):
+    """Distance in km between point ``i`` of set 1 and point ``i`` of set 2."""
+    return haversine_prepared(*to_radians(lat1, lon1), *to_radians(lat2, lon2))
+
+
+def unit_vectors(lat, lon):
+    """Points as rows of 3D unit vectors."""
+    lat_rad, cos_lat, lon_rad = to_radians(lat, lon)
+    return np.stack([cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)], axis=1)
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """Distance in km between every point of set 1 (rows) and set 2 (columns).
+
+    Computed from the chord between unit vectors, so the rows x columns work
+    is one matrix product and an arcsin; it agrees with the haversine formula
+    to within a millimetre.
+    """
+    d = unit_vectors(lat1, lon1) @ unit_vectors(lat2, lon2).T
+    # cos(angle) -> sin(angle / 2) = chord / 2, in place
+    np.subtract(1.0, d, out=d)
+    np.maximum(d, 0.0, out=d)
+    np.multiply(d, 0.5, out=d)
+    np.sqrt(d, out=d)
+    np.minimum(d, 1.0, out=d)
+    np.arcsin(d, out=d)
+    d *= 2 * EARTH_RADIUS_KM
+    return d
+
+
+class GridIndex:
+    """Bucket points into fixed-size lat/lon cells for radius queries.
+
+    ``query`` returns every point that could lie within the radius (a superset);
+    callers compute exact distances on the candidates. The index is static:
+    build a new one when the points move.
+    """
+
+    def __init__(self, lat, lon, cell_km=2.0):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_deg = cell_km / KM_PER_DEGREE
+
+        cells = {}
+        rows = np.floor(self.lat / self.cell_deg).astype(np.int64)
+        cols = np.floor(self.lon / self.cell_deg).astype(np.int64)
+        for i, key in enumerate(zip(rows.tolist(), cols.tolist())):
+            cells.setdefault(key, []).append(i)
+        self._cells = {key: np.array(members, dtype=np.int64) for key, members in cells.items()}
+        self._query_cache = {}
+
+    def __len__(self):
+        return len(self.lat)
+
+    def query(self, lat, lon, radius_km):
+        """Return sorted indices of the points that may lie within ``radius_km``.
+
+        The search box is computed for the whole cell containing (lat, lon), so
+        results are cached and shared by every query point in that cell.
+        """
+        row = math.floor(lat / self.cell_deg)
+        col = math.floor(lon / self.cell_deg)
+        key = (row, col, radius_km)
+        found = self._query_cache.get(key)
+        if found is None:
+            found = self._query_cache[key] = self._query_box(row, col, radius_km)
+        return found
+
+    def _query_box(self, row, col, radius_km):
+        lat_lo, lat_hi = row * self.cell_deg, (row + 1) * self.cell_deg
+        dlat = radius_km / KM_PER_DEGREE
+        lat_max = min(90.0, max(abs(lat_lo), abs(lat_hi)) + dlat)
+
+        # Points Δλ apart are at least 2·asin(cos φmax · sin(Δλ/2)) radians apart
+        bound = math.sin(radius_km / (2 * EARTH_RADIUS_KM)) / max(math.cos(math.radians(lat_max)), 1e-12)
+        if bound >= 1:
+            return np.arange(len(self), dtype=np.int64)
+        dlon = math.degrees(2 * math.asin(bound))
+
+        r0 = math.floor((lat_lo - dlat) / self.cell_deg)
+        r1 = math.floor((lat_hi + dlat) / self.cell_deg)
+        c0 = math.floor((col * self.cell_deg - dlon) / self.cell_deg)
+        c1 = math.floor(((col + 1) * self.cell_deg + dlon) / self.cell_deg)
+
+        if (r1 - r0 + 1) * (c1 - c0 + 1) > len(self._cells):
+            found = [m for (r, c), m in self._cells.items() if r0 <= r <= r1 and c0 <= c <= c1]
+        else:
+            found = [self._cells[key] for key in
+                     ((r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)) if key in self._cells]
+
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(found))
@@ -0,0 +1,422 @@
+"""Meter-reading sources and a bounded pipeline into detection.
+
+A source is an iterator of batches; a batch is a ``(customer_ids, outputs)``
+pair of int64/int32 arrays. Replayed and received readings may be
+fractional (rounded to whole units); lines that do not parse, and readings
+that are not finite or do not fit the store, are skipped and counted in
+``monitor_ingest_rejected_total`` when a metrics ``Registry`` is passed. Sources are plain generators, so they compose
+and only read as fast as they are consumed:
+
+    random_source(store, seed)     # synthetic readings for every meter
+    feeder_random_source(store, seed)  # the same, one random stream per feeder
+    csv_replay(path)               # customer_id,output[,...] with a header
+    ndjson_replay(path)            # {"customer_id": .., "output": ..} per line
+    tcp_source(host, port)         # line protocol (CSV or JSON) over TCP
+    udp_source(host, port)         # same, one or more lines per datagram
+
+``ReadingPipeline`` runs a source on a producer thread behind a bounded
+queue. When the queue is full the producer blocks, so a replay stops reading
+its file and a TCP sender is throttled by the socket buffers (UDP datagrams
+are dropped by the kernel instead). File replays yield the same batches for
+the same file and batch size, so they can be used for throughput benchmarks.
+"""
+import itertools
+import json
+import os
+import queue
+import selectors
+import socket
+import threading
+import time
+import warnings
+
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 65536
+MAX_READING = np.iinfo(np.int32).max
+
+
+def make_batch(customer_ids, outputs):
+    return np.asarray(customer_ids, dtype=np.int64), np.asarray(outputs, dtype=np.int32)
+
+
+def _reject(metrics, source, count):
+    if metrics is not None and count:
+        metrics.inc('monitor_ingest_rejected_total', count, source=source)
+
+
+def clean_batch(customer_ids, outputs, metrics=None, source=''):
+    """``make_batch`` for parsed values, dropping readings the store cannot hold.
+
+    Customer ids must be non-negative integers and outputs finite and within
+    int32; outputs are rounded to whole units. Drops are counted in ``metrics``.
+    """
+    ids = np.asarray(customer_ids, dtype=np.float64)
+    values = np.asarray(outputs, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        valid = (np.isfinite(ids) & (ids >= 0) & (ids == np.floor(ids))
+                 & np.isfinite(values) & (np.abs(values) <= MAX_READING))
+    if not valid.all():
+        _reject(metrics, source, int(len(valid) - valid.sum()))
+        ids, values = ids[valid], values[valid]
+    return make_batch(ids, np.rint(values))
+
+
+def random_source(store, seed=None, low=50, high=500):
+    """Endless batches of uniform random readings, one per meter per batch."""
+    rng = np.random.default_rng(seed)
+    while True:
+        yield store.customer_ids, rng.integers(low, high + 1, size=len(store), dtype=np.int32)
+
+
+def feeder_layout(feeder_id):
+    """Rows grouped by feeder: ``(order, feeders, bounds)``.
+
+    ``order`` lists row numbers feeder by feeder (stable, so ascending within
+    a feeder); feeder ``feeders[i]`` owns ``order[bounds[i]:bounds[i + 1]]``.
+    """
+    order = np.argsort(feeder_id, kind='stable')
+    feeders, starts = np.unique(feeder_id[order], return_index=True)
+    return order, feeders, np.append(starts, len(order))
+
+
+def feeder_readings(seed, batch_number, feeder, count, low=50, high=500):
+    """The synthetic readings of one feeder's meters for one batch."""
+    rng = np.random.default_rng([seed, batch_number, int(feeder)])
+    return rng.integers(low, high + 1, size=count, dtype=np.int32)
+
+
+def feeder_random_source(store, seed, low=50, high=500):
+    """Like ``random_source`` but with an independent stream per feeder and batch.
+
+    Any process can regenerate one feeder's share of batch N on its own, so
+    feeder-sharded monitoring (``sharding.py``) reads exactly these batches.
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    order, feeders, bounds = feeder_layout(store.feeder_id)
+    for batch_number in itertools.count(1):
+        outputs = np.empty(len(store), dtype=np.int32)
+        for i, feeder in enumerate(feeders):
+            rows = order[bounds[i]:bounds[i + 1]]
+            outputs[rows] = feeder_readings(seed, batch_number, feeder, len(rows), low, high)
+        yield store.customer_ids, outputs
+
+
+def _csv_columns(header):
+    names = [name.strip() for name in header.split(',')]
+    try:
+        return names.index('customer_id'), names.index('output'), len(names)
+    except ValueError:
+        raise ValueError(f"CSV header needs customer_id and output columns, got {header.strip()!r}")
+
+
+def _number(text):
+    """``float(text)`` or None."""
+    try:
+        return float(text)
+    except (ValueError, TypeError):
+        return None
+
+
+def _parse_csv_lines(lines, id_col, out_col, width, metrics=None):
+    if (width == 2 and (id_col, out_col) == (0, 1)
+            and set(map(str.count, lines, itertools.repeat(','))) == {1}):
+        # Fast path: let numpy parse the whole chunk at once, as integers and
+        # then as floats; any bad field falls back to parsing line by line
+        text = ''.join(lines).replace('\n', ',')
+        for dtype in (np.int64, np.float64):
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', DeprecationWarning)
+                    values = np.fromstring(text, dtype=dtype, sep=',')
+            except ValueError:
+                continue
+            if len(values) == 2 * len(lines):
+                return clean_batch(values[0::2], values[1::2], metrics, 'csv')
+    ids, outputs = [], []
+    for line in lines:
+        fields = line.split(',')
+        if len(fields) != width:
+            _reject(metrics, 'csv', 1)
+            continue
+        customer_id, output = _number(fields[id_col]), _number(fields[out_col])
+        if customer_id is None or output is None:
+            _reject(metrics, 'csv', 1)
+            continue
+        ids.append(customer_id)
+        outputs.append(output)
+    return clean_batch(ids, outputs, metrics, 'csv')
+
+
+def csv_replay(path, batch_size=DEFAULT_BATCH_SIZE, metrics=None):
+    """Replay readings from a CSV file with a ``customer_id,output`` header."""
+    with open(path, 'r', encoding='utf-8') as f:
+        id_col, out_col, width = _csv_columns(f.readline())
+        while True:
+            lines = [line for line in itertools.islice(f, batch_size) if line.strip()]
+            if not lines:
+                return
+            yield _parse_csv_lines(lines, id_col, out_col, width, metrics)
+
+
+def _json_reading(line):
+    """``(customer_id, output)`` of one JSON line, or None."""
+    try:
+        record = json.loads(line)
+        return _number(record['customer_id']), _number(record['output'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def ndjson_replay(path, batch_size=DEFAULT_BATCH_SIZE, metrics=None):
+    """Replay readings from newline-delimited JSON objects."""
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            lines = [line for line in itertools.islice(f, batch_size) if line.strip()]
+            if not lines:
+                return
+            readings = [_json_reading(line) for line in lines]
+            good = [r for r in readings if r is not None and None not in r]
+            _reject(metrics, 'ndjson', len(readings) - len(good))
+            yield clean_batch([r[0] for r in good], [r[1] for r in good], metrics, 'ndjson')
+
+
+def parse_line(line):
+    """Parse one ``id,output`` or JSON reading; return ``(id, output)`` or None."""
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith(b'{' if isinstance(line, bytes) else '{'):
+        reading = _json_reading(line)
+    else:
+        fields = line.split(b',' if isinstance(line, bytes) else ',')
+        reading = (_number(fields[0]), _number(fields[1])) if len(fields) >= 2 else None
+    return reading if reading is not None and None not in reading else None
+
+
+class _LineBatcher:
+    """Collects parsed lines and decides when a batch is due."""
+
+    def __init__(self, batch_size, flush_interval, metrics=None, source=''):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+        self.source = source
+        self.ids = []
+        self.outputs = []
+        self.started = None
+
+    def add(self, lines):
+        for line in lines:
+            reading = parse_line(line)
+            if reading is None:
+                if line.strip():
+                    _reject(self.metrics, self.source, 1)
+            else:
+                if not self.ids:
+                    self.started = time.monotonic()
+                self.ids.append(reading[0])
+                self.outputs.append(reading[1])
+
+    def due(self):
+        return len(self.ids) >= self.batch_size or (
+            self.ids and time.monotonic() - self.started >= self.flush_interval)
+
+    def timeout(self):
+        if not self.ids:
+            return self.flush_interval
+        return max(0.0, self.flush_interval - (time.monotonic() - self.started))
+
+    def take(self):
+        n = self.batch_size
+        batch = clean_batch(self.ids[:n], self.outputs[:n], self.metrics, self.source)
+        self.ids, self.outputs = self.ids[n:], self.outputs[n:]
+        return batch
+
+
+def tcp_source(host='127.0.0.1', port=9009, batch_size=4096, flush_interval=0.5, stop=None, metrics=None):
+    """Listen on ``host:port`` and yield batches of lines sent by any number of clients.
+
+    A batch is yielded once ``batch_size`` readings have arrived or the first
+    of them is ``flush_interval`` seconds old. Nothing is read while the
+    consumer holds a batch, which pushes back on the senders. Runs until
+    ``stop`` (a ``threading.Event``) is set.
+    """
+    server = socket.create_server((host, port))
+    server.setblocking(False)
+    sel = selectors.DefaultSelector()
+    sel.register(server, selectors.EVENT_READ)
+    pending = {}  # connection -> partial line
+    batcher = _LineBatcher(batch_size, flush_interval, metrics, 'tcp')
+
+    try:
+        while stop is None or not stop.is_set():
+            for key, _ in sel.select(timeout=batcher.timeout()):
+                if key.fileobj is server:
+                    conn, _ = server.accept()
+                    conn.setblocking(False)
+                    sel.register(conn, selectors.EVENT_READ)
+                    pending[conn] = b''
+                    continue
+
+                conn = key.fileobj
+                try:
+                    data = conn.recv(65536)
+                except BlockingIOError:
+                    continue
+                except ConnectionError:
+                    data = b''
+                if not data:
+                    batcher.add([pending.pop(conn)])
+                    sel.unregister(conn)
+                    conn.close()
+                    continue
+                *lines, pending[conn] = (pending[conn] + data).split(b'\n')
+                batcher.add(lines)
+
+            while batcher.due():
+                yield batcher.take()
+    finally:
+        for conn in pending:
+            conn.close()
+        sel.close()
+        server.close()
+
+
+def udp_source(host='127.0.0.1', port=9009, batch_size=4096, flush_interval=0.5, stop=None, metrics=None):
+    """Yield batches of readings received as UDP datagrams (one or more lines each)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+    batcher = _LineBatcher(batch_size, flush_interval, metrics, 'udp')
+
+    try:
+        while stop is None or not stop.is_set():
+            sock.settimeout(batcher.timeout() or 0.001)
+            try:
+                data, _ = sock.recvfrom(65536)
+                batcher.add(data.split(b'\n'))
+            except socket.timeout:
+                pass
+            while batcher.due():
+                yield batcher.take()
+    finally:
+        sock.close()
+
+
+def open_source(spec, store, seed=None, batch_size=DEFAULT_BATCH_SIZE, stop=None, metrics=None):
+    """Build a source from a spec string.
+
+    ``random``, ``random-feeders``, ``csv:<path>``, ``ndjson:<path>``,
+    ``tcp:<host>:<port>`` or ``udp:<host>:<port>``; a bare path ending in
+    .csv/.ndjson/.jsonl also works.
+    """
+    kind, _, rest = spec.partition(':')
+    if not rest and os.path.splitext(spec)[1] in ('.csv', '.ndjson', '.jsonl'):
+        kind, rest = ('csv' if spec.endswith('.csv') else 'ndjson'), spec
+
+    if kind == 'random':
+        return random_source(store, seed=seed)
+    if kind == 'random-feeders':
+        return feeder_random_source(store, seed)
+    if kind == 'csv':
+        return csv_replay(rest, batch_size, metrics)
+    if kind in ('ndjson', 'jsonl'):
+        return ndjson_replay(rest, batch_size, metrics)
+    if kind in ('tcp', 'udp'):
+        host, _, port = rest.rpartition(':')
+        source = tcp_source if kind == 'tcp' else udp_source
+        return source(host or '127.0.0.1', int(port), stop=stop, metrics=metrics)
+    raise ValueError(f"unknown ingest source {spec!r}")
+
+
+def write_replay(path, batches):
+    """Write batches to a CSV or NDJSON replay file (chosen by extension)."""
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            f.write('customer_id,output\n')
+            for ids, outputs in batches:
+                f.writelines(f"{i},{o}\n" for i, o in zip(ids.tolist(), outputs.tolist()))
+        else:
+            for ids, outputs in batches:
+                f.writelines(json.dumps({'customer_id': i, 'output': o}) + '\n'
+                             for i, o in zip(ids.tolist(), outputs.tolist()))
+
+
+_END = object()
+
+
+class ReadingPipeline:
+    """Runs a source on a background thread behind a queue of ``max_batches``.
+
+    ``take`` hands the consumer whatever is buffered; iterating the pipeline
+    yields every batch in source order until the source ends. Pass the same
+    ``stop`` event to socket sources so ``close`` can interrupt them.
+    """
+
+    def __init__(self, source, max_batches=8, stop=None):
+        self._source = source
+        self._queue = queue.Queue(maxsize=max_batches)
+        self._stop = stop if stop is not None else threading.Event()
+        self._error = None
+        self.exhausted = False
+        self._thread = threading.Thread(target=self._produce, name='reading-pipeline', daemon=True)
+        self._thread.start()
+
+    def _produce(self):
+        try:
+            for batch in self._source:
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop.is_set():
+                    break
+        except Exception as e:
+            self._error = e
+        finally:
+            while True:
+                try:
+                    self._queue.put(_END, timeout=0.1)
+                    break
+                except queue.Full:
+                    if self._stop.is_set():
+                        break
+
+    def _get(self, timeout):
+        if self.exhausted:
+            return None
+        try:
+            item = self._queue.get(timeout=timeout) if timeout != 0 else self._queue.get_nowait()
+        except queue.Empty:
+            return None
+        if item is _END:
+            self.exhausted = True
+            if self._error is not None:
+                raise self._error
+            return None
+        return item
+
+    def take(self, max_batches=None, timeout=0.0):
+        """Return up to ``max_batches`` buffered batches, waiting ``timeout`` for the first."""
+        batches = []
+        item = self._get(timeout)
+        while item is not None:
+            batches.append(item)
+            if max_batches is not None and len(batches) >= max_batches:
+                break
+            item = self._get(0)
+        return batches
+
+    def __iter__(self):
+        while True:
+            item = self._get(None)
+            if item is None:
+                return
+            yield item
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        self._thread.join(timeout)
@@ -0,0 +1,186 @@
+import numpy as np
+
+
+def change_percentage(delta, old):
+    """``delta`` as a percentage of ``old``; 0.0 where ``old`` is zero, so the result stays valid JSON."""
+    return np.divide(delta * 100.0, old, out=np.zeros(len(delta)), where=old != 0)
+
+
+class EwmaDetector:
+    """Per-meter adaptive anomaly test over exponentially weighted statistics.
+
+    Keeps a float32 mean, a float32 variance and a uint8 reading count per
+    meter (9 bytes), updated in place. A reading is flagged when it is more
+    than ``sensitivity`` standard deviations from the meter's mean; the
+    deviation is floored at ``min_std`` units or ``rel_std`` of the mean so
+    perfectly steady meters are not flagged for noise. Until a meter has
+    ``warmup`` readings the caller's fixed-threshold verdict is used.
+    Flagged readings still update the statistics, so a lasting change of
+    level is learned.
+    """
+
+    def __init__(self, initial_output, alpha=0.1, sensitivity=4.0, warmup=10, min_std=5.0, rel_std=0.02):
+        self.alpha = np.float32(alpha)
+        self.sensitivity = np.float32(sensitivity)
+        self.warmup = warmup
+        self.min_std = np.float32(min_std)
+        self.rel_std = np.float32(rel_std)
+        self.mean = np.array(initial_output, dtype=np.float32)
+        self.var = np.zeros(len(self.mean), dtype=np.float32)
+        self.count = np.zeros(len(self.mean), dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        return self.mean.nbytes + self.var.nbytes + self.count.nbytes
+
+    def score(self, rows, new_output, fallback):
+        """Flag and absorb readings for ``rows`` (None = every meter, in order).
+
+        ``rows`` must not repeat. ``fallback`` is the fixed-threshold mask used
+        for meters still warming up.
+        """
+        index = slice(None) if rows is None else rows
+        mean = self.mean[index]
+        var = self.var[index]
+        count = self.count[index]
+
+        diff = new_output.astype(np.float32) - mean
+        std = np.sqrt(var)
+        np.maximum(std, np.maximum(self.min_std, self.rel_std * np.abs(mean)), out=std)
+        flagged = np.where(count >= self.warmup, np.abs(diff) > self.sensitivity * std, fallback)
+
+        step = self.alpha * diff
+        self.mean[index] = mean + step
+        self.var[index] = (1 - self.alpha) * (var + diff * step)
+        self.count[index] = np.minimum(count, 254) + 1
+        return flagged
+
+
+class MeterStore:
+    """Struct-of-arrays store for the monitored customer population.
+
+    One typed array per field instead of one ``Customer`` object per meter, so a
+    whole population can be scored in a single vectorized pass.
+    """
+
+    def __init__(self, customer_ids, last_output, last_bill, feeder_id, latitude, longitude, names=None):
+        self.customer_ids = np.asarray(customer_ids, dtype=np.int64)
+        self.last_output = np.asarray(last_output, dtype=np.int32)
+        self.last_bill = np.asarray(last_bill, dtype=np.int32)
+        self.feeder_id = np.asarray(feeder_id, dtype=np.int16)
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.names = names  # None means names are derived from the customer id
+        self.detector = None  # EwmaDetector for adaptive scoring; None = fixed threshold only
+        self._order = None  # argsort of customer_ids, built on first rows_for()
+        self._sorted_ids = None
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+    @classmethod
+    def from_customers(cls, customers):
+        """Build a store from a list of ``Customer`` objects."""
+        return cls(
+            customer_ids=[c.customer_id for c in customers],
+            last_output=[c.last_output for c in customers],
+            last_bill=[c.last_bill for c in customers],
+            feeder_id=[c.feeder_id for c in customers],
+            latitude=[c.latitude for c in customers],
+            longitude=[c.longitude for c in customers],
+            names=[c.name for c in customers],
+        )
+
+    @classmethod
+    def generate(cls, count, num_feeders, center=(23.8103, 91.2514), spread=0.05, seed=None):
+        """Generate a random population directly into arrays (no per-meter objects)."""
+        rng = np.random.default_rng(seed)
+        return cls(
+            customer_ids=np.arange(1, count + 1, dtype=np.int64),
+            last_output=rng.integers(50, 501, size=count, dtype=np.int32),
+            last_bill=rng.integers(500, 10001, size=count, dtype=np.int32),
+            feeder_id=rng.integers(0, num_feeders, size=count, dtype=np.int16),
+            latitude=center[0] + rng.uniform(-spread, spread, size=count),
+            longitude=center[1] + rng.uniform(-spread, spread, size=count),
+        )
+
+    def name_of(self, row):
+        """Return the display name of the meter at ``row``."""
+        if self.names is not None:
+            return self.names[row]
+        return f"Customer_{int(self.customer_ids[row]) - 1}"
+
+    def _flag(self, rows, new_output, delta, threshold):
+        flagged = np.abs(delta) > threshold
+        if self.detector is not None:
+            flagged = self.detector.score(rows, new_output, flagged)
+        return flagged
+
+    def detect(self, new_output, threshold):
+        """Score a full set of new readings against the stored outputs.
+
+        Readings that moved by more than ``threshold`` are flagged, or, with
+        a ``detector``, the readings it finds anomalous. Returns ``(rows,
+        old, new, change_percentage)`` for the flagged meters only, and
+        stores the new readings as the last output of every meter.
+        """
+        new_output = np.asarray(new_output, dtype=np.int32)
+        old_output = self.last_output
+
+        delta = new_output - old_output
+        rows = np.flatnonzero(self._flag(None, new_output, delta, threshold))
+
+        old = old_output[rows]
+        new = new_output[rows]
+        change = change_percentage(delta[rows], old)
+
+        np.copyto(self.last_output, new_output)
+        return rows, old, new, change
+
+    def rows_for(self, customer_ids):
+        """Map customer ids to row numbers; unknown ids map to -1."""
+        if self._order is None:
+            self._order = np.argsort(self.customer_ids, kind='stable')
+            self._sorted_ids = self.customer_ids[self._order]
+
+        customer_ids = np.asarray(customer_ids, dtype=np.int64)
+        if not len(self):
+            return np.full(len(customer_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, customer_ids), len(self) - 1)
+        return np.where(self._sorted_ids[pos] == customer_ids, self._order[pos], -1)
+
+    def detect_rows(self, rows, new_output, threshold):
+        """Like ``detect`` for readings of some meters only.
+
+        A meter may appear more than once in ``rows``; its readings are scored
+        in order, each against the one before it. Flagged readings are
+        returned in input order.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        new_output = np.asarray(new_output, dtype=np.int32)
+        position = np.arange(len(rows))
+        found = []
+
+        while len(rows):
+            # First remaining reading of every meter
+            _, first = np.unique(rows, return_index=True)
+            batch_rows = rows[first]
+            batch_new = new_output[first]
+
+            old = self.last_output[batch_rows]
+            delta = batch_new - old
+            hit = np.flatnonzero(self._flag(batch_rows, batch_new, delta, threshold))
+            found.append((position[first[hit]], batch_rows[hit], old[hit], batch_new[hit],
+                          change_percentage(delta[hit], old[hit])))
+            self.last_output[batch_rows] = batch_new
+
+            rest = np.ones(len(rows), dtype=bool)
+            rest[first] = False
+            rows, new_output, position = rows[rest], new_output[rest], position[rest]
+
+        if not found:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32),
+                    np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64))
+
+        order = np.argsort(np.concatenate([f[0] for f in found]), kind='stable')
+        return tuple(np.concatenate([f[i] for f in found])[order] for i in range(1, 5))
@@ -0,0 +1,112 @@
+"""In-process counters, gauges and histograms in the Prometheus text format.
+
+A ``Registry`` holds metrics by name and label values. Observing a
+histogram is one ``bisect`` and two additions under a lock, so stages and
+routes can be timed on every call. ``render()`` produces the text
+exposition format; ``write(path)`` replaces a file with it atomically, which
+is how the monitor (a separate process) hands its metrics to the app's
+``/metrics`` endpoint.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for k, v in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._types = {}  # name -> (type, help)
+        self._values = {}  # (name, labels) -> number, or [bucket counts, sum] for histograms
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help_text=''):
+        """Declare ``name`` as a 'counter', 'gauge' or 'histogram'."""
+        self._types[name] = (kind, help_text)
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][slot] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Observe the wall time of the ``with`` block in histogram ``name``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, list(v[0]) + [v[1]] if isinstance(v, list) else v)
+                            for key, v in self._values.items())
+        lines = []
+        described = set()
+        for (name, labels), value in values:
+            if name in self._types:
+                kind, help_text = self._types[name]
+            else:
+                kind = 'histogram' if isinstance(value, list) else 'counter' if name.endswith('_total') else 'gauge'
+                help_text = ''
+            if name not in described:
+                described.add(name)
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            if not isinstance(value, list):
+                lines.append(f"{name}{_label_text(labels)} {_number(value)}")
+                continue
+            counts, total = value[:-1], value[-1]
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                running += count
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', _number(bound)),))} {running}")
+            lines.append(f"{name}_sum{_label_text(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_label_text(labels)} {running}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def write(self, path):
+        """Atomically replace ``path`` with the rendered metrics."""
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temp, path)
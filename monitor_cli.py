@@ -0,0 +1,69 @@
+"""Command-line entry point of the monitor.
+
+Options override the module settings of ``customer`` before the first
+cycle; anything not given keeps the value configured there. ``customer`` is
+imported only after the arguments are parsed, so ``--help`` is instant and
+spawned shard workers (which re-import this module as ``__mp_main__``) do
+not load the monitor at all.
+
+    python monitor_cli.py --customers 100000 --threshold 120 --interval 60 --engine grid
+    python monitor_cli.py --backfill 720 --start '2024-01-01 00:00:00'
+"""
+import argparse
+from datetime import datetime
+
+ENGINES = ('loop', 'matrix', 'grid', 'optimal')
+
+# Option name -> customer setting(s) it overrides
+SETTINGS = {
+    'customers': 'NUM_CUSTOMERS',
+    'threshold': 'THRESHOLD',
+    'interval': 'INTERVAL',
+    'engine': 'ASSIGNMENT_ENGINE',
+    'detector': 'DETECTOR',
+    'shard_workers': 'SHARD_WORKERS',
+    'seed': ('POPULATION_SEED', 'INGEST_SEED'),
+    'ingest': 'INGEST_SOURCE',
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Smart customer output monitoring.")
+    parser.add_argument('--customers', type=int, metavar='N', help="size of the generated customer population")
+    parser.add_argument('--threshold', type=int, help="output change (units) that counts as a fault")
+    parser.add_argument('--interval', type=int, metavar='SECONDS', help="seconds between cycle boundaries")
+    parser.add_argument('--engine', choices=ENGINES, help="fallback engineer assignment engine")
+    parser.add_argument('--detector', choices=('threshold', 'ewma'), help="batched fault detector")
+    parser.add_argument('--shard-workers', type=int, metavar='N', help="detect in N feeder-shard processes")
+    parser.add_argument('--seed', type=int, help="seed for the generated customer population and random readings")
+    parser.add_argument('--ingest', metavar='SOURCE', help="reading source, e.g. 'random' or 'csv:<path>'")
+    parser.add_argument('--policy', choices=('skip', 'catchup'),
+                        help="what to do with boundaries missed by an overrunning cycle")
+    parser.add_argument('--backfill', type=int, metavar='N',
+                        help="run N cycles back-to-back on simulated boundaries, then exit")
+    parser.add_argument('--start', help="first simulated boundary for --backfill, 'YYYY-MM-DD HH:MM:SS'")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    start = None
+    if args.start:
+        try:
+            start = datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S").timestamp()
+        except ValueError:
+            parser.error(f"--start must be 'YYYY-MM-DD HH:MM:SS', got {args.start!r}")
+
+    import customer
+
+    for option, settings in SETTINGS.items():
+        value = getattr(args, option)
+        if value is not None:
+            for setting in (settings if isinstance(settings, tuple) else (settings,)):
+                setattr(customer, setting, value)
+    customer.run_monitor(args.policy, args.backfill, start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Per-feeder and per-engineer fault rollups by minute, hour and day.
+
+``RollupStore.record(cycle)`` folds one cycle into every resolution with a
+handful of upserts, so the rollups are maintained as cycles are logged and
+never rebuilt from the cycle files. Rows live in a SQLite ``WITHOUT ROWID``
+table clustered on ``(kind, name, resolution, bucket)``: one entity's trend
+over any range is a single index range scan. Each row keeps counts, the sum
+and the max of ``|change_percentage|``, so means merge exactly.
+
+Buckets are epoch seconds of the monitor's local wall clock (cycle
+timestamps carry no zone), so day buckets start at local midnight. Minute
+and hour rows are pruned after ``RETENTION`` seconds; day rows are kept.
+
+Backfill from an existing segment store and its daily archives:
+
+    python rollups.py --segments cycle_segments --archive cycle_archive --db rollups.db
+"""
+import argparse
+import calendar
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from archive import ArchiveReader
+from cycle_segments import SegmentReader
+
+RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}
+RETENTION = {'minute': 14 * 86400, 'hour': 400 * 86400, 'day': None}
+KINDS = {'all': 0, 'feeder': 1, 'engineer': 2}
+DEFAULT_WINDOW = {'minute': 6 * 3600, 'hour': 7 * 86400, 'day': 365 * 86400}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    kind INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    cycles INTEGER NOT NULL,
+    faults INTEGER NOT NULL,
+    change_sum REAL NOT NULL,
+    change_max REAL NOT NULL,
+    PRIMARY KEY (kind, name, resolution, bucket)
+) WITHOUT ROWID;
+"""
+
+UPSERT = """
+INSERT INTO rollups (kind, name, resolution, bucket, cycles, faults, change_sum, change_max)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (kind, name, resolution, bucket) DO UPDATE SET
+    cycles = cycles + excluded.cycles,
+    faults = faults + excluded.faults,
+    change_sum = change_sum + excluded.change_sum,
+    change_max = MAX(change_max, excluded.change_max)
+"""
+
+
+def wall_seconds(timestamp):
+    """Epoch seconds for a ``%Y-%m-%d %H:%M:%S`` wall-clock timestamp."""
+    return calendar.timegm(datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timetuple())
+
+
+def cycle_totals(cycle):
+    """``{(kind, name): [faults, change_sum, change_max]}`` for one cycle."""
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    totals[(KINDS['all'], '')]  # every cycle counts, with or without faults
+    for fault in cycle.get('faults', []):
+        change = abs(fault.get('change_percentage') or 0.0)
+        for key in ((KINDS['all'], ''),
+                    (KINDS['feeder'], fault.get('feeder_name') or ''),
+                    (KINDS['engineer'], fault.get('assigned_engineer') or '')):
+            entry = totals[key]
+            entry[0] += 1
+            entry[1] += change
+            entry[2] = max(entry[2], change)
+    return totals
+
+
+class RollupStore:
+    def __init__(self, path='rollups.db'):
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = None
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        """This thread's connection, reopened after a fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def record(self, cycle):
+        """Fold one logged cycle into every resolution."""
+        now = wall_seconds(cycle['timestamp'])
+        rows = []
+        for (kind, name), (faults, change_sum, change_max) in cycle_totals(cycle).items():
+            for width in RESOLUTIONS.values():
+                rows.append((kind, name, width, now - now % width, 1, faults, change_sum, change_max))
+
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(UPSERT, rows)
+            if self._last_prune is None or now - self._last_prune >= 3600:
+                self._prune(conn, now)
+                self._last_prune = now
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _prune(self, conn, now):
+        for resolution, keep in RETENTION.items():
+            if keep is not None:
+                conn.execute("DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                             (RESOLUTIONS[resolution], now - keep))
+
+    def names(self, kind):
+        """Entities with rollups of ``kind`` ('feeder' or 'engineer')."""
+        rows = self.connection().execute(
+            "SELECT DISTINCT name FROM rollups WHERE kind = ? AND resolution = ?",
+            (KINDS[kind], RESOLUTIONS['day']))
+        return sorted(name for (name,) in rows)
+
+    def series(self, resolution, kind='all', names=None, start=None, end=None):
+        """Columnar series per entity for buckets in ``[start, end)``.
+
+        Returns ``{name: {'bucket': [...], 'cycles': [...], 'faults': [...],
+        'mean_change': [...], 'max_change': [...]}}``; empty buckets are omitted.
+        """
+        width = RESOLUTIONS[resolution]
+        if names is None:
+            names = [''] if kind == 'all' else self.names(kind)
+        end = end if end is not None else 2 ** 62
+        start = start if start is not None else 0
+
+        conn = self.connection()
+        result = {}
+        for name in names:
+            columns = {'bucket': [], 'cycles': [], 'faults': [], 'mean_change': [], 'max_change': []}
+            for bucket, cycles, faults, change_sum, change_max in conn.execute(
+                    "SELECT bucket, cycles, faults, change_sum, change_max FROM rollups "
+                    "WHERE kind = ? AND name = ? AND resolution = ? AND bucket >= ? AND bucket < ? "
+                    "ORDER BY bucket", (KINDS[kind], name, width, start, end)):
+                columns['bucket'].append(bucket)
+                columns['cycles'].append(cycles)
+                columns['faults'].append(faults)
+                columns['mean_change'].append(round(change_sum / faults, 2) if faults else None)
+                columns['max_change'].append(round(change_max, 2) if faults else None)
+            result[name or 'all'] = columns
+        return result
+
+    def last_bucket(self):
+        """Start of the newest minute bucket, or None when nothing is recorded."""
+        row = self.connection().execute(
+            "SELECT MAX(bucket) FROM rollups WHERE kind = ? AND name = '' AND resolution = ?",
+            (KINDS['all'], RESOLUTIONS['minute'])).fetchone()
+        return row[0]
+
+    def clear(self):
+        self.connection().execute("DELETE FROM rollups")
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def backfill(store, segment_dir, archive_dir=None):
+    """Rebuild ``store`` from every cycle in a segment directory and the archives; return the cycle count.
+
+    Cycles moved into the daily archives are read from there, so rebuilding
+    does not lose the days already compacted out of the segments. A cycle
+    found in both (mid-compaction) is counted once.
+    """
+    readers = [SegmentReader(segment_dir)]
+    if archive_dir:
+        readers.append(ArchiveReader(archive_dir))
+    keys = sorted(((written_ns, index, key) for index, reader in enumerate(readers)
+                   for key, (written_ns, _) in reader.scan().items()),
+                  key=lambda item: item[:2])
+    store.clear()
+    seen = set()
+    for _, index, key in keys:
+        cycle = readers[index].load(key)
+        if cycle is None or not cycle.get('timestamp'):
+            continue
+        identity = (cycle.get('cycle_number'), cycle['timestamp'])
+        if identity not in seen:
+            seen.add(identity)
+            store.record(cycle)
+    return len(seen)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild fault rollups from the cycle segment store and archives.")
+    parser.add_argument('--segments', default='cycle_segments')
+    parser.add_argument('--archive', default='cycle_archive')
+    parser.add_argument('--db', default='rollups.db')
+    args = parser.parse_args(argv)
+
+    store = RollupStore(args.db)
+    count = backfill(store, args.segments, args.archive)
+    print(f"📈 Rolled up {count} cycles into {args.db}")
+
+
+if __name__ == '__main__':
+    main()
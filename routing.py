@@ -0,0 +1,205 @@
+"""Visit order for each engineer's faults, planned locally.
+
+Every route starts at the engineer's current location and ends at the last
+fault (engineers do not return to base). ``plan_route`` builds the full
+distance matrix once. Routes of up to ``EXACT_ROUTE_STOPS`` faults are
+solved exactly (Held-Karp dynamic programming over subsets of stops).
+Longer ones take the nearest unvisited fault at every step and then apply
+2-opt moves (reversing a stretch of the route) while any of them shortens
+it; that is a local optimum, typically within a few percent of the best
+route. Each 2-opt pass scores all moves starting at one position in a single
+vectorized step, so a few hundred stops plan in milliseconds. Routes longer
+than ``MAX_2OPT_STOPS`` (large cycles, where a matrix would not fit in
+memory) are only walked nearest-neighbour over a ``GridIndex``: no distance
+matrix and no 2-opt, memory linear in the number of stops. Beyond
+``MAX_WALK_STOPS`` even the walk's per-stop Python step is too slow, and
+stops are swept in serpentine strips instead (a sort, no search).
+
+``plan_routes`` emits the ``optimized_routes`` structure of the AI
+analysis, so the dashboards show local routes the same way.
+"""
+from collections import defaultdict
+
+import math
+
+import numpy as np
+
+from geo import KM_PER_DEGREE, GridIndex, haversine_matrix, haversine_pairs, haversine_prepared, to_radians
+
+ROUTE_SPEED_KMH = 25.0  # Average travel speed between faults
+ROUTE_SERVICE_MINUTES = 15.0  # Time spent at each fault
+MAX_2OPT_PASSES = 100
+EXACT_ROUTE_STOPS = 8  # Routes up to this many faults are solved exactly (2^n * n^2 work)
+MAX_2OPT_STOPS = 500  # Longer routes get a grid nearest-neighbour walk only (no n x n matrix)
+MAX_WALK_STOPS = 5000  # Longer routes are swept in serpentine strips
+
+
+def nearest_neighbour(distance):
+    """Greedy order of points 1..n-1 from point 0, as an index array starting with 0."""
+    n = len(distance)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    path = np.empty(n, dtype=np.intp)
+    path[0] = current = 0
+    for k in range(1, n):
+        row = np.where(visited, np.inf, distance[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        path[k] = current
+    return path
+
+
+def _cell_km(lat, lon, per_cell):
+    """Side of a square cell holding about ``per_cell`` points over the area the points span."""
+    height = (lat.max() - lat.min()) * KM_PER_DEGREE
+    width = (lon.max() - lon.min()) * KM_PER_DEGREE * math.cos(math.radians(float(np.abs(lat).max())))
+    return max(math.sqrt(per_cell * max(height, 0.01) * max(width, 0.01) / len(lat)), 0.01)
+
+
+def strip_sweep(lat, lon):
+    """Order of points 1..n-1 after point 0: east-west strips, alternating direction, south to north."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    strip = np.floor((lat[1:] - lat[1:].min()) * KM_PER_DEGREE / _cell_km(lat[1:], lon[1:], 2)).astype(np.int64)
+    along = np.where(strip % 2 == 0, lon[1:], -lon[1:])
+    return np.concatenate([[0], np.lexsort((along, strip)) + 1])
+
+
+def grid_nearest_neighbour(lat, lon):
+    """Greedy order of points 1..n-1 from point 0 without a distance matrix.
+
+    Each step searches a ``GridIndex`` around the current point, doubling the
+    radius until the nearest unvisited point lies within it, so it picks the
+    same point as ``nearest_neighbour`` (up to ties).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n = len(lat)
+    cell_km = _cell_km(lat, lon, 4)
+    index = GridIndex(lat, lon, cell_km=cell_km)
+    lat_rad, cos_lat, lon_rad = to_radians(lat, lon)
+
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[0] = False
+    path = np.empty(n, dtype=np.intp)
+    path[0] = current = 0
+    for k in range(1, n):
+        radius = cell_km
+        while True:
+            candidates = index.query(lat[current], lon[current], radius)
+            candidates = candidates[unvisited[candidates]]
+            if len(candidates):
+                distance = haversine_prepared(lat_rad[current], cos_lat[current], lon_rad[current],
+                                              lat_rad[candidates], cos_lat[candidates], lon_rad[candidates])
+                best = int(np.argmin(distance))
+                if distance[best] <= radius or len(candidates) == n - k:
+                    break
+            radius *= 2
+        current = int(candidates[best])
+        unvisited[current] = False
+        path[k] = current
+    return path
+
+
+def held_karp(distance):
+    """Shortest open path from point 0 through all others, as an index array starting with 0."""
+    m = len(distance) - 1
+    if m < 2:
+        return np.arange(m + 1)
+    bits = 1 << np.arange(m)
+    stops = distance[1:, 1:]
+    # best[mask, j]: shortest path from 0 through the stops in mask, ending at j
+    best = np.full((1 << m, m), np.inf)
+    best[bits, np.arange(m)] = distance[0, 1:]
+    previous = np.zeros((1 << m, m), dtype=np.intp)
+    masks = np.arange(1 << m)
+    size = ((masks[:, None] & bits) > 0).sum(axis=1)
+    for count in range(2, m + 1):
+        # Every subset of this size at once: best[mask without j, k] + stops[k, j] over k
+        layer = masks[size == count]
+        total = best[layer[:, None] ^ bits] + stops.T
+        k = np.argmin(total, axis=2)
+        cost = np.take_along_axis(total, k[:, :, None], axis=2)[:, :, 0]
+        inside = (layer[:, None] & bits) > 0
+        best[layer] = np.where(inside, cost, np.inf)
+        previous[layer] = k
+
+    mask = (1 << m) - 1
+    last = int(np.argmin(best[mask]))
+    order = []
+    while mask:
+        order.append(last)
+        mask, last = mask ^ (1 << last), int(previous[mask, last])
+    return np.array([0] + [j + 1 for j in reversed(order)], dtype=np.intp)
+
+
+def two_opt(distance, path, max_passes=MAX_2OPT_PASSES):
+    """Improve an open ``path`` in place; ``path[0]`` stays first, the end is free."""
+    n = len(path)
+    if n < 3:
+        return path
+    # A zero-distance sentinel after the last stop turns the open path into the
+    # fixed-end case, so reversing the tail costs nothing at the far end
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = distance
+    path = np.append(path, n)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = path[i - 1], path[i]
+            c, d = path[i + 1:n], path[i + 2:n + 1]
+            delta = padded[a, c] + padded[b, d] - padded[a, b] - padded[c, d]
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-9:
+                j = i + 1 + k
+                path[i:j + 1] = path[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return path[:n]
+
+
+def route_length(distance, path):
+    return float(distance[path[:-1], path[1:]].sum())
+
+
+def plan_route(start_lat, start_lon, stop_lat, stop_lon, max_passes=MAX_2OPT_PASSES):
+    """Return ``(order, km)``: stop indices in visiting order and the route length from the start."""
+    lat = np.concatenate([[start_lat], np.asarray(stop_lat, dtype=np.float64)])
+    lon = np.concatenate([[start_lon], np.asarray(stop_lon, dtype=np.float64)])
+    if len(lat) - 1 > MAX_2OPT_STOPS:
+        path = strip_sweep(lat, lon) if len(lat) - 1 > MAX_WALK_STOPS else grid_nearest_neighbour(lat, lon)
+        return path[1:] - 1, float(haversine_pairs(lat[path[:-1]], lon[path[:-1]],
+                                                   lat[path[1:]], lon[path[1:]]).sum())
+    distance = haversine_matrix(lat, lon, lat, lon)
+    if len(distance) - 1 <= EXACT_ROUTE_STOPS:
+        path = held_karp(distance)
+    else:
+        path = two_opt(distance, nearest_neighbour(distance), max_passes)
+    return path[1:] - 1, route_length(distance, path)
+
+
+def plan_routes(assignments, locations, speed_kmh=ROUTE_SPEED_KMH, service_minutes=ROUTE_SERVICE_MINUTES):
+    """``optimized_routes`` entries for every engineer with assigned faults.
+
+    ``locations`` maps engineer names to their current ``(lat, lon)``; an
+    engineer without one starts at their first assigned fault.
+    """
+    stops = defaultdict(list)
+    for assignment in assignments:
+        stops[assignment['assigned_engineer']].append(assignment)
+
+    routes = []
+    for engineer, faults in stops.items():
+        start_lat, start_lon = locations.get(engineer, (faults[0]['latitude'], faults[0]['longitude']))
+        order, km = plan_route(start_lat, start_lon,
+                               [f['latitude'] for f in faults], [f['longitude'] for f in faults])
+        hours = km / speed_kmh + len(faults) * service_minutes / 60
+        routes.append({
+            'engineer': engineer,
+            'route_sequence': [faults[i]['customer_id'] for i in order.tolist()],
+            'total_distance': f"{km:.1f} km",
+            'estimated_time': f"{hours:.1f} hours",
+            'planner': 'local',
+        })
+    return routes
@@ -0,0 +1,105 @@
+"""Monitoring cycles on fixed wall-clock boundaries.
+
+``CycleScheduler.run`` starts cycle ``k`` at the ``k``-th multiple of
+``interval`` (epoch-aligned, so a 120 s interval fires on even minutes)
+instead of sleeping ``interval`` after each cycle, so a slow cycle never
+pushes the ones after it later. A cycle that is still running when its
+successor is due is an overrun. With ``policy='skip'`` the missed
+boundaries are dropped and the next cycle waits for the next boundary;
+with ``policy='catchup'`` the missed cycles run back-to-back until the
+schedule is met again (at most ``max_catchup`` of them, the rest skipped).
+
+Every cycle receives a tick dict: ``cycle_number``, ``scheduled_at`` and
+``started_at`` (epoch seconds), ``lag`` (how late it started), and
+``simulated``. ``backfill`` runs cycles back-to-back without sleeping,
+with ``scheduled_at`` walking forward one interval per cycle, for load
+tests and replays.
+"""
+import math
+import time
+from datetime import datetime
+
+POLICIES = ('skip', 'catchup')
+
+
+class CycleScheduler:
+    def __init__(self, interval, policy='skip', max_catchup=10, clock=time.time, sleep=time.sleep):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown schedule policy {policy!r}; expected one of {POLICIES}")
+        self.interval = interval
+        self.policy = policy
+        self.max_catchup = max_catchup
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = {'cycles': 0, 'overruns': 0, 'skipped': 0, 'last_lag': 0.0, 'max_lag': 0.0,
+                      'last_duration': 0.0, 'next_at': None}
+
+    def next_boundary(self, now):
+        """First boundary strictly after ``now``."""
+        return (math.floor(now / self.interval) + 1) * self.interval
+
+    def _tick(self, cycle_number, scheduled_at, started_at, simulated=False):
+        lag = max(0.0, started_at - scheduled_at)
+        self.stats['last_lag'] = lag
+        self.stats['max_lag'] = max(self.stats['max_lag'], lag)
+        return {'cycle_number': cycle_number, 'scheduled_at': scheduled_at, 'started_at': started_at,
+                'lag': lag, 'simulated': simulated}
+
+    def run(self, run_cycle, start_cycle=1, cycles=None, stop=None):
+        """Call ``run_cycle(tick)`` on every boundary; ``cycles=None`` runs until ``stop`` is set."""
+        cycle_number = start_cycle
+        due = self.next_boundary(self.clock())
+        done = 0
+        while (cycles is None or done < cycles) and not (stop is not None and stop.is_set()):
+            self.stats['next_at'] = due
+            wait = due - self.clock()
+            if wait > 0:
+                if stop is not None:
+                    if stop.wait(wait):
+                        break
+                else:
+                    self.sleep(wait)
+
+            started = self.clock()
+            run_cycle(self._tick(cycle_number, due, started))
+            finished = self.clock()
+            self.stats['cycles'] += 1
+            self.stats['last_duration'] = finished - started
+            cycle_number += 1
+            done += 1
+
+            due += self.interval
+            if finished > due:
+                if started < due:  # ran into the next slot, as opposed to starting late while catching up
+                    self._overrun(cycle_number - 1, due, finished)
+                behind = math.floor((finished - due) / self.interval) + 1
+                keep = min(behind, self.max_catchup) if self.policy == 'catchup' else 0
+                self.stats['skipped'] += behind - keep
+                due += (behind - keep) * self.interval
+            if cycles is None or done < cycles:
+                print(f"\n⏳ Next cycle at: {datetime.fromtimestamp(due).strftime('%Y-%m-%d %H:%M:%S')} "
+                      f"(lag {self.stats['last_lag']:.1f}s, {self.stats['overruns']} overruns, "
+                      f"{self.stats['skipped']} skipped)")
+        return self.stats
+
+    def _overrun(self, cycle_number, due, finished):
+        self.stats['overruns'] += 1
+        print(f"\n⚠️  Cycle {cycle_number} overran its slot by {finished - due:.1f}s ({self.policy})")
+
+    def backfill(self, run_cycle, cycles, start=None, start_cycle=1):
+        """Run ``cycles`` cycles back-to-back on simulated boundaries.
+
+        ``start`` defaults to ``cycles`` intervals before the next boundary,
+        so the replayed history ends at the present. Returns the stats with
+        the wall time and rate added.
+        """
+        if start is None:
+            start = self.next_boundary(self.clock()) - cycles * self.interval
+        began = self.clock()
+        for i in range(cycles):
+            scheduled = start + i * self.interval
+            run_cycle(self._tick(start_cycle + i, scheduled, scheduled, simulated=True))
+            self.stats['cycles'] += 1
+        elapsed = self.clock() - began
+        self.stats['last_duration'] = elapsed / cycles if cycles else 0.0
+        return dict(self.stats, elapsed=elapsed, cycles_per_second=cycles / elapsed if elapsed else None)
@@ -0,0 +1,177 @@
+"""Feeder-sharded batched monitoring across worker processes.
+
+The coordinator lays the meters out feeder by feeder in shared memory and
+gives each worker a contiguous range of whole feeders. A worker keeps its
+slice of ``last_output`` (and of the EWMA state, if any) in place, draws its
+feeders' readings from ``ingest.feeder_readings`` and runs the ordinary
+``MeterStore.detect`` on its slice. Only the flagged positions and their
+old and new outputs (12 bytes per fault) go back through a pipe.
+
+Batch N of ``ingest.feeder_random_source(store, seed)`` produces the same
+readings, so single-process monitoring on that source flags the same faults
+in the same (row) order as a sharded run with the same seed.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ingest import feeder_layout, feeder_readings
+from meter_store import EwmaDetector, MeterStore, change_percentage
+
+
+def _shared(array):
+    """Copy ``array`` into a new shared memory block; return ``(block, view)``."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[...] = array
+    return block, view
+
+
+def _attach(name, dtype, length):
+    # Spawned workers share the coordinator's resource tracker, which unlinks
+    # the blocks even if the coordinator dies without closing the monitor
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray((length,), dtype=dtype, buffer=block.buf)
+
+
+def _worker(conn, arrays, length, start, end, feeders, seed, detector):
+    blocks = []
+    views = {}
+    for key, (name, dtype) in arrays.items():
+        block, view = _attach(name, dtype, length)
+        blocks.append(block)
+        views[key] = view[start:end]
+
+    count = end - start
+    unused = np.broadcast_to(np.int32(0), count)  # columns detection never reads
+    store = MeterStore(views['customer_ids'], views['last_output'], unused, views['feeder_id'], unused, unused)
+    if detector is not None:
+        store.detector = EwmaDetector(np.empty(0), **detector)
+        store.detector.mean, store.detector.var, store.detector.count = views['mean'], views['var'], views['count']
+    outputs = np.empty(count, dtype=np.int32)
+
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            batch_number, threshold = message
+            for feeder, lo, hi in feeders:
+                outputs[lo - start:hi - start] = feeder_readings(seed, batch_number, feeder, hi - lo)
+            rows, old, new, _ = store.detect(outputs, threshold)
+            conn.send((rows.astype(np.int32), old, new))
+    finally:
+        del store, views, view
+        for block in blocks:
+            block.close()
+        conn.close()
+
+
+class ShardedMonitor:
+    """Pool of ``workers`` processes, each detecting on a range of feeders.
+
+    ``run(threshold)`` scores the next synthetic batch on every shard and
+    returns ``(rows, old, new, change_percentage)`` like ``MeterStore.detect``.
+    While the monitor is open the shards own ``last_output`` and the EWMA
+    state; ``close`` copies them back into ``store``.
+    """
+
+    def __init__(self, store, workers, seed=None):
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.store = store
+        self.batch_number = 0
+        order, feeders, bounds = feeder_layout(store.feeder_id)
+        self._order = order
+
+        columns = {
+            'customer_ids': store.customer_ids[order],
+            'last_output': store.last_output[order],
+            'feeder_id': store.feeder_id[order],
+        }
+        detector = None
+        if store.detector is not None:
+            d = store.detector
+            columns.update(mean=d.mean[order], var=d.var[order], count=d.count[order])
+            detector = {'alpha': float(d.alpha), 'sensitivity': float(d.sensitivity), 'warmup': d.warmup,
+                        'min_std': float(d.min_std), 'rel_std': float(d.rel_std)}
+
+        self._blocks = {}
+        self._views = {}
+        for key, array in columns.items():
+            self._blocks[key], self._views[key] = _shared(array)
+        arrays = {key: (block.name, columns[key].dtype.str) for key, block in self._blocks.items()}
+
+        # Whole feeders per worker, cut where the running meter count passes an even share
+        workers = max(1, min(workers, len(feeders)))
+        groups, group = [], []
+        for i in range(len(feeders)):
+            group.append(i)
+            left = len(feeders) - i - 1
+            due = bounds[i + 1] >= (len(groups) + 1) * len(order) / workers
+            if left and len(groups) < workers - 1 and (due or left == workers - len(groups) - 1):
+                groups.append(group)
+                group = []
+        groups.append(group)
+
+        context = multiprocessing.get_context('spawn')
+        self._conns = []
+        self._processes = []
+        self._starts = []
+        for group in groups:
+            parent, child = context.Pipe()
+            shard = [(int(feeders[i]), int(bounds[i]), int(bounds[i + 1])) for i in group]
+            process = context.Process(
+                target=_worker, name=f"shard-{shard[0][0]}",
+                args=(child, arrays, len(order), shard[0][1], shard[-1][2], shard, seed, detector),
+                daemon=True)
+            process.start()
+            child.close()
+            self._conns.append(parent)
+            self._processes.append(process)
+            self._starts.append(shard[0][1])
+
+    @property
+    def workers(self):
+        return len(self._processes)
+
+    def run(self, threshold):
+        self.batch_number += 1
+        for conn in self._conns:
+            conn.send((self.batch_number, threshold))
+        parts = []
+        for conn, start in zip(self._conns, self._starts):
+            local, old, new = conn.recv()
+            parts.append((self._order[start + local.astype(np.int64)], old, new))
+        rows, old, new = (np.concatenate(column) for column in zip(*parts))
+        ordered = np.argsort(rows, kind='stable')
+        rows, old, new = rows[ordered], old[ordered], new[ordered]
+        return rows, old, new, change_percentage(new - old, old)
+
+    def close(self):
+        if not self._processes:
+            return
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass  # The worker is already gone; its slice is still in shared memory
+        for process in self._processes:
+            process.join()
+        for conn in self._conns:
+            conn.close()
+        self._processes, self._conns = [], []
+
+        self.store.last_output[self._order] = self._views['last_output']
+        if self.store.detector is not None:
+            d = self.store.detector
+            d.mean[self._order] = self._views['mean']
+            d.var[self._order] = self._views['var']
+            d.count[self._order] = self._views['count']
+
+        self._views = {}
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._blocks = {}
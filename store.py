@@ -0,0 +1,546 @@
+"""In-memory repositories for issues and notifications, and their persistence.
+
+Records stay plain dicts (the templates index them by key), but they are
+owned by a repository: look them up and change them through its methods so
+the secondary indexes stay in step. Ids are assigned by the repository and
+never reused.
+"""
+import itertools
+import json
+import os
+import sqlite3
+import threading
+
+from journal import Journal
+
+
+class IssueRepository:
+    """Issues by id, with indexes by customer, assigned engineer and status."""
+
+    def __init__(self, issues=()):
+        self._by_id = {}  # id -> issue, in id order
+        self._by_customer = {}  # customer_id -> {id: None}
+        self._by_engineer = {}  # engineer name -> {id: None}
+        self._open_by_engineer = {}  # engineer name -> {id: None} for unresolved issues
+        self._by_status = {}  # status -> {id: None}
+        self._next_id = 1
+        for issue in issues:
+            self.add(issue)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def _indexes(self, issue):
+        yield self._by_customer, issue.get('customer_id')
+        yield self._by_engineer, issue.get('assigned_engineer')
+        yield self._by_status, issue.get('status')
+        if issue.get('status') != 'resolved':
+            yield self._open_by_engineer, issue.get('assigned_engineer')
+
+    def _index(self, issue):
+        for index, key in self._indexes(issue):
+            index.setdefault(key, {})[issue['id']] = None
+
+    def _unindex(self, issue):
+        issue_id = issue['id']
+        for index, key in self._indexes(issue):
+            ids = index.get(key)
+            if ids is not None:
+                ids.pop(issue_id, None)
+                if not ids:
+                    del index[key]
+
+    def add(self, issue):
+        """Store a new issue, assigning the next id unless it already has one."""
+        issue = dict(issue)
+        if issue.get('id') is None:
+            issue['id'] = self._next_id
+        self._next_id = max(self._next_id, issue['id'] + 1)
+        if issue['id'] in self._by_id:
+            self._unindex(self._by_id[issue['id']])
+        self._by_id[issue['id']] = issue
+        self._index(issue)
+        return issue
+
+    @property
+    def next_id(self):
+        return self._next_id
+
+    def get(self, issue_id):
+        return self._by_id.get(issue_id)
+
+    def update(self, issue_id, **changes):
+        """Apply ``changes`` to an issue; return it, or None if there is no such issue."""
+        issue = self._by_id.get(issue_id)
+        if issue is None:
+            return None
+        self._unindex(issue)
+        issue.update(changes)
+        self._index(issue)
+        return issue
+
+    def all(self):
+        return list(self._by_id.values())
+
+    def recent(self, limit):
+        """The ``limit`` newest issues, newest first."""
+        return list(itertools.islice(reversed(self._by_id.values()), limit))
+
+    def _select(self, ids):
+        return [self._by_id[i] for i in sorted(ids)]
+
+    def for_customer(self, customer_id):
+        return self._select(self._by_customer.get(customer_id, ()))
+
+    def for_engineer(self, engineer_name, include_resolved=False):
+        index = self._by_engineer if include_resolved else self._open_by_engineer
+        return self._select(index.get(engineer_name, ()))
+
+    def with_status(self, status):
+        return self._select(self._by_status.get(status, ()))
+
+    def count_status(self, status):
+        return len(self._by_status.get(status, ()))
+
+    def open_count(self):
+        """Issues that are not resolved."""
+        return len(self._by_id) - self.count_status('resolved')
+
+
+class NotificationRepository:
+    """Notifications by id, per engineer, with unread counters."""
+
+    def __init__(self, notifications=()):
+        self._by_id = {}
+        self._by_engineer = {}  # engineer name -> {id: None}, in id order
+        self._unread = {}  # engineer name -> {str(customer_id): {id: None}}
+        self._unread_count = {}  # engineer name -> number of unread notifications
+        self._next_id = 1
+        for notification in notifications:
+            self.add(notification)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add(self, notification):
+        """Store a new notification, assigning the next id unless it already has one."""
+        notification = dict(notification)
+        if notification.get('id') is None:
+            notification['id'] = self._next_id
+        self._next_id = max(self._next_id, notification['id'] + 1)
+
+        notification_id = notification['id']
+        engineer = notification.get('engineer_name')
+        self._by_id[notification_id] = notification
+        self._by_engineer.setdefault(engineer, {})[notification_id] = None
+        if not notification.get('read', False):
+            per_customer = self._unread.setdefault(engineer, {})
+            per_customer.setdefault(str(notification.get('customer_id')), {})[notification_id] = None
+            self._unread_count[engineer] = self._unread_count.get(engineer, 0) + 1
+        return notification
+
+    @property
+    def next_id(self):
+        return self._next_id
+
+    def get(self, notification_id):
+        return self._by_id.get(notification_id)
+
+    def all(self):
+        return list(self._by_id.values())
+
+    def for_engineer(self, engineer_name, limit=None):
+        """The engineer's notifications, oldest first; ``limit`` keeps only the newest ones."""
+        ids = self._by_engineer.get(engineer_name, {})
+        if limit is None:
+            return [self._by_id[i] for i in ids]
+        newest = list(itertools.islice(reversed(ids), limit))
+        return [self._by_id[i] for i in reversed(newest)]
+
+    def unread_count(self, engineer_name):
+        return self._unread_count.get(engineer_name, 0)
+
+    def unread_for(self, engineer_name, customer_id):
+        """Number of the engineer's unread notifications about a customer."""
+        return len(self._unread.get(engineer_name, {}).get(str(customer_id), ()))
+
+    def mark_read(self, engineer_name, customer_id):
+        """Mark the engineer's unread notifications about a customer as read; return their ids."""
+        per_customer = self._unread.get(engineer_name, {})
+        ids = list(per_customer.pop(str(customer_id), ()))
+        if not per_customer:
+            self._unread.pop(engineer_name, None)
+        if ids:
+            self._unread_count[engineer_name] -= len(ids)
+        for notification_id in ids:
+            self._by_id[notification_id]['read'] = True
+        return ids
+
+
+class JournaledStore:
+    """Issues, notifications and task status persisted through a ``Journal``.
+
+    Every mutation is applied in memory and journaled under one lock, then
+    committed (group commit) before the method returns. After
+    ``snapshot_every`` ops the whole state is snapshotted and the journal
+    starts over. Startup replays the snapshot plus the journal tail.
+    """
+
+    def __init__(self, directory='state', snapshot_every=1000):
+        self.journal = Journal(directory)
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+
+        state, ops = self.journal.replay()
+        self._load_state(state or {})
+        for op in ops:
+            self._apply(op)
+        self.is_new = state is None and not ops
+
+    def _load_state(self, state):
+        self.issues = IssueRepository(state.get('issues', ()))
+        self.notifications = NotificationRepository(state.get('notifications', ()))
+        self.task_status = dict(state.get('task_status', {}))
+
+    def _state(self):
+        return {
+            'issues': self.issues.all(),
+            'notifications': self.notifications.all(),
+            'task_status': self.task_status,
+        }
+
+    def _apply(self, op):
+        kind = op['op']
+        if kind == 'issue.add':
+            return self.issues.add(op['record'])
+        if kind == 'issue.update':
+            return self.issues.update(op['id'], **op['changes'])
+        if kind == 'notification.add':
+            return self.notifications.add(op['record'])
+        if kind == 'notification.read':
+            return self.notifications.mark_read(op['engineer_name'], op['customer_id'])
+        if kind == 'task.set':
+            self.task_status[op['customer_id']] = op['record']
+            return op['record']
+        raise ValueError(f"unknown journal op {kind!r}")
+
+    def _mutate(self, build):
+        """Build an op under the lock (None = nothing to do), apply, journal and commit it."""
+        with self._lock:
+            op = build()
+            if op is None:
+                return None
+            result = self._apply(op)
+            seq = self.journal.enqueue(op)
+        self.journal.commit(seq)
+
+        if self.journal.since_snapshot >= self.snapshot_every:
+            self.compact(only_if_due=True)
+        return result
+
+    @property
+    def version(self):
+        """Sequence number of the last mutation; changes whenever the state does."""
+        return self.journal.seq
+
+    def compact(self, only_if_due=False):
+        """Snapshot the state and start an empty journal."""
+        with self._lock:
+            if not only_if_due or self.journal.since_snapshot >= self.snapshot_every:
+                self.journal.compact(self._state())
+
+    def import_state(self, issues=(), notifications=(), task_status=None):
+        """Seed an empty store (e.g. from the old JSON files) and snapshot it."""
+        with self._lock:
+            self._load_state({'issues': issues, 'notifications': notifications,
+                              'task_status': task_status or {}})
+            self.journal.compact(self._state())
+        self.is_new = False
+
+    def add_issue(self, issue):
+        # Ids are fixed before journaling so replay assigns the same ones
+        return self._mutate(lambda: {'op': 'issue.add',
+                                     'record': {**issue, 'id': issue.get('id') or self.issues.next_id}})
+
+    def update_issue(self, issue_id, **changes):
+        return self._mutate(lambda: {'op': 'issue.update', 'id': issue_id, 'changes': changes}
+                            if self.issues.get(issue_id) is not None else None)
+
+    def add_notification(self, notification):
+        return self._mutate(lambda: {'op': 'notification.add',
+                                     'record': {**notification,
+                                                'id': notification.get('id') or self.notifications.next_id}})
+
+    def mark_notifications_read(self, engineer_name, customer_id):
+        """Mark read and return the ids changed (nothing is journaled if there are none)."""
+        return self._mutate(lambda: {'op': 'notification.read', 'engineer_name': engineer_name,
+                                     'customer_id': str(customer_id)}
+                            if self.notifications.unread_for(engineer_name, customer_id) else None) or []
+
+    def set_task_status(self, customer_id, record):
+        return self._mutate(lambda: {'op': 'task.set', 'customer_id': str(customer_id), 'record': record})
+
+    def close(self):
+        self.journal.close()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER,
+    assigned_engineer TEXT,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS issues_customer ON issues (customer_id, id);
+CREATE INDEX IF NOT EXISTS issues_engineer ON issues (assigned_engineer, status, id);
+CREATE INDEX IF NOT EXISTS issues_status ON issues (status);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    engineer_name TEXT,
+    customer_id TEXT,
+    read INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notifications_engineer ON notifications (engineer_name, id);
+CREATE INDEX IF NOT EXISTS notifications_unread ON notifications (engineer_name, customer_id) WHERE read = 0;
+
+CREATE TABLE IF NOT EXISTS task_status (
+    customer_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+
+class _SqliteIssues:
+    """Read side of ``SqliteStore`` with the ``IssueRepository`` query methods."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def _rows(self, sql, params=()):
+        return [_issue_record(row) for row in self._store.connection().execute(sql, params)]
+
+    def __len__(self):
+        return self._store.connection().execute("SELECT COUNT(*) FROM issues").fetchone()[0]
+
+    def get(self, issue_id):
+        rows = self._rows("SELECT id, data FROM issues WHERE id = ?", (issue_id,))
+        return rows[0] if rows else None
+
+    def all(self):
+        return self._rows("SELECT id, data FROM issues ORDER BY id")
+
+    def recent(self, limit):
+        return self._rows("SELECT id, data FROM issues ORDER BY id DESC LIMIT ?", (limit,))
+
+    def for_customer(self, customer_id):
+        return self._rows("SELECT id, data FROM issues WHERE customer_id = ? ORDER BY id", (customer_id,))
+
+    def for_engineer(self, engineer_name, include_resolved=False):
+        if include_resolved:
+            return self._rows("SELECT id, data FROM issues WHERE assigned_engineer = ? ORDER BY id",
+                              (engineer_name,))
+        return self._rows("SELECT id, data FROM issues WHERE assigned_engineer = ? AND status != 'resolved' "
+                          "ORDER BY id", (engineer_name,))
+
+    def with_status(self, status):
+        return self._rows("SELECT id, data FROM issues WHERE status = ? ORDER BY id", (status,))
+
+    def count_status(self, status):
+        return self._store.connection().execute(
+            "SELECT COUNT(*) FROM issues WHERE status = ?", (status,)).fetchone()[0]
+
+    def open_count(self):
+        return len(self) - self.count_status('resolved')
+
+
+class _SqliteNotifications:
+    """Read side of ``SqliteStore`` with the ``NotificationRepository`` query methods."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return self._store.connection().execute("SELECT COUNT(*) FROM notifications").fetchone()[0]
+
+    def all(self):
+        rows = self._store.connection().execute("SELECT id, read, data FROM notifications ORDER BY id")
+        return [_notification_record(row) for row in rows]
+
+    def for_engineer(self, engineer_name, limit=None):
+        conn = self._store.connection()
+        if limit is None:
+            rows = conn.execute("SELECT id, read, data FROM notifications WHERE engineer_name = ? ORDER BY id",
+                                (engineer_name,)).fetchall()
+        else:
+            rows = conn.execute("SELECT id, read, data FROM notifications WHERE engineer_name = ? "
+                                "ORDER BY id DESC LIMIT ?", (engineer_name, limit)).fetchall()[::-1]
+        return [_notification_record(row) for row in rows]
+
+    def unread_count(self, engineer_name):
+        return self._store.connection().execute(
+            "SELECT COUNT(*) FROM notifications WHERE engineer_name = ? AND read = 0",
+            (engineer_name,)).fetchone()[0]
+
+    def unread_for(self, engineer_name, customer_id):
+        return self._store.connection().execute(
+            "SELECT COUNT(*) FROM notifications WHERE engineer_name = ? AND customer_id = ? AND read = 0",
+            (engineer_name, str(customer_id))).fetchone()[0]
+
+
+class _SqliteTaskStatus:
+    """``dict.get``-style access to the task_status table."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def get(self, customer_id, default=None):
+        row = self._store.connection().execute(
+            "SELECT data FROM task_status WHERE customer_id = ?", (str(customer_id),)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __len__(self):
+        return self._store.connection().execute("SELECT COUNT(*) FROM task_status").fetchone()[0]
+
+
+def _issue_record(row):
+    return {**json.loads(row[1]), 'id': row[0]}
+
+
+def _notification_record(row):
+    return {**json.loads(row[2]), 'id': row[0], 'read': bool(row[1])}
+
+
+class SqliteStore:
+    """Same interface as ``JournaledStore``, shared by every process through SQLite.
+
+    The database runs in WAL mode so readers never block the writer. Each
+    process and thread opens one connection on first use and keeps it; the
+    queries use fixed SQL with parameters, so sqlite3's per-connection
+    statement cache serves them prepared. Records are stored as JSON, with
+    the columns the dashboards filter on pulled out and indexed.
+    """
+
+    def __init__(self, path='state.db'):
+        self.path = path
+        self._local = threading.local()
+        conn = self.connection()
+        conn.executescript(SQLITE_SCHEMA)
+        self.issues = _SqliteIssues(self)
+        self.notifications = _SqliteNotifications(self)
+        self.task_status = _SqliteTaskStatus(self)
+        self.is_new = not len(self.issues) and not len(self.notifications) and not len(self.task_status)
+
+    def connection(self):
+        """This thread's connection, reopened after a fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @property
+    def version(self):
+        """Count of write transactions, shared by every process."""
+        return self.connection().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def _transaction(self, fn):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def import_state(self, issues=(), notifications=(), task_status=None):
+        """Seed an empty database (e.g. from the old JSON files).
+
+        Checked inside the write transaction, so when several workers start
+        at once only the first one imports.
+        """
+        def load(conn):
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM issues) OR EXISTS (SELECT 1 FROM notifications) "
+                            "OR EXISTS (SELECT 1 FROM task_status)").fetchone()[0]:
+                return
+            for issue in issues:
+                self._insert_issue(conn, issue)
+            for notification in notifications:
+                self._insert_notification(conn, notification)
+            for customer_id, record in (task_status or {}).items():
+                conn.execute("INSERT OR REPLACE INTO task_status (customer_id, data) VALUES (?, ?)",
+                             (str(customer_id), json.dumps(record)))
+        self._transaction(load)
+        self.is_new = False
+
+    def _insert_issue(self, conn, issue):
+        record = {k: v for k, v in issue.items() if k != 'id'}
+        cur = conn.execute(
+            "INSERT INTO issues (id, customer_id, assigned_engineer, status, data) VALUES (?, ?, ?, ?, ?)",
+            (issue.get('id'), record.get('customer_id'), record.get('assigned_engineer'), record.get('status'),
+             json.dumps(record)))
+        return {**record, 'id': cur.lastrowid}
+
+    def _insert_notification(self, conn, notification):
+        record = {k: v for k, v in notification.items() if k not in ('id', 'read')}
+        read = bool(notification.get('read', False))
+        cur = conn.execute(
+            "INSERT INTO notifications (id, engineer_name, customer_id, read, data) VALUES (?, ?, ?, ?, ?)",
+            (notification.get('id'), record.get('engineer_name'), str(record.get('customer_id')), int(read),
+             json.dumps(record)))
+        return {**record, 'id': cur.lastrowid, 'read': read}
+
+    def add_issue(self, issue):
+        return self._transaction(lambda conn: self._insert_issue(conn, issue))
+
+    def update_issue(self, issue_id, **changes):
+        def update(conn):
+            row = conn.execute("SELECT id, data FROM issues WHERE id = ?", (issue_id,)).fetchone()
+            if row is None:
+                return None
+            issue = {**_issue_record(row), **changes}
+            record = {k: v for k, v in issue.items() if k != 'id'}
+            conn.execute("UPDATE issues SET customer_id = ?, assigned_engineer = ?, status = ?, data = ? "
+                         "WHERE id = ?", (record.get('customer_id'), record.get('assigned_engineer'),
+                                          record.get('status'), json.dumps(record), issue_id))
+            return issue
+        return self._transaction(update)
+
+    def add_notification(self, notification):
+        return self._transaction(lambda conn: self._insert_notification(conn, notification))
+
+    def mark_notifications_read(self, engineer_name, customer_id):
+        def mark(conn):
+            params = (engineer_name, str(customer_id))
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM notifications WHERE engineer_name = ? AND customer_id = ? AND read = 0", params)]
+            if ids:
+                conn.execute("UPDATE notifications SET read = 1 "
+                             "WHERE engineer_name = ? AND customer_id = ? AND read = 0", params)
+            return ids
+        return self._transaction(mark)
+
+    def set_task_status(self, customer_id, record):
+        self._transaction(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO task_status (customer_id, data) VALUES (?, ?)",
+            (str(customer_id), json.dumps(record))))
+        return record
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
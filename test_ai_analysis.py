@@ -0,0 +1,156 @@
+"""ChunkedAnalyzer against a local stub of the messages API (no network, no API key).
+
+    python -m pytest test_ai_analysis.py
+"""
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ai_analysis import ChunkedAnalyzer
+
+
+class StubAPI(ThreadingHTTPServer):
+    """Answers POST /v1/messages with one engineer assignment per fault in the prompt.
+
+    While ``gate`` is clear every request blocks, so tests can pile up a backlog.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.received = threading.Semaphore(0)
+        self.prompts = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][0]['content']
+        self.server.prompts.append(prompt)
+        self.server.received.release()
+        self.server.gate.wait()
+
+        fault_data = json.loads(prompt[prompt.index('{', prompt.index('Fault Data:')):
+                                       prompt.index('\n}\n', prompt.index('Fault Data:')) + 2])
+        analysis = {
+            'engineer_assignments': [{'customer_id': f['customer_id'], 'assigned_engineer': 'Stub'}
+                                     for f in fault_data['faults']],
+            'patterns_detected': ['stub pattern'],
+        }
+        reply = json.dumps({
+            'id': 'msg_stub', 'type': 'message', 'role': 'assistant', 'model': body['model'],
+            'content': [{'type': 'text', 'text': json.dumps(analysis)}],
+            'stop_reason': 'end_turn', 'stop_sequence': None,
+            'usage': {'input_tokens': 1, 'output_tokens': 1},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+def faults(count, start=0):
+    return [{'customer_id': start + i, 'feeder_name': 'Feeder A'} for i in range(count)]
+
+
+class ChunkedAnalyzerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubAPI()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.chunks = []
+        self.complete = {}
+        self.done = threading.Condition()
+
+    def tearDown(self):
+        self.server.gate.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def analyzer(self, timeout=10, **options):
+        analyzer = ChunkedAnalyzer('test-key', self.on_chunk, self.on_complete,
+                                   base_url=self.server.base_url, model='stub', timeout=timeout, **options)
+        self.addCleanup(analyzer.close)
+        return analyzer
+
+    def on_chunk(self, cycle_number, part, status):
+        with self.done:
+            self.chunks.append((cycle_number, part, status))
+
+    def on_complete(self, cycle_number, analysis):
+        with self.done:
+            self.complete[cycle_number] = analysis
+            self.done.notify_all()
+
+    def wait_for(self, *cycles):
+        with self.done:
+            self.assertTrue(self.done.wait_for(lambda: all(c in self.complete for c in cycles), timeout=10))
+
+    def test_chunks_are_merged(self):
+        analyzer = self.analyzer(chunk_size=4, max_workers=2)
+        self.assertEqual(analyzer.submit(1, faults(10), []), 3)
+        self.wait_for(1)
+
+        analysis = self.complete[1]
+        self.assertEqual(sorted(a['customer_id'] for a in analysis['engineer_assignments']), list(range(10)))
+        self.assertEqual(analysis['patterns_detected'], ['stub pattern'])
+        self.assertEqual(len(self.server.prompts), 3)
+        final = [status for cycle, _, status in self.chunks if status['complete']]
+        self.assertEqual(final, [{'chunks_total': 3, 'chunks_done': 3, 'chunks_failed': 0,
+                                  'chunks_shed': 0, 'complete': True}])
+
+    def test_oldest_cycles_are_shed_when_backlog_is_full(self):
+        self.server.gate.clear()
+        analyzer = self.analyzer(chunk_size=2, max_workers=1, max_backlog=2)
+        analyzer.submit(1, faults(4, start=100), [])
+        self.assertTrue(self.server.received.acquire(timeout=10))
+        for cycle in range(2, 6):
+            analyzer.submit(cycle, faults(4, start=cycle * 100), [])
+
+        # Cycle 1's first chunk is in flight; its second and all of 2 and 3 were shed
+        with self.done:
+            self.assertTrue(self.done.wait_for(lambda: 2 in self.complete and 3 in self.complete, timeout=10))
+        self.assertIsNone(self.complete[2])
+        self.assertEqual(len(analyzer._pending), 4)
+
+        self.server.gate.set()
+        self.wait_for(1, 4, 5)
+        self.assertEqual(len(self.complete[1]['engineer_assignments']), 2)
+        self.assertEqual(len(self.complete[5]['engineer_assignments']), 4)
+        final = {cycle: status for cycle, _, status in self.chunks if status['complete']}
+        self.assertEqual(final[1]['chunks_shed'], 1)
+        self.assertEqual(final[3]['chunks_shed'], 2)
+        self.assertEqual(final[3]['chunks_failed'], 2)
+        self.assertEqual(final[4]['chunks_shed'], 0)
+        # 1 chunk of cycle 1, then both chunks of cycles 4 and 5
+        self.assertEqual(len(self.server.prompts), 5)
+
+    def test_exit_sheds_queued_chunks_and_waits_only_for_requests_in_flight(self):
+        self.server.gate.clear()
+        analyzer = self.analyzer(timeout=1, chunk_size=2, max_workers=1)
+        analyzer.submit(1, faults(6), [])
+        self.assertTrue(self.server.received.acquire(timeout=10))
+
+        started = time.monotonic()
+        analyzer.close(drop_pending=True)  # What the atexit hook runs
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(len(analyzer._pending), 0)
+        self.assertEqual(len(self.server.prompts), 1)
+        shed = [status for _, _, status in self.chunks if status['chunks_shed']]
+        self.assertEqual(shed[0]['chunks_shed'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Keyset paging of the API listings.
+
+    python -m pytest test_api_utils.py
+"""
+import unittest
+
+from api_utils import BadRequest, decode_cursor, paginate
+
+
+def walk(records, key, sort=None, limit=3):
+    """Every page of ``records`` in order, following ``next_cursor``."""
+    pages, cursor = [], None
+    while True:
+        page, cursor = paginate(records, key, sort=sort, cursor=cursor and decode_cursor(cursor), limit=limit)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+
+class PaginateTest(unittest.TestCase):
+    records = [{'id': i, 'score': [5, 1, 3, None, 3, 2, 5, 4][i]} for i in range(8)]
+
+    def test_pages_cover_every_record_once_in_order(self):
+        pages = walk(self.records, 'id', sort='score')
+        flat = [r['id'] for page in pages for r in page]
+        # Ties break on id; records without the field come last
+        self.assertEqual(flat, [1, 5, 2, 4, 7, 0, 6, 3])
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+
+    def test_descending(self):
+        flat = [r['id'] for page in walk(self.records, 'id', sort='-score') for r in page]
+        self.assertEqual(flat, [6, 0, 7, 4, 2, 5, 1, 3])
+
+    def test_cursor_survives_new_records(self):
+        first, cursor = paginate(self.records, 'id', limit=4)
+        grown = self.records + [{'id': 1.5, 'score': 0}, {'id': 9, 'score': 0}]
+        rest, _ = paginate(grown, 'id', cursor=decode_cursor(cursor), limit=None)
+        self.assertEqual([r['id'] for r in first], [0, 1, 2, 3])
+        self.assertEqual([r['id'] for r in rest], [4, 5, 6, 7, 9])
+
+    def test_fields_are_projected(self):
+        page, _ = paginate(self.records, 'id', limit=2, fields=['score'])
+        self.assertEqual(page, [{'score': 5}, {'score': 1}])
+
+    def test_bad_requests(self):
+        with self.assertRaises(BadRequest):
+            paginate(self.records, 'id', sort='nope')
+        with self.assertRaises(BadRequest):
+            decode_cursor('not-a-cursor')
+        self.assertEqual(paginate([], 'id', sort='nope'), ([], None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Assignment engines: the greedy engines agree, the auction is optimal within its bound.
+
+    python -m pytest test_assignment.py
+"""
+import contextlib
+import io
+import itertools
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import customer
+from assignment import assignment_cost_matrix, optimal_assign
+
+
+def layout(faults, engineers, spread, seed):
+    rng = np.random.default_rng(seed)
+    centre = np.array([23.8103, 91.2514])
+    return (centre + rng.uniform(-spread, spread, (faults, 2)),
+            centre + rng.uniform(-spread, spread, (engineers, 2)))
+
+
+def greedy_with_capacity(cost, capacity):
+    """Each fault in turn takes its cheapest engineer with a free slot."""
+    load = np.zeros(cost.shape[1], dtype=np.int64)
+    chosen = []
+    for row in cost:
+        j = int(np.argmin(np.where(load < capacity, row, np.inf)))
+        load[j] += 1
+        chosen.append(j)
+    return np.array(chosen)
+
+
+class GreedyEngineTest(unittest.TestCase):
+    def assign(self, engine, fault_points, engineer_points):
+        engineers = [customer.Engineer(f"Eng. {j}", j, 'general', lat, lon)
+                     for j, (lat, lon) in enumerate(engineer_points.tolist())]
+        engineers[0].workload = 3
+        faults = [{'customer_id': i, 'latitude': lat, 'longitude': lon}
+                  for i, (lat, lon) in enumerate(fault_points.tolist())]
+        with mock.patch.object(customer, 'engineers', engineers), \
+                mock.patch.object(customer, 'ASSIGNMENT_ENGINE', engine), \
+                contextlib.redirect_stdout(io.StringIO()):
+            assignments = customer.assign_engineers_greedy(faults)
+        return ([a['assigned_engineer'] for a in assignments], [a['distance_km'] for a in assignments],
+                [e.workload for e in engineers])
+
+    def test_loop_matrix_and_grid_choose_the_same_engineers(self):
+        for spread in (0.05, 0.5):
+            fault_points, engineer_points = layout(400, 30, spread, seed=1)
+            loop = self.assign('loop', fault_points, engineer_points)
+            for engine in ('matrix', 'grid'):
+                with self.subTest(spread=spread, engine=engine):
+                    names, distances, workload = self.assign(engine, fault_points, engineer_points)
+                    self.assertEqual(names, loop[0])
+                    self.assertEqual(workload, loop[2])
+                    np.testing.assert_allclose(distances, loop[1], atol=0.011)
+
+
+class OptimalAssignTest(unittest.TestCase):
+    def cost(self, faults, engineers, spread, seed):
+        fault_points, engineer_points = layout(faults, engineers, spread, seed)
+        specialties = np.random.default_rng(seed).choice(['transformer', 'line', 'meter', 'general'],
+                                                         faults + engineers).tolist()
+        return assignment_cost_matrix(fault_points[:, 0], fault_points[:, 1],
+                                      engineer_points[:, 0], engineer_points[:, 1],
+                                      specialties[:faults], specialties[faults:])
+
+    def test_matches_brute_force_on_small_problems(self):
+        for seed in range(5):
+            cost = self.cost(6, 3, 0.2, seed)
+            best = min(sum(cost[i, j] for i, j in enumerate(choice))
+                       for choice in itertools.product(range(3), repeat=6)
+                       if max(np.bincount(choice, minlength=3)) <= 2)
+            chosen = optimal_assign(cost, 2, epsilon=0.01)
+            self.assertLessEqual(np.bincount(chosen).max(), 2)
+            self.assertLessEqual(cost[np.arange(6), chosen].sum(), best + 6 * 0.01)
+
+    def test_never_costs_more_than_greedy_and_respects_capacity(self):
+        for spread in (0.05, 0.5):
+            cost = self.cost(300, 20, spread, seed=3)
+            capacity = np.random.default_rng(3).integers(10, 25, 20)
+            chosen = optimal_assign(cost, capacity)
+            greedy = greedy_with_capacity(cost, capacity)
+            self.assertTrue((np.bincount(chosen, minlength=20) <= capacity).all())
+            self.assertLessEqual(cost[np.arange(300), chosen].sum(),
+                                 cost[np.arange(300), greedy].sum() + 300 * 0.1)
+
+    def test_narrow_candidate_lists_are_widened(self):
+        cost = self.cost(200, 40, 0.5, seed=4)
+        full = optimal_assign(cost, 6, candidates=40)
+        narrow = optimal_assign(cost, 6, candidates=2)
+        self.assertLessEqual(abs(cost[np.arange(200), narrow].sum() - cost[np.arange(200), full].sum()),
+                             200 * 0.1)
+
+    def test_errors(self):
+        cost = self.cost(10, 2, 0.05, seed=5)
+        with self.assertRaises(ValueError):
+            optimal_assign(cost, 4)
+        with self.assertRaises(TimeoutError):
+            optimal_assign(cost, 5, budget_s=-1)
+        self.assertEqual(len(optimal_assign(cost[:0], 1)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Segment files: round-trip, footers, torn tails and update records.
+
+    python -m pytest test_cycle_segments.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from cycle_segments import RECORD, SegmentReader, SegmentWriter, list_segments, read_footer
+
+
+def cycle(number, faults=2):
+    return {
+        'cycle_number': number,
+        'timestamp': f"2024-01-01 00:{number:02d}:00",
+        'faults': [{'customer_id': number * 100 + i, 'change_percentage': -75.0} for i in range(faults)],
+    }
+
+
+class SegmentTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='segments_')
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def writer(self, max_cycles=720):
+        writer = SegmentWriter(self.directory, max_cycles=max_cycles)
+        self.addCleanup(writer.close)
+        return writer
+
+    def footers(self):
+        found = []
+        for name in list_segments(self.directory):
+            path = os.path.join(self.directory, name)
+            with open(path, 'rb') as f:
+                found.append(read_footer(f, os.path.getsize(path)) is not None)
+        return found
+
+    def test_round_trip_across_sealed_and_open_segments(self):
+        writer = self.writer(max_cycles=3)
+        for number in range(1, 6):
+            writer.append(cycle(number))
+
+        # Three records seal the first segment; the second is still open
+        self.assertEqual(self.footers(), [True, False])
+        self.assertEqual(list(SegmentReader(self.directory).iter_cycles()), [cycle(n) for n in range(1, 6)])
+
+        writer.close()
+        self.assertEqual(self.footers(), [True, True])
+        reader = SegmentReader(self.directory)
+        self.assertEqual(list(reader.iter_cycles()), [cycle(n) for n in range(1, 6)])
+        self.assertEqual(reader.find(4), cycle(4))
+        self.assertIsNone(reader.find(9))
+
+    def test_torn_tail_is_skipped_and_cut_on_resume(self):
+        writer = self.writer()
+        writer.append(cycle(1))
+        path = writer.append(cycle(2))
+        writer._file.close()  # Crash: no footer
+        writer._file = None
+        with open(path, 'ab') as f:
+            f.write(RECORD.pack(1, 3, 0, 1000, 0) + b'half a payload')
+
+        self.assertEqual([c['cycle_number'] for c in SegmentReader(self.directory).iter_cycles()], [1, 2])
+
+        resumed = self.writer()
+        self.assertEqual(resumed.append(cycle(3)), path)
+        resumed.close()
+        self.assertEqual(self.footers(), [True])
+        self.assertEqual(list(SegmentReader(self.directory).iter_cycles()), [cycle(n) for n in range(1, 4)])
+
+    def test_updates_merge_into_the_latest_cycle_in_write_order(self):
+        writer = self.writer(max_cycles=2)
+        writer.append(cycle(1))
+        writer.append(cycle(2))
+        writer.append_update(2, {'ai_analysis': {'patterns_detected': ['a']}, 'ai_status': 'partial'})
+
+        reader = SegmentReader(self.directory)
+        key, signature = max(reader.scan().items(), key=lambda item: item[1][0])
+        loaded = reader.load(key)
+        self.assertEqual(loaded['ai_analysis'], {'patterns_detected': ['a']})
+
+        # The second update lands in the next segment; patch merges only it, into a copy
+        writer.append_update(2, {'ai_analysis': {'patterns_detected': ['a', 'b'], 'risk': 'high'},
+                                 'ai_status': 'complete'})
+        reader.scan()
+        patched = reader.patch(key, loaded, signature)
+        self.assertEqual(patched['ai_analysis'], {'patterns_detected': ['a', 'b'], 'risk': 'high'})
+        self.assertEqual(patched['ai_status'], 'complete')
+        self.assertEqual(loaded['ai_analysis'], {'patterns_detected': ['a']})
+        self.assertEqual(reader.find(2), patched)
+        self.assertEqual(reader.find(1), cycle(1))
+
+        # Updates never apply to an older cycle with the same number
+        writer.append(cycle(1, faults=3))
+        writer.append_update(1, {'ai_status': 'complete'})
+        cycles = list(SegmentReader(self.directory).iter_cycles())
+        self.assertEqual([(c['cycle_number'], c.get('ai_status')) for c in cycles],
+                         [(1, None), (2, 'complete'), (1, 'complete')])
+
+
+if __name__ == '__main__':
+    unittest.main()